@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the radar API: requests/sec and latency of the dev server vs gunicorn
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+# Endpoints that work without RainViewer access or collected data
+DEFAULT_PATHS = [
+    '/health',
+    '/api/radar/coverage?lat=45.5&lon=-73.6&zoom=7&radius=2',
+    '/api/radar/tile-coordinates?points=45.5,-73.6;45.6,-73.9;46.8,-71.2&zoom=7',
+]
+
+
+def free_port() -> int:
+    """Get a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(server: str, port: int, db_path: str, workers: int, threads: int) -> subprocess.Popen:
+    """Start radar-api in a subprocess and wait until it answers"""
+    command = [sys.executable, '-m', 'weather_monitor.cli', 'radar-api',
+               '--host', '127.0.0.1', '--port', str(port), '--server', server]
+    if server == 'gunicorn':
+        command += ['--workers', str(workers), '--threads', str(threads)]
+    
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, SQLITE_DB_PATH=db_path, LOG_LEVEL='WARNING')
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    
+    process.terminate()
+    raise RuntimeError(f"{server} server did not start on port {port}")
+
+
+def _client_process(job: tuple) -> tuple:
+    """Run a share of the clients in one process, returning its latencies and error count"""
+    base_url, paths, clients, duration, first = job
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    
+    def client(offset: int):
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        index = offset
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + paths[index % len(paths)], timeout=10)
+                if response.status_code >= 500:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - start)
+            index += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+    
+    threads = [threading.Thread(target=client, args=(first + i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_load(base_url: str, paths: list, concurrency: int, duration: float, processes: int) -> dict:
+    """Hit the paths round-robin from concurrent keep-alive clients for a fixed time
+    
+    Clients are spread over several processes so the load generator itself is
+    not limited to one core.
+    """
+    processes = max(1, min(processes, concurrency))
+    shares = [concurrency // processes + (1 if i < concurrency % processes else 0) for i in range(processes)]
+    jobs = [(base_url, paths, share, duration, sum(shares[:i])) for i, share in enumerate(shares)]
+    
+    started = time.monotonic()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_client_process, jobs)
+    elapsed = time.monotonic() - started
+    
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    errors = sum(process_errors for _, process_errors in results)
+    
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def print_result(label: str, result: dict):
+    print(f"{label:<10} {result['rps']:>9.1f} req/s  p50 {result['p50_ms']:7.1f} ms  "
+          f"p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+          f"({result['requests']} requests, {result['errors']} errors)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--url', help='Benchmark an already running server instead of starting both')
+    parser.add_argument('--path', action='append', dest='paths', help='Request path (repeatable)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='Load generator processes the clients are spread over')
+    parser.add_argument('--workers', type=int, default=4, help='Gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='Gunicorn threads per worker')
+    args = parser.parse_args()
+    
+    paths = args.paths or DEFAULT_PATHS
+    print(f"{args.concurrency} clients in {args.processes} processes, {args.duration:.0f}s per run, {len(paths)} paths")
+    
+    if args.url:
+        print_result('server', run_load(args.url.rstrip('/'), paths, args.concurrency, args.duration, args.processes))
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'benchmark.db')
+        for server in ('dev', 'gunicorn'):
+            port = free_port()
+            process = start_server(server, port, db_path, args.workers, args.threads)
+            try:
+                result = run_load(f"http://127.0.0.1:{port}", paths, args.concurrency, args.duration, args.processes)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+            print_result(server, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the Grafana dashboard queries against a synthetic observation history
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the src directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from loguru import logger
+
+from weather_monitor.database.grafana_mirror import GrafanaMirror
+from weather_monitor.database.sqlite_db import OBSERVATION_EXPORT_COLUMNS, SQLiteManager
+from weather_monitor.database.table_stats import count_inserted
+
+DASHBOARD_GLOB = os.path.join(os.path.dirname(__file__), '..', 'grafana', 'dashboards', '*.json')
+
+# Synthetic stations cycle through these places: (city, neighborhood, latitude, longitude)
+PLACES = [
+    ('Montreal', 'Plateau-Mont-Royal', 45.5231, -73.5817),
+    ('Saint-Eustache', 'Vieux-Saint-Eustache', 45.5651, -73.9055),
+    ('Laval', 'Chomedey', 45.5369, -73.7510),
+    ('Longueuil', 'Vieux-Longueuil', 45.5312, -73.5181),
+]
+
+INSERT_COLUMNS = [name for name in OBSERVATION_EXPORT_COLUMNS if name != 'id']
+
+# Plan details for a pass over a whole table or index; aliases are mapped back to tables separately
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?$')
+FROM_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+NOT_ALIASES = {'where', 'group', 'order', 'limit', 'join', 'left', 'inner', 'cross', 'on', 'using',
+               'union', 'natural', 'outer', 'having', 'window'}
+VARIABLE_PATTERN = re.compile(r'\$\{(\w+)(?::([^}]*))?\}|\[\[(\w+)\]\]|\$(\w+)')
+
+
+def station_rows(station: int, stations: int, epochs: list, rng: random.Random):
+    """Plausible readings of one station: daily and seasonal cycles with noise"""
+    city, neighborhood, latitude, longitude = PLACES[station % len(PLACES)]
+    station_id = f"IBENCH{station:03d}"
+    offset = rng.uniform(-2, 2)
+    rain_total, rain_day = 0.0, None
+    
+    for epoch, text in epochs:
+        hour = epoch % 86400 / 3600
+        day = epoch / 86400
+        temperature = round(8 + offset + 12 * math.sin(2 * math.pi * (day - 110) / 365)
+                            + 6 * math.sin(2 * math.pi * (hour - 9) / 24) + rng.gauss(0, 0.4), 1)
+        humidity = max(15, min(100, round(75 - 2 * (temperature - 8) + rng.gauss(0, 4))))
+        daylight = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        wind_speed = round(abs(rng.gauss(9, 5)), 1)
+        rain_rate = round(rng.expovariate(2), 2) if rng.random() < 0.05 else 0.0
+        if rain_day != int(day):
+            rain_total, rain_day = 0.0, int(day)
+        rain_total = round(rain_total + rain_rate / 12, 2)
+        
+        yield (
+            text, station_id, neighborhood, city, latitude, longitude,
+            temperature, humidity, round(temperature - (100 - humidity) / 5, 1), temperature,
+            wind_speed, round(wind_speed + abs(rng.gauss(6, 3)), 1), rng.randrange(360),
+            round(1013 + 8 * math.sin(day / 5 + station / stations) + rng.gauss(0, 0.3), 2),
+            round(8 * daylight), round(850 * daylight * rng.uniform(0.6, 1.0), 1),
+            rain_rate, rain_total
+        )
+
+
+def generate_history(db_path: str, stations: int, months: float, cadence: int, seed: int) -> int:
+    """Fill weather_observations with stations x months of readings every cadence seconds, ending now"""
+    SQLiteManager(db_path)
+    end = int(time.time()) // cadence * cadence
+    start = end - int(months * 30 * 86400) // cadence * cadence
+    epochs = [(epoch, time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch)))
+              for epoch in range(start, end + 1, cadence)]
+    rng = random.Random(seed)
+    generators = [station_rows(station, stations, epochs, rng) for station in range(stations)]
+    
+    insert = f"""
+        INSERT INTO weather_observations ({", ".join(INSERT_COLUMNS)})
+        VALUES ({", ".join("?" for _ in INSERT_COLUMNS)})
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA synchronous=OFF")
+    written = 0
+    try:
+        # Interleaved by time like the monitor writes them, so rowids follow timestamps
+        for chunk_start in range(0, len(epochs), 2000):
+            batch = [next(generator) for _ in epochs[chunk_start:chunk_start + 2000] for generator in generators]
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(insert, batch)
+            conn.execute(*count_inserted('weather_observations', len(batch), batch[0][0], batch[-1][0]))
+            conn.execute("COMMIT")
+            written += len(batch)
+    finally:
+        conn.close()
+    return written
+
+
+def load_dashboards(pattern: str) -> list:
+    """(dashboard title, templating variables, panel queries) of every dashboard file"""
+    dashboards = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            dashboard = json.load(f)
+        dashboard = dashboard.get('dashboard', dashboard)
+        
+        queries = []
+        
+        def walk(panels):
+            for panel in panels:
+                for target in panel.get('targets', []):
+                    if target.get('rawQueryText'):
+                        label = panel.get('title', '').strip() or f"panel {panel.get('id')}"
+                        queries.append((f"{label} [{target.get('refId', 'A')}]", target['rawQueryText']))
+                walk(panel.get('panels', []))
+        
+        walk(dashboard.get('panels', []))
+        variables = [variable for variable in dashboard.get('templating', {}).get('list', [])
+                     if variable.get('type') == 'query' and variable.get('query')]
+        for variable in variables:
+            query = variable['query']
+            queries.append((f"variable ${variable['name']}", query.get('query', '') if isinstance(query, dict) else query))
+        if queries:
+            dashboards.append((dashboard.get('title', os.path.basename(path)), variables, queries))
+    return dashboards
+
+
+def format_value(value, fmt: str) -> str:
+    """Render a single value or a list of values (All, multi-select) with a Grafana format"""
+    items = value if isinstance(value, list) else [value]
+    if fmt == 'sqlstring':
+        return ",".join("'" + str(item).replace("'", "''") + "'" for item in items)
+    if fmt == 'singlequote':
+        return ",".join("'" + str(item).replace("'", "\\'") + "'" for item in items)
+    return ",".join(str(item) for item in items)
+
+
+def substitute(query: str, values: dict) -> str:
+    """Replace $name, ${name[:format]} and [[name]] the way Grafana interpolates them"""
+    def replace(match):
+        name = match.group(1) or match.group(3) or match.group(4)
+        return format_value(values[name], match.group(2) or '') if name in values else match.group(0)
+    return VARIABLE_PATTERN.sub(replace, query)
+
+
+def variable_options(conn: sqlite3.Connection, variable: dict) -> list:
+    """Values the variable's own query offers in the dashboard's dropdown"""
+    query = variable['query']
+    return [row[0] for row in conn.execute(query.get('query', '') if isinstance(query, dict) else query)]
+
+
+def scenarios(conn: sqlite3.Connection, variables: list, overrides: dict, range_hours: float) -> dict:
+    """Variable values to run the queries with: everything at All, then the first variable at one value"""
+    to_ms = int(time.time() * 1000)
+    everything = {'__from': to_ms - int(range_hours * 3600 * 1000), '__to': to_ms}
+    options = {variable['name']: variable_options(conn, variable) for variable in variables}
+    for variable in variables:
+        # Without an allValue Grafana expands All to every option
+        everything[variable['name']] = variable.get('allValue') or options[variable['name']]
+    if overrides:
+        return {'custom': {**everything, **overrides}}
+    if not variables:
+        return {'all': everything}
+    
+    # The first value in the dropdown
+    name = variables[0]['name']
+    first = options[name][0] if options[name] else ''
+    return {'all': everything, f"{name}={first}": {**everything, name: first}}
+
+
+def query_plan(conn: sqlite3.Connection, query: str) -> tuple:
+    """EXPLAIN QUERY PLAN lines and the scans that read a whole table or index"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    aliases = {}
+    for table, alias in FROM_PATTERN.findall(query):
+        if table in tables:
+            aliases[table] = table
+            if alias and alias.lower() not in NOT_ALIASES:
+                aliases[alias] = table
+    
+    lines, scans = [], []
+    for *_, detail in conn.execute(f"EXPLAIN QUERY PLAN {query}"):
+        lines.append(detail)
+        match = SCAN_PATTERN.match(detail)
+        if match and match.group(1) in aliases:
+            table = aliases[match.group(1)]
+            # An index scan may still stop early (ORDER BY ... LIMIT), so the latency tells if it hurts
+            scans.append(f"index scan {table}.{match.group(2)}" if match.group(2) else f"FULL SCAN {table}")
+    return lines, scans
+
+
+def time_query(conn: sqlite3.Connection, query: str, runs: int, warmup: int) -> dict:
+    """Run a query repeatedly, fetching every row, and return its latency percentiles"""
+    for _ in range(warmup):
+        conn.execute(query).fetchall()
+    
+    latencies = []
+    rows = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = len(conn.execute(query).fetchall())
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    
+    return {'rows': rows, 'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'max_ms': latencies[-1] * 1000}
+
+
+def print_result(label: str, result: dict, show_plan: bool):
+    if 'error' in result:
+        print(f"  {label:<58} ERROR {result['error']}")
+        return
+    marker = "⚠" if any(scan.startswith('FULL') for scan in result['scans']) else "·"
+    flags = f"  {marker} {', '.join(result['scans'])}" if result['scans'] else ""
+    print(f"  {label[:58]:<58} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+          f"max {result['max_ms']:8.2f} ms  {result['rows']:>6} rows{flags}")
+    if show_plan or result['scans']:
+        for line in result['plan']:
+            print(f"      {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--db', help='Source database to use, generated first when it has no observations '
+                                     '(default: a temporary file)')
+    parser.add_argument('--stations', type=int, default=10, help='Synthetic stations')
+    parser.add_argument('--months', type=float, default=3, help='Months of history per station')
+    parser.add_argument('--cadence', type=int, default=300, help='Seconds between readings of a station')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the synthetic readings')
+    parser.add_argument('--target', choices=['mirror', 'source'], default='mirror',
+                        help='Query the Grafana mirror built from the source (what Grafana reads) or the source itself')
+    parser.add_argument('--dashboards', default=DASHBOARD_GLOB, help='Dashboard JSON files (glob)')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='Run only with these variable values (repeatable)')
+    parser.add_argument('--range-hours', type=float, default=24, help='Dashboard time range for $__from/$__to')
+    parser.add_argument('--runs', type=int, default=20, help='Timed runs per query')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per query')
+    parser.add_argument('--plan', action='store_true', help='Print the query plan of every query, not only flagged ones')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+    args = parser.parse_args()
+    
+    logger.remove()
+    logger.add(sys.stderr, level='WARNING')
+    overrides = dict(item.split('=', 1) for item in args.var)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.db or os.path.join(tmp_dir, 'benchmark.db')
+        SQLiteManager(db_path)
+        with sqlite3.connect(db_path) as conn:
+            existing = conn.execute("SELECT COUNT(*) FROM weather_observations").fetchone()[0]
+        if existing:
+            print(f"Using {existing} existing observations in {db_path}")
+        else:
+            start = time.perf_counter()
+            written = generate_history(db_path, args.stations, args.months, args.cadence, args.seed)
+            print(f"Generated {written} observations ({args.stations} stations x {args.months:g} months "
+                  f"every {args.cadence}s) in {time.perf_counter() - start:.1f}s")
+        
+        query_path = db_path
+        if args.target == 'mirror':
+            query_path = os.path.join(tmp_dir, 'grafana_mirror.db')
+            start = time.perf_counter()
+            if GrafanaMirror(db_path, query_path, batch_size=50000).sync() is None:
+                sys.exit("Building the Grafana mirror failed")
+            print(f"Built the Grafana mirror in {time.perf_counter() - start:.1f}s")
+        
+        conn = sqlite3.connect(f"file:{query_path}?mode=ro", uri=True)
+        size = conn.execute("SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()").fetchone()[0]
+        print(f"{args.target}: {size / 1024 / 1024:.1f} MB, "
+              f"{args.runs} runs per query, {args.range_hours:g}h time range")
+        
+        report = []
+        for title, variables, queries in load_dashboards(args.dashboards):
+            for scenario, values in scenarios(conn, variables, overrides, args.range_hours).items():
+                shown = {name: 'All' if isinstance(value, list) else value
+                         for name, value in values.items() if not name.startswith('__')}
+                print(f"\n{title} — {scenario} {shown}")
+                for label, raw_query in queries:
+                    query = substitute(raw_query, values)
+                    try:
+                        plan, scans = query_plan(conn, query)
+                        result = {**time_query(conn, query, args.runs, args.warmup), 'plan': plan, 'scans': scans}
+                    except sqlite3.Error as e:
+                        result = {'error': str(e)}
+                    print_result(label, result, args.plan)
+                    report.append({'dashboard': title, 'scenario': scenario, 'panel': label, **result})
+        conn.close()
+    
+    table_scans = sum(1 for result in report if any(scan.startswith('FULL') for scan in result.get('scans', [])))
+    index_scans = sum(1 for result in report if result.get('scans')) - table_scans
+    failed = sum(1 for result in report if 'error' in result)
+    print(f"\n{len(report)} queries: {table_scans} with full table scans, {index_scans} more with full index scans, "
+          f"{failed} failed")
+    
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'settings': vars(args), 'results': report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
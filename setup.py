@@ -24,12 +24,16 @@ setup(
     install_requires=[
         "requests>=2.31.0",
         "aiosqlite>=0.19.0",
+        "aiohttp>=3.9.1",
         "python-dotenv>=1.0.0",
         "pydantic>=2.5.0",
         "pydantic-settings>=2.1.0",
         "loguru>=0.7.2",
         "click>=8.1.7",
         "schedule>=1.2.0",
+        "numpy>=1.26.0",
+        "Pillow>=10.1.0",
+        "gunicorn>=21.2.0",
     ],
     entry_points={
         "console_scripts": [
@@ -2,7 +2,7 @@
 Admin API for weather station management
 """
 
-from flask import Flask, Response, request, jsonify, render_template_string, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template_string, send_from_directory, stream_with_context
 from flask_cors import CORS
 import json
 import os
@@ -14,6 +14,7 @@ from pathlib import Path
 from ..station_manager import StationManager
 from ..models.weather import WeatherStation
 from ..database.database_factory import get_database_manager
+from ..services import observation_export
 
 
 class AdminAPI:
@@ -29,8 +30,16 @@ class AdminAPI:
         # Simple admin authentication (can be enhanced later)
         self.admin_key = os.getenv("ADMIN_API_KEY", "admin123")
         
+        # With several server workers, station edits saved by one are picked up by the others
+        self.app.before_request(self._reload_stations_if_changed)
+        
         self._register_routes()
         
+    def _reload_stations_if_changed(self):
+        """Pick up station edits saved by other workers before handling a request"""
+        # A before_request hook that returns a value replaces the response, so the result is dropped
+        self.station_manager.reload_if_changed()
+        
     def _check_admin_auth(self) -> bool:
         """Check if request has valid admin authentication"""
         auth_key = request.headers.get('X-Admin-Key') or request.args.get('admin_key')
@@ -265,6 +274,35 @@ class AdminAPI:
             except Exception as e:
                 logger.error(f"Error in manual cleanup for {station_id}: {e}")
                 return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/admin/export/observations', methods=['GET'])
+        @self._admin_required
+        def export_observations():
+            """Stream observations as CSV or NDJSON, optionally gzip-compressed"""
+            try:
+                fmt = request.args.get('format', 'csv').lower()
+                compress = request.args.get('compress', '').lower() in ('gzip', 'gz', '1', 'true')
+                stream = observation_export.export_observations(
+                    self.db_manager,
+                    fmt=fmt,
+                    compress=compress,
+                    station_id=request.args.get('station_id'),
+                    start=observation_export.parse_time_bound(request.args.get('start')),
+                    end=observation_export.parse_time_bound(request.args.get('end')),
+                    columns=observation_export.parse_columns(request.args.get('columns')),
+                    chunk_size=min(int(request.args.get('chunk_size', 5000)), 50000)
+                )
+                
+                filename = f"observations.{fmt}{'.gz' if compress else ''}"
+                headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+                mimetype = 'application/gzip' if compress else observation_export.EXPORT_FORMATS[fmt]
+                return Response(stream_with_context(stream), mimetype=mimetype, headers=headers)
+            
+            except ValueError as e:
+                return jsonify({'error': f'Invalid export parameters: {e}'}), 400
+            except Exception as e:
+                logger.error(f"Error exporting observations: {e}")
+                return jsonify({'error': str(e)}), 500
     
     def _get_station_status(self, station_id: str) -> Dict:
         """Get status information for a specific station"""
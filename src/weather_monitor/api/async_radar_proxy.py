@@ -0,0 +1,321 @@
+import asyncio
+import gzip
+import io
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+from loguru import logger
+
+from .radar_client import RainViewerClient
+from .radar_proxy import RadarProxyAPI
+from .tile_cache_policy import UPSTREAM_TIMEOUT_SECONDS, TileCachePolicy, run_lookup_async
+from ..database.database_factory import get_database_manager
+from ..models.radar import RadarAnimation, RadarTileInfo
+from ..services.radar_render import RenderCache
+from ..services.tile_image import empty_tile, encode_png
+
+WEATHER_MAPS_URL = "https://api.rainviewer.com/public/weather-maps.json"
+MAPS_CACHE_SECONDS = 30  # Weather-maps index shared by concurrent requests
+MAX_UPSTREAM_CONNECTIONS = 64
+
+# Not forwarded from the WSGI fallback; aiohttp sets its own
+HOP_BY_HOP_HEADERS = {'connection', 'content-length', 'keep-alive', 'transfer-encoding'}
+
+class AsyncRadarProxyAPI:
+    """aiohttp radar proxy with non-blocking upstream and database I/O
+    
+    The tile, maps and historical endpoints run on the event loop, so one
+    process holds thousands of concurrent tile requests without a thread each.
+    Concurrent misses for the same tile share one upstream fetch. Every other
+    route is served by the Flask app in a worker thread.
+    """
+    
+    def __init__(self):
+        self.radar_client = RainViewerClient()
+        self.db_manager = get_database_manager(asynchronous=True)
+        self.flask_api = RadarProxyAPI()
+        self.tile_cache = RenderCache(max_entries=1024)  # Decompressed PNGs keyed by (frame path, zoom, x, y)
+        self.tile_policy = TileCachePolicy(self.tile_cache)  # Same lookup order as the Flask proxy
+        self._empty_tile_png = encode_png(empty_tile())
+        
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._maps: Tuple[float, Optional[RadarAnimation]] = (0.0, None)
+        self._maps_lock = asyncio.Lock()
+        
+        self.app = web.Application()
+        self.app.on_response_prepare.append(self._add_cors_headers)
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
+        self._register_routes()
+    
+    def _register_routes(self):
+        """Register API routes"""
+        self.app.router.add_get('/api/radar/maps', self.get_weather_maps)
+        self.app.router.add_get('/api/radar/tile/{tile_path:.+}', self.get_radar_tile)
+        self.app.router.add_get('/api/radar/historical', self.get_historical_radar)
+        self.app.router.add_post('/api/radar/cache/warm', self.warm_tile_cache)
+        self.app.router.add_get('/health', self.health_check)
+        self.app.router.add_route('*', '/{path:.*}', self._wsgi_fallback)
+    
+    async def _add_cors_headers(self, request: web.Request, response: web.StreamResponse):
+        """Allow cross-origin access like the Flask app does for Grafana"""
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+    
+    async def _on_startup(self, app: web.Application):
+        """Open the upstream HTTP session"""
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=UPSTREAM_TIMEOUT_SECONDS),
+            connector=aiohttp.TCPConnector(limit=MAX_UPSTREAM_CONNECTIONS)
+        )
+    
+    async def _on_cleanup(self, app: web.Application):
+        """Close the upstream session and the database connection"""
+        if self.session:
+            await self.session.close()
+        await self.db_manager.close()
+    
+    async def get_weather_maps(self, request: web.Request) -> web.Response:
+        """Get available weather maps from RainViewer"""
+        try:
+            animation = await self._get_animation()
+            if animation:
+                # Same serialization as the Flask route
+                return web.Response(text=self.flask_api.app.json.dumps(animation.dict()),
+                                    content_type='application/json')
+            return web.json_response({'error': 'Failed to fetch weather maps'}, status=500)
+        except Exception as e:
+            logger.error(f"Error in get_weather_maps: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def get_radar_tile(self, request: web.Request) -> web.Response:
+        """Proxy radar tile requests to RainViewer with caching"""
+        try:
+            tile_path = request.match_info['tile_path']
+            zoom = int(request.query.get('zoom', 6))
+            x = int(request.query.get('x', 0))
+            y = int(request.query.get('y', 0))
+            
+            tile_info = RadarTileInfo(
+                timestamp=datetime.now(timezone.utc),
+                zoom=zoom,
+                x=x,
+                y=y,
+                color_scheme=int(request.query.get('color', 1)),
+                snow=request.query.get('snow', 'false').lower() == 'true',
+                smooth=request.query.get('smooth', 'true').lower() == 'true'
+            )
+            
+            frame_path = self.tile_policy.frame_path(tile_path)
+            decision = await run_lookup_async(
+                self.tile_policy.lookup(tile_path, zoom, x, y),
+                lambda max_age_hours: self.db_manager.get_radar_tile(
+                    frame_path, zoom, x, y, max_age_hours=max_age_hours
+                )
+            )
+            if decision.source == 'local':
+                return self._png(decision.png or self._empty_tile_png)
+            
+            host = request.query.get('host', 'tilecache.rainviewer.com')
+            
+            if decision.revalidate:
+                asyncio.ensure_future(self._fetch_upstream_tile(host, frame_path, tile_info))
+            if decision.png:
+                return self._png(decision.png, cache='STALE' if decision.source == 'stale' else None)
+            
+            if decision.source == 'negative':
+                response = web.json_response({'error': 'Radar tile recently unavailable upstream'}, status=404)
+                response.headers['X-Cache'] = 'NEGATIVE'
+                return response
+            
+            tile_png = await self._fetch_upstream_tile(host, frame_path, tile_info)
+            if tile_png:
+                return self._png(tile_png)
+            return web.json_response({'error': 'Failed to fetch radar tile'}, status=404)
+        
+        except Exception as e:
+            logger.error(f"Error in get_radar_tile: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def get_historical_radar(self, request: web.Request) -> web.Response:
+        """Get historical radar data from local storage"""
+        try:
+            hours = int(request.query.get('hours', 2))
+            data_type = request.query.get('type', 'radar')
+            
+            return web.json_response({
+                'data_type': data_type,
+                'hours': hours,
+                'frames': await self.db_manager.get_historical_radar_frames(hours, data_type)
+            })
+        
+        except Exception as e:
+            logger.error(f"Error in get_historical_radar: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def warm_tile_cache(self, request: web.Request) -> web.Response:
+        """Load the stored tiles of the given frames into the in-memory tile cache"""
+        try:
+            payload = await request.json()
+            paths = payload.get('paths', []) if isinstance(payload, dict) else None
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                return web.json_response({'error': 'paths must be a list of frame paths'}, status=400)
+            
+            warmed = 0
+            for frame_path in paths:
+                frame_path = '/' + frame_path.strip('/')
+                state = await self.db_manager.get_radar_frame_state(frame_path, 'radar')
+                if not state:
+                    continue
+                
+                by_zoom = {}
+                for zoom, x, y in state['stored_tiles']:
+                    by_zoom.setdefault(zoom, []).append((x, y))
+                
+                for zoom, tiles in by_zoom.items():
+                    for (x, y), tile_data in (await self.db_manager.get_radar_tiles(frame_path, zoom, tiles) or {}).items():
+                        self.tile_cache.put((frame_path, zoom, x, y), gzip.decompress(tile_data))
+                        warmed += 1
+            
+            logger.info(f"Warmed tile cache with {warmed} tiles from {len(paths)} frames")
+            return web.json_response({'warmed': warmed, 'cache': self.tile_cache.stats()})
+        
+        except Exception as e:
+            logger.error(f"Error in warm_tile_cache: {e}")
+            return web.json_response({'error': str(e)}, status=500)
+    
+    async def health_check(self, request: web.Request) -> web.Response:
+        """Health check endpoint"""
+        return web.json_response({
+            'status': 'healthy',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'services': {
+                'database': await self.db_manager.test_connection(),
+                'radar_api': True
+            },
+            'tile_cache': self.tile_cache.stats(),
+            'upstream_inflight': len(self._inflight)
+        })
+    
+    def _png(self, data: bytes, cache: Optional[str] = None) -> web.Response:
+        """Build an image/png response"""
+        response = web.Response(body=data, content_type='image/png')
+        if cache:
+            response.headers['X-Cache'] = cache
+        return response
+    
+    async def _get_animation(self) -> Optional[RadarAnimation]:
+        """Get the weather-maps index, fetched at most once per MAPS_CACHE_SECONDS"""
+        async with self._maps_lock:
+            fetched_at, animation = self._maps
+            if animation and time.monotonic() - fetched_at < MAPS_CACHE_SECONDS:
+                return animation
+            
+            try:
+                async with self.session.get(WEATHER_MAPS_URL) as response:
+                    response.raise_for_status()
+                    animation = RadarAnimation.from_api_response(await response.json())
+                self._maps = (time.monotonic(), animation)
+                return animation
+            except Exception as e:
+                logger.error(f"Error fetching weather maps: {e}")
+                return None
+    
+    async def _fetch_upstream_tile(self, host: str, frame_path: str, tile_info: RadarTileInfo) -> Optional[bytes]:
+        """Fetch a tile upstream, sharing one request between concurrent callers, and return the PNG"""
+        cache_key = (frame_path, tile_info.zoom, tile_info.x, tile_info.y)
+        pending = self._inflight.get(cache_key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._download_tile(host, frame_path, tile_info))
+            self._inflight[cache_key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        
+        # Shielded so a client disconnect doesn't cancel the fetch for everyone else
+        return await asyncio.shield(pending)
+    
+    async def _download_tile(self, host: str, frame_path: str, tile_info: RadarTileInfo) -> Optional[bytes]:
+        """Download one tile within the timeout budget, caching it or recording the failure"""
+        cache_key = (frame_path, tile_info.zoom, tile_info.x, tile_info.y)
+        try:
+            async with self.session.get(RainViewerClient.tile_url(host, frame_path, tile_info)) as response:
+                response.raise_for_status()
+                tile_png = await response.read()
+        except Exception as e:
+            logger.error(f"Error fetching radar tile {cache_key} upstream: {e}")
+            self.tile_policy.upstream_failed(cache_key)
+            return None
+        
+        self.tile_policy.upstream_succeeded(cache_key, tile_png)
+        await self.db_manager.write_radar_tile(
+            timestamp=tile_info.timestamp,
+            data_type='radar',
+            tile_path=frame_path,
+            zoom=tile_info.zoom,
+            x=tile_info.x,
+            y=tile_info.y,
+            tile_data=gzip.compress(tile_png),
+            color_scheme=tile_info.color_scheme,
+            snow=tile_info.snow,
+            smooth=tile_info.smooth
+        )
+        return tile_png
+    
+    async def _wsgi_fallback(self, request: web.Request) -> web.Response:
+        """Serve any other route with the Flask app in a worker thread"""
+        body = await request.read()
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': request.path,
+            'QUERY_STRING': request.query_string,
+            'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'SERVER_NAME': request.host.split(':')[0],
+            'SERVER_PORT': str(request.url.port or 80),
+            'SERVER_PROTOCOL': f"HTTP/{request.version.major}.{request.version.minor}",
+            'REMOTE_ADDR': request.remote or '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': request.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                environ[key] = value
+        
+        def call_app():
+            started = {}
+            
+            def start_response(status, headers, exc_info=None):
+                started['status'] = int(status.split(' ', 1)[0])
+                started['headers'] = headers
+            
+            result = self.flask_api.app(environ, start_response)
+            try:
+                data = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            return started['status'], started['headers'], data
+        
+        status, headers, data = await asyncio.get_running_loop().run_in_executor(None, call_app)
+        response = web.Response(status=status, body=data)
+        for name, value in headers:
+            if name.lower() == 'content-type':
+                response.headers['Content-Type'] = value
+            elif name.lower() not in HOP_BY_HOP_HEADERS:
+                response.headers.add(name, value)
+        return response
+    
+    def run(self, host='0.0.0.0', port=5000, keepalive: int = 75, graceful_timeout: int = 60):
+        """Run the aiohttp application"""
+        logger.info(f"Starting async radar proxy API on {host}:{port}")
+        web.run_app(self.app, host=host, port=port, access_log=None, print=None,
+                    keepalive_timeout=keepalive, shutdown_timeout=graceful_timeout)
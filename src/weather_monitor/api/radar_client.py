@@ -1,11 +1,25 @@
 import requests
 import gzip
+import numpy as np
 from typing import Optional, Tuple
 from loguru import logger
 from datetime import datetime, timezone
 
 from ..models.radar import RadarAnimation, RadarTileInfo
 
+TILE_SIZE = 256
+
+
+def lonlat_to_world_pixels(lats, lons, zooms) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert lat/lon arrays to fractional Web Mercator world pixel coordinates"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    world_size = TILE_SIZE * np.power(2.0, np.asarray(zooms, dtype=np.float64))
+    
+    world_x = (lons + 180.0) / 360.0 * world_size
+    world_y = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2.0 * world_size
+    return world_x, world_y
+
 class RainViewerClient:
     """Client for RainViewer weather radar API"""
     
@@ -35,8 +49,9 @@ class RainViewerClient:
             logger.error(f"Unexpected error fetching weather maps: {e}")
             return None
     
-    def get_radar_tile(self, host: str, path: str, tile_info: RadarTileInfo) -> Optional[bytes]:
-        """Fetch a specific radar tile"""
+    @staticmethod
+    def tile_url(host: str, path: str, tile_info: RadarTileInfo) -> str:
+        """Build the RainViewer URL of a tile"""
         # Clean up host URL (remove https:// if present)
         clean_host = host.replace('https://', '').replace('http://', '')
         
@@ -44,10 +59,15 @@ class RainViewerClient:
         clean_path = path if path.startswith('/') else f'/{path}'
         
         # Construct tile URL - RainViewer format: https://host/path/zoom/x/y/color/snow_smooth.png
-        tile_url = f"https://{clean_host}{clean_path}/{tile_info.zoom}/{tile_info.x}/{tile_info.y}/{tile_info.color_scheme}/{'1' if tile_info.snow else '0'}_{'1' if tile_info.smooth else '0'}.png"
+        return f"https://{clean_host}{clean_path}/{tile_info.zoom}/{tile_info.x}/{tile_info.y}/{tile_info.color_scheme}/{'1' if tile_info.snow else '0'}_{'1' if tile_info.smooth else '0'}.png"
+    
+    def get_radar_tile(self, host: str, path: str, tile_info: RadarTileInfo,
+                       timeout: float = 10) -> Optional[bytes]:
+        """Fetch a specific radar tile"""
+        tile_url = self.tile_url(host, path, tile_info)
         
         try:
-            response = self.session.get(tile_url, timeout=10)
+            response = self.session.get(tile_url, timeout=timeout)
             response.raise_for_status()
             
             # Compress the tile data for storage
@@ -63,33 +83,60 @@ class RainViewerClient:
             logger.error(f"Unexpected error fetching radar tile: {e}")
             return None
     
+    @staticmethod
+    def calculate_tile_coordinates_batch(lats, lons, zooms) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Calculate tile x/y and pixel offsets within the tile for arrays of lat/lon
+
+        lats, lons and zooms broadcast against each other, so a scalar zoom
+        applies to every point.
+        """
+        world_x, world_y = lonlat_to_world_pixels(lats, lons, zooms)
+        
+        world_size = TILE_SIZE * np.power(2, np.asarray(zooms, dtype=np.int64))
+        world_x = np.clip(np.floor(world_x).astype(np.int64), 0, world_size - 1)
+        world_y = np.clip(np.floor(world_y).astype(np.int64), 0, world_size - 1)
+        
+        tile_x, pixel_x = np.divmod(world_x, TILE_SIZE)
+        tile_y, pixel_y = np.divmod(world_y, TILE_SIZE)
+        return tile_x, tile_y, pixel_x, pixel_y
+    
     def calculate_tile_coordinates(self, lat: float, lon: float, zoom: int) -> Tuple[int, int]:
         """Calculate tile coordinates for given lat/lon at zoom level"""
-        import math
-        
-        # Convert lat/lon to tile coordinates
-        lat_rad = math.radians(lat)
-        n = 2.0 ** zoom
+        x, y, _, _ = self.calculate_tile_coordinates_batch(lat, lon, zoom)
+        return int(x), int(y)
+    
+    @staticmethod
+    def get_coverage_tiles_batch(lats, lons, zoom: int = 6, radius: int = 2) -> list:
+        """Get the distinct tiles within radius tiles of any of the given points"""
+        tile_x, tile_y, _, _ = RainViewerClient.calculate_tile_coordinates_batch(lats, lons, zoom)
+        offsets = np.arange(-radius, radius + 1)
         
-        x = int((lon + 180.0) / 360.0 * n)
-        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        # (points, dx, dy) grid of candidate tiles, flattened and deduplicated
+        xs = np.atleast_1d(tile_x)[:, None, None] + offsets[None, :, None]
+        ys = np.atleast_1d(tile_y)[:, None, None] + offsets[None, None, :]
+        xs, ys = np.broadcast_arrays(xs, ys)
+        candidates = np.stack([xs.ravel(), ys.ravel()], axis=1)
         
-        return x, y
+        max_tile = 2 ** zoom
+        valid = (candidates >= 0).all(axis=1) & (candidates < max_tile).all(axis=1)
+        return [(int(x), int(y)) for x, y in np.unique(candidates[valid], axis=0)]
     
     def get_coverage_tiles(self, center_lat: float, center_lon: float, zoom: int = 6, radius: int = 2) -> list:
         """Get list of tile coordinates covering an area around center point"""
-        center_x, center_y = self.calculate_tile_coordinates(center_lat, center_lon, zoom)
+        return self.get_coverage_tiles_batch([center_lat], [center_lon], zoom, radius)
+    
+    def get_bbox_tiles(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                       zoom: int = 6) -> list:
+        """Get list of tile coordinates covering a lat/lon bounding box"""
+        # Tile y grows southwards, so the north edge gives the smallest y
+        min_x, min_y = self.calculate_tile_coordinates(max_lat, min_lon, zoom)
+        max_x, max_y = self.calculate_tile_coordinates(min_lat, max_lon, zoom)
         
+        max_tile = 2 ** zoom
         tiles = []
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                x = center_x + dx
-                y = center_y + dy
-                
-                # Ensure tiles are within valid bounds
-                max_tile = 2 ** zoom
-                if 0 <= x < max_tile and 0 <= y < max_tile:
-                    tiles.append((x, y))
+        for x in range(max(min_x, 0), min(max_x, max_tile - 1) + 1):
+            for y in range(max(min_y, 0), min(max_y, max_tile - 1) + 1):
+                tiles.append((x, y))
         
         return tiles
     
@@ -2,13 +2,29 @@ from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 import gzip
 import io
-from typing import Optional
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Set
 from loguru import logger
 from datetime import datetime, timezone
 
 from .radar_client import RainViewerClient
 from ..models.radar import RadarTileInfo
 from ..database.database_factory import get_database_manager
+from ..services.radar_render import (
+    BboxWindow, RenderCache, choose_zoom, encode_animation, encode_sprite,
+    parse_bbox, render_bbox, resize_image
+)
+from ..services.tile_image import empty_tile, encode_png
+from ..services.radar_accumulation import accumulation_path
+from .tile_cache_policy import UPSTREAM_TIMEOUT_SECONDS, TileCachePolicy, run_lookup
+
+MAX_ANIMATION_FRAMES = 24
+MAX_STORED_ZOOM = 7  # Deepest zoom level the collector stores
+MAX_MOSAIC_SIZE = 2048
+SELF_WARM_INTERVAL_SECONDS = 15  # How often each worker looks for newly completed frames to warm
+SELF_WARM_FRAMES = 3  # Most recent frames each worker keeps warm
 
 class RadarProxyAPI:
     """Flask API for radar data proxy and storage"""
@@ -19,9 +35,24 @@ class RadarProxyAPI:
         
         self.radar_client = RainViewerClient()
         self.db_manager = get_database_manager()
+        self.render_cache = RenderCache(max_entries=64)
+        self.tile_cache = RenderCache(max_entries=1024)  # Decompressed PNGs keyed by (frame path, zoom, x, y)
+        self._empty_tile_png = encode_png(empty_tile())
         
-        self._register_routes()
+        # Cache lookup order and negative caching, shared with the aiohttp proxy
+        self.tile_policy = TileCachePolicy(self.tile_cache)
+        
+        # Revalidations in flight, shared by request and revalidation threads
+        self._revalidating: Set[tuple] = set()
+        self._upstream_lock = threading.Lock()
         
+        # The tile cache is per process; every server worker warms its own as frames complete
+        self._warmed_frames: Deque[str] = deque(maxlen=SELF_WARM_FRAMES * 4)
+        self._next_warm_check = 0.0
+        self._warm_lock = threading.Lock()
+        
+        self._register_routes()
+    
     def _register_routes(self):
         """Register API routes"""
         
@@ -81,34 +112,107 @@ class RadarProxyAPI:
                     smooth=smooth
                 )
                 
-                # Try to get from cache first
-                cached_tile = self._get_cached_tile(tile_path, tile_info)
-                if cached_tile:
-                    # Decompress and return cached tile
-                    decompressed = gzip.decompress(cached_tile)
-                    return Response(decompressed, mimetype='image/png')
+                frame_path = self.tile_policy.frame_path(tile_path)
+                
+                # In-memory tiles first, warmed by this worker as new frames complete
+                if not self.tile_policy.is_local(tile_path):
+                    self._warm_new_frames()
+                
+                decision = run_lookup(
+                    self.tile_policy.lookup(tile_path, zoom, x, y),
+                    lambda max_age_hours: self.db_manager.get_radar_tile(
+                        frame_path, zoom, x, y, max_age_hours=max_age_hours
+                    )
+                )
+                if decision.source == 'local':
+                    return Response(decision.png or self._empty_tile_png, mimetype='image/png')
                 
                 # Get host from query params or maps API
                 host = request.args.get('host', 'tilecache.rainviewer.com')
                 
-                # Clean up the tile_path and host for proper URL construction
-                clean_tile_path = tile_path.strip('/')
-                tile_data = self.radar_client.get_radar_tile(host, f"/{clean_tile_path}", tile_info)
+                if decision.revalidate:
+                    self._revalidate_tile(host, frame_path, tile_info)
+                if decision.png:
+                    response = Response(decision.png, mimetype='image/png')
+                    if decision.source == 'stale':
+                        response.headers['X-Cache'] = 'STALE'
+                    return response
+                
+                if decision.source == 'negative':
+                    response = jsonify({'error': 'Radar tile recently unavailable upstream'})
+                    response.headers['X-Cache'] = 'NEGATIVE'
+                    return response, 404
+                
+                tile_data = self._fetch_upstream_tile(host, frame_path, tile_info)
                 
                 if tile_data:
-                    # Cache the tile
-                    self._cache_tile(tile_path, tile_info, tile_data)
-                    
-                    # Return decompressed tile
-                    decompressed = gzip.decompress(tile_data)
-                    return Response(decompressed, mimetype='image/png')
+                    return Response(gzip.decompress(tile_data), mimetype='image/png')
                 else:
                     return jsonify({'error': 'Failed to fetch radar tile'}), 404
-                    
+            
             except Exception as e:
                 logger.error(f"Error in get_radar_tile: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/radar/nowcast', methods=['GET'])
+        def get_radar_nowcast():
+            """List the nowcast frames extrapolated from the latest radar frame"""
+            try:
+                frames = self.db_manager.get_radar_frame_states(data_type='nowcast', limit=12)
+                if not frames:
+                    return jsonify({'error': 'No nowcast available'}), 404
+                
+                # Only the frames of the most recent source frame
+                source = frames[0]['tile_path'].rsplit('/', 1)[0]
+                latest = sorted(
+                    (frame for frame in frames if frame['tile_path'].rsplit('/', 1)[0] == source),
+                    key=lambda frame: str(frame['timestamp'])
+                )
+                
+                return jsonify({
+                    'source': source,
+                    'frames': [
+                        {
+                            'path': frame['tile_path'],
+                            'valid_time': frame['timestamp'],
+                            'lead_minutes': int(frame['tile_path'].rsplit('/', 1)[1]),
+                            'tile_url': f"/api/radar/tile{frame['tile_path']}?zoom={{z}}&x={{x}}&y={{y}}"
+                        }
+                        for frame in latest
+                    ]
+                })
+            
+            except Exception as e:
+                logger.error(f"Error in get_radar_nowcast: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/radar/accumulation', methods=['GET'])
+        def get_radar_accumulation():
+            """Get rolling radar precipitation accumulations at stations and their tile layers"""
+            try:
+                station_id = request.args.get('station_id')
+                hours = request.args.get('hours', type=int)
+                
+                values = self.db_manager.get_radar_accumulations(station_id=station_id, hours=hours)
+                windows = sorted({value['window_hours'] for value in values})
+                
+                return jsonify({
+                    'timestamp': values[-1]['timestamp'] if values else None,
+                    'layers': [
+                        {
+                            'window_hours': window,
+                            'path': accumulation_path(window),
+                            'tile_url': f"/api/radar/tile{accumulation_path(window)}?zoom={{z}}&x={{x}}&y={{y}}"
+                        }
+                        for window in windows
+                    ],
+                    'stations': values
+                })
+            
+            except Exception as e:
+                logger.error(f"Error in get_radar_accumulation: {e}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/api/radar/coverage', methods=['GET'])
         def get_radar_coverage():
             """Get radar coverage tiles for a specific area"""
@@ -117,20 +221,53 @@ class RadarProxyAPI:
                 lon = float(request.args.get('lon', -73.88))
                 zoom = int(request.args.get('zoom', 6))
                 radius = int(request.args.get('radius', 2))
+                points = request.args.get('points')
                 
-                tiles = self.radar_client.get_coverage_tiles(lat, lon, zoom, radius)
+                if points:
+                    # Coverage of several points (e.g. every station) in one call
+                    lats, lons = self._parse_points(points)
+                    tiles = self.radar_client.get_coverage_tiles_batch(lats, lons, zoom, radius)
+                else:
+                    tiles = self.radar_client.get_coverage_tiles(lat, lon, zoom, radius)
                 
                 return jsonify({
-                    'center': {'lat': lat, 'lon': lon},
+                    'center': {'lat': lat, 'lon': lon} if not points else None,
                     'zoom': zoom,
                     'radius': radius,
                     'tiles': [{'x': x, 'y': y} for x, y in tiles]
                 })
-                
+            
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             except Exception as e:
                 logger.error(f"Error in get_radar_coverage: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/radar/tile-coordinates', methods=['GET'])
+        def get_tile_coordinates():
+            """Get tile x/y and pixel offsets for a list of points"""
+            try:
+                lats, lons = self._parse_points(request.args.get('points', ''))
+                zoom = int(request.args.get('zoom', 7))
+                
+                tile_x, tile_y, pixel_x, pixel_y = self.radar_client.calculate_tile_coordinates_batch(lats, lons, zoom)
+                
+                return jsonify({
+                    'zoom': zoom,
+                    'points': [
+                        {'lat': lat, 'lon': lon, 'x': x, 'y': y, 'pixel_x': px, 'pixel_y': py}
+                        for lat, lon, x, y, px, py in zip(
+                            lats, lons, tile_x.tolist(), tile_y.tolist(), pixel_x.tolist(), pixel_y.tolist()
+                        )
+                    ]
+                })
+            
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in get_tile_coordinates: {e}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/api/radar/historical', methods=['GET'])
         def get_historical_radar():
             """Get historical radar data from local storage"""
@@ -145,11 +282,148 @@ class RadarProxyAPI:
                     'hours': hours,
                     'frames': historical_data
                 })
-                
+            
             except Exception as e:
                 logger.error(f"Error in get_historical_radar: {e}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/radar/animation', methods=['GET'])
+        def get_radar_animation():
+            """Render stored frames over a bbox as one animated PNG or sprite sheet"""
+            try:
+                bbox, zoom, frames = self._parse_animation_args()
+                output_format = request.args.get('format', 'apng')
+                delay_ms = int(request.args.get('delay', 500))
+                
+                if output_format not in ('apng', 'sprite'):
+                    return jsonify({'error': "format must be 'apng' or 'sprite'"}), 400
+                if not frames:
+                    return jsonify({'error': 'No stored radar frames in range'}), 404
+                
+                # Frame paths are part of the key, so a new frame yields a new entry
+                cache_key = ('animation', output_format, tuple(frame['tile_path'] for frame in frames),
+                             bbox, zoom, delay_ms if output_format == 'apng' else None)
+                image = self.render_cache.get(cache_key)
+                
+                if image is None:
+                    rendered = [render_bbox(self.db_manager, frame['tile_path'], bbox, zoom) for frame in frames]
+                    if output_format == 'apng':
+                        image = encode_animation(rendered, delay_ms)
+                    else:
+                        image = encode_sprite(rendered)
+                    self.render_cache.put(cache_key, image)
+                
+                response = Response(image, mimetype='image/png')
+                response.headers['X-Radar-Frames'] = ','.join(str(frame['timestamp']) for frame in frames)
+                response.headers['Cache-Control'] = 'public, max-age=60'
+                return response
+            
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in get_radar_animation: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/radar/animation/index', methods=['GET'])
+        def get_radar_animation_index():
+            """Describe the frames and sprite layout of an animation request"""
+            try:
+                bbox, zoom, frames = self._parse_animation_args()
+                if not frames:
+                    return jsonify({'error': 'No stored radar frames in range'}), 404
+                
+                # Size of one rendered frame, from the same bbox window the renderer uses
+                window = BboxWindow(bbox, zoom)
+                
+                query = request.query_string.decode()
+                return jsonify({
+                    'bbox': list(bbox),
+                    'zoom': zoom,
+                    'width': window.width,
+                    'height': window.height,
+                    'frames': [
+                        {
+                            'index': index,
+                            'timestamp': frame['timestamp'],
+                            'path': frame['tile_path'],
+                            'complete': frame['complete'],
+                            'sprite_offset_y': index * window.height
+                        }
+                        for index, frame in enumerate(frames)
+                    ],
+                    'sprite_url': f"/api/radar/animation?{query}&format=sprite",
+                    'animation_url': f"/api/radar/animation?{query}&format=apng"
+                })
+            
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in get_radar_animation_index: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/radar/mosaic', methods=['GET'])
+        def get_radar_mosaic():
+            """Stitch stored tiles of one frame into a single image cropped to a bbox"""
+            try:
+                bbox = parse_bbox(request.args.get('bbox', ''))
+                zoom = request.args.get('zoom', type=int)
+                width = request.args.get('width', type=int)
+                height = request.args.get('height', type=int)
+                frame_path = request.args.get('frame')
+                
+                if zoom is None:
+                    zoom = choose_zoom(bbox, MAX_STORED_ZOOM)
+                for size in (width, height):
+                    if size is not None and not 0 < size <= MAX_MOSAIC_SIZE:
+                        return jsonify({'error': f'width and height must be between 1 and {MAX_MOSAIC_SIZE}'}), 400
+                
+                if frame_path:
+                    frame = self.db_manager.get_radar_frame_state(frame_path, 'radar')
+                else:
+                    latest = self._get_stored_frames(1)
+                    frame = latest[0] if latest else None
+                if not frame:
+                    return jsonify({'error': 'No stored radar frame'}), 404
+                
+                cache_key = ('mosaic', frame['tile_path'], bbox, zoom, width, height)
+                image = self.render_cache.get(cache_key)
+                
+                if image is None:
+                    mosaic = render_bbox(self.db_manager, frame['tile_path'], bbox, zoom)
+                    image = encode_png(resize_image(mosaic, width, height))
+                    self.render_cache.put(cache_key, image)
+                
+                response = Response(image, mimetype='image/png')
+                response.headers['X-Radar-Frame'] = str(frame['timestamp'])
+                response.headers['X-Radar-Zoom'] = str(zoom)
+                response.headers['Cache-Control'] = 'public, max-age=60'
+                return response
+            
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except Exception as e:
+                logger.error(f"Error in get_radar_mosaic: {e}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/radar/cache/warm', methods=['POST'])
+        def warm_tile_cache():
+            """Load the stored tiles of the given frames into the in-memory tile cache
+            
+            Only the worker handling the request is warmed; the others pick the
+            frames up on their own within SELF_WARM_INTERVAL_SECONDS.
+            """
+            try:
+                payload = request.get_json(silent=True) or {}
+                paths = payload.get('paths', [])
+                if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                    return jsonify({'error': 'paths must be a list of frame paths'}), 400
+                
+                return jsonify({'warmed': self._warm_tile_cache(paths), 'cache': self.tile_cache.stats()})
+            
+            except Exception as e:
+                logger.error(f"Error in warm_tile_cache: {e}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """Health check endpoint"""
@@ -159,22 +433,86 @@ class RadarProxyAPI:
                 'services': {
                     'database': self.db_manager.test_connection(),
                     'radar_api': True  # Could add actual RainViewer API health check
-                }
+                },
+                'tile_cache': self.tile_cache.stats()
             })
     
-    def _get_cached_tile(self, tile_path: str, tile_info: RadarTileInfo) -> Optional[bytes]:
-        """Get cached tile from database"""
-        try:
-            return self.db_manager.get_radar_tile(
-                tile_path, 
-                tile_info.zoom, 
-                tile_info.x, 
-                tile_info.y, 
-                max_age_hours=1
-            )
-        except Exception as e:
-            logger.error(f"Error getting cached tile: {e}")
-            return None
+    def _fetch_upstream_tile(self, host: str, frame_path: str, tile_info: RadarTileInfo) -> Optional[bytes]:
+        """Fetch a tile upstream within the timeout budget, caching it or recording the failure"""
+        cache_key = (frame_path, tile_info.zoom, tile_info.x, tile_info.y)
+        tile_data = self.radar_client.get_radar_tile(host, frame_path, tile_info, timeout=UPSTREAM_TIMEOUT_SECONDS)
+        
+        if tile_data:
+            self._cache_tile(frame_path, tile_info, tile_data)
+            self.tile_policy.upstream_succeeded(cache_key, gzip.decompress(tile_data))
+        else:
+            self.tile_policy.upstream_failed(cache_key)
+        return tile_data
+    
+    def _revalidate_tile(self, host: str, frame_path: str, tile_info: RadarTileInfo):
+        """Refresh a stale tile from upstream in a background thread, once per tile at a time"""
+        cache_key = (frame_path, tile_info.zoom, tile_info.x, tile_info.y)
+        with self._upstream_lock:
+            if cache_key in self._revalidating:
+                return
+            self._revalidating.add(cache_key)
+        
+        def revalidate():
+            try:
+                self._fetch_upstream_tile(host, frame_path, tile_info)
+            except Exception as e:
+                logger.error(f"Error revalidating tile {cache_key}: {e}")
+            finally:
+                with self._upstream_lock:
+                    self._revalidating.discard(cache_key)
+        
+        threading.Thread(target=revalidate, daemon=True).start()
+    
+    def _warm_new_frames(self):
+        """Warm this worker's cache in the background with recent frames it hasn't loaded yet
+        
+        Checked at most once per SELF_WARM_INTERVAL_SECONDS, with one small
+        query on the frame state table.
+        """
+        now = time.monotonic()
+        with self._warm_lock:
+            if now < self._next_warm_check:
+                return
+            self._next_warm_check = now + SELF_WARM_INTERVAL_SECONDS
+        
+        frames = self.db_manager.get_radar_frame_states(data_type='radar', limit=SELF_WARM_FRAMES)
+        new_paths = self._mark_warmed([frame['tile_path'] for frame in frames if frame['complete']])
+        if new_paths:
+            threading.Thread(target=self._warm_tile_cache, args=(new_paths,), daemon=True).start()
+    
+    def _mark_warmed(self, frame_paths: list) -> list:
+        """Remember frames as warmed in this worker, returning those that weren't yet"""
+        with self._warm_lock:
+            new_paths = [path for path in frame_paths if path not in self._warmed_frames]
+            self._warmed_frames.extend(new_paths)
+        return new_paths
+    
+    def _warm_tile_cache(self, frame_paths: list) -> int:
+        """Copy every stored tile of the given frames into the in-memory cache, returning the count"""
+        warmed = 0
+        for frame_path in frame_paths:
+            frame_path = '/' + frame_path.strip('/')
+            state = self.db_manager.get_radar_frame_state(frame_path, 'radar')
+            if not state:
+                continue
+            self._mark_warmed([frame_path])
+            
+            by_zoom = {}
+            for zoom, x, y in state['stored_tiles']:
+                by_zoom.setdefault(zoom, []).append((x, y))
+            
+            for zoom, tiles in by_zoom.items():
+                for (x, y), tile_data in (self.db_manager.get_radar_tiles(frame_path, zoom, tiles) or {}).items():
+                    self.tile_cache.put((frame_path, zoom, x, y), gzip.decompress(tile_data))
+                    warmed += 1
+        
+        logger.info(f"Warmed tile cache with {warmed} tiles from {len(frame_paths)} frames")
+        return warmed
     
     def _cache_tile(self, tile_path: str, tile_info: RadarTileInfo, tile_data: bytes):
         """Cache tile data in database"""
@@ -202,6 +540,49 @@ class RadarProxyAPI:
             logger.error(f"Error getting historical data: {e}")
             return []
     
+    def _parse_points(self, value: str):
+        """Parse a 'lat,lon;lat,lon;...' list into latitude and longitude lists"""
+        try:
+            pairs = [tuple(float(part) for part in point.split(',')) for point in value.split(';') if point]
+            lats = [lat for lat, _ in pairs]
+            lons = [lon for _, lon in pairs]
+        except ValueError:
+            raise ValueError("points must be lat,lon pairs separated by ';'")
+        
+        if not pairs:
+            raise ValueError("points must contain at least one lat,lon pair")
+        return lats, lons
+    
+    def _parse_animation_args(self):
+        """Parse bbox, zoom and frame range query parameters"""
+        bbox = parse_bbox(request.args.get('bbox', ''))
+        zoom = int(request.args.get('zoom', 7))
+        count = min(int(request.args.get('frames', 13)), MAX_ANIMATION_FRAMES)
+        start = request.args.get('start', type=float)
+        end = request.args.get('end', type=float)
+        
+        if not 0 <= zoom <= 20:
+            raise ValueError("zoom must be between 0 and 20")
+        
+        return bbox, zoom, self._get_stored_frames(count, start, end)
+    
+    def _get_stored_frames(self, count: int, start: Optional[float] = None,
+                           end: Optional[float] = None) -> list:
+        """Get up to count stored radar frames, oldest first, within [start, end] unix seconds"""
+        frames = self.db_manager.get_radar_frame_states(data_type='radar', limit=MAX_ANIMATION_FRAMES * 4)
+        
+        selected = []
+        for frame in frames:
+            frame_time = datetime.fromisoformat(str(frame['timestamp'])).timestamp()
+            if start is not None and frame_time < start:
+                continue
+            if end is not None and frame_time > end:
+                continue
+            selected.append(frame)
+        
+        # States come newest first
+        return list(reversed(selected[:count]))
+    
     def run(self, host='0.0.0.0', port=5000, debug=False):
         """Run the Flask application"""
         logger.info(f"Starting radar proxy API on {host}:{port}")
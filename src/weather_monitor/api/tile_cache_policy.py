@@ -0,0 +1,132 @@
+"""
+Tile lookup decisions shared by the Flask and aiohttp radar proxies
+"""
+
+import gzip
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Generator, Optional
+
+from ..services.radar_accumulation import ACCUMULATION_PATH_PREFIX
+from ..services.radar_nowcast import NOWCAST_PATH_PREFIX
+from ..services.radar_render import RenderCache
+
+UPSTREAM_TIMEOUT_SECONDS = 3.0  # Budget for one upstream tile fetch
+NEGATIVE_CACHE_SECONDS = 60  # How long a missing or failed upstream tile is not retried
+FRESH_TILE_MAX_AGE_HOURS = 1  # Stored copies served as current
+STALE_TILE_MAX_AGE_HOURS = 24  # Oldest cached copy served while revalidating
+LOCAL_TILE_MAX_AGE_HOURS = 2  # Nowcast and accumulation tiles
+LOCAL_TILE_ROOTS = {NOWCAST_PATH_PREFIX.strip('/'), ACCUMULATION_PATH_PREFIX.strip('/')}  # Layers served only from the store
+
+
+@dataclass
+class StoreLookup:
+    """Request for the newest stored copy of the tile no older than max_age_hours"""
+    max_age_hours: int
+
+
+@dataclass
+class TileDecision:
+    """How a tile request is answered
+    
+    source is 'local', 'memory', 'fresh' or 'stale' with the PNG in png,
+    'negative' for a tile that recently failed upstream, or 'upstream' when
+    it has to be fetched. A local layer tile that isn't stored has no PNG and
+    is served as an empty tile.
+    """
+    source: str
+    png: Optional[bytes] = None
+    revalidate: bool = False  # Refresh the stale copy upstream in the background
+
+
+class TileCachePolicy:
+    """In-memory, stored, stale and negative caching of proxied radar tiles
+    
+    lookup() holds the order in which the caches are consulted but does no
+    I/O: it yields a StoreLookup for each database read and receives the
+    stored tile back, so the Flask proxy drives it with blocking calls and the
+    aiohttp proxy with awaits.
+    """
+    
+    def __init__(self, tile_cache: RenderCache):
+        self.tile_cache = tile_cache  # Decompressed PNGs keyed by (frame path, zoom, x, y)
+        self._negative_cache: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def frame_path(tile_path: str) -> str:
+        """Frame paths are stored with a leading slash by the collector"""
+        return '/' + tile_path.strip('/')
+    
+    @staticmethod
+    def is_local(tile_path: str) -> bool:
+        """Nowcast and accumulation layers are produced locally and never fetched upstream"""
+        return tile_path.strip('/').split('/', 1)[0] in LOCAL_TILE_ROOTS
+    
+    def lookup(self, tile_path: str, zoom: int, x: int,
+               y: int) -> Generator[StoreLookup, Optional[bytes], TileDecision]:
+        """Decide how to answer a tile request, yielding the stored copies it needs"""
+        cache_key = (self.frame_path(tile_path), zoom, x, y)
+        
+        if self.is_local(tile_path):
+            stored = yield StoreLookup(LOCAL_TILE_MAX_AGE_HOURS)
+            return TileDecision('local', gzip.decompress(stored) if stored else None)
+        
+        memory_tile = self.tile_cache.get(cache_key)
+        if memory_tile:
+            return TileDecision('memory', memory_tile)
+        
+        stored = yield StoreLookup(FRESH_TILE_MAX_AGE_HOURS)
+        if stored:
+            png = gzip.decompress(stored)
+            self.tile_cache.put(cache_key, png)
+            return TileDecision('fresh', png)
+        
+        # An older copy is served right away and refreshed in the background
+        stale = yield StoreLookup(STALE_TILE_MAX_AGE_HOURS)
+        if stale:
+            return TileDecision('stale', gzip.decompress(stale), revalidate=not self.is_negative(cache_key))
+        
+        # Missing tiles and upstream failures are not retried until the entry expires
+        if self.is_negative(cache_key):
+            return TileDecision('negative')
+        return TileDecision('upstream')
+    
+    def is_negative(self, cache_key: tuple) -> bool:
+        """Check whether a tile recently failed upstream"""
+        with self._lock:
+            expiry = self._negative_cache.get(cache_key)
+            return expiry is not None and expiry > time.monotonic()
+    
+    def upstream_succeeded(self, cache_key: tuple, png: bytes):
+        """Keep a tile fetched upstream in memory"""
+        self.tile_cache.put(cache_key, png)
+    
+    def upstream_failed(self, cache_key: tuple):
+        """Stop retrying a tile upstream for NEGATIVE_CACHE_SECONDS"""
+        with self._lock:
+            # Expired entries are dropped here so the table stays small
+            now = time.monotonic()
+            self._negative_cache = {key: expiry for key, expiry in self._negative_cache.items() if expiry > now}
+            self._negative_cache[cache_key] = now + NEGATIVE_CACHE_SECONDS
+
+
+def run_lookup(steps: Generator[StoreLookup, Optional[bytes], TileDecision], read) -> TileDecision:
+    """Drive a lookup with a blocking read(max_age_hours) -> stored tile"""
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(read(request.max_age_hours))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_lookup_async(steps: Generator[StoreLookup, Optional[bytes], TileDecision], read) -> TileDecision:
+    """Drive a lookup with an awaitable read(max_age_hours) -> stored tile"""
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(await read(request.max_age_hours))
+    except StopIteration as stop:
+        return stop.value
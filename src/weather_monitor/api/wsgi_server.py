@@ -0,0 +1,57 @@
+import multiprocessing
+from typing import Callable, Optional
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+from loguru import logger
+
+
+def default_workers() -> int:
+    """Gunicorn's usual (2 x cores) + 1 worker count"""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+class ProductionServer(BaseApplication):
+    """Multi-worker gunicorn server for the Flask APIs
+    
+    The app factory runs in each worker after the fork, so every worker gets
+    its own database manager, HTTP session and in-memory caches. Send SIGHUP
+    to the master for a graceful reload: new workers are started and the old
+    ones finish their in-flight requests within graceful_timeout.
+    """
+    
+    def __init__(self, app_factory: Callable[[], Flask], name: str, host: str = '0.0.0.0', port: int = 5000,
+                 workers: Optional[int] = None, threads: int = 4, keepalive: int = 5, timeout: int = 30,
+                 graceful_timeout: int = 30, max_requests: int = 0):
+        self.app_factory = app_factory
+        self.options = {
+            'bind': f"{host}:{port}",
+            'workers': workers or default_workers(),
+            'worker_class': 'gthread',  # Threads keep slow upstream fetches from blocking a worker
+            'threads': threads,
+            'keepalive': keepalive,
+            'timeout': timeout,
+            'graceful_timeout': graceful_timeout,
+            'max_requests': max_requests,
+            'max_requests_jitter': max_requests // 10,
+            'proc_name': name,
+            'accesslog': None,
+            'errorlog': '-',
+        }
+        super().__init__()
+    
+    def load_config(self):
+        """Apply the server options to gunicorn's config"""
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        """Build the Flask app inside the worker"""
+        return self.app_factory()
+    
+    def run(self):
+        """Start the master process and its workers"""
+        logger.info(f"Starting {self.options['proc_name']} on {self.options['bind']} with "
+                    f"{self.options['workers']} workers x {self.options['threads']} threads "
+                    f"(keep-alive {self.options['keepalive']}s)")
+        super().run()
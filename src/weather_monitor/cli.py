@@ -1,6 +1,7 @@
 import click
 import os
 import sys
+from pathlib import Path
 from loguru import logger
 
 from .monitor import WeatherMonitor
@@ -48,36 +49,320 @@ def test():
     else:
         click.echo("❌ Database connection failed")
 
+@cli.command()
+@click.option('--mode', type=click.Choice(['auto', 'passive', 'restart', 'truncate']), default='auto',
+              help='Checkpoint mode (auto picks one from the WAL size)')
+def checkpoint(mode):
+    """Checkpoint the database WAL"""
+    from .database.wal_checkpoint import WalCheckpointManager
+    
+    manager = WalCheckpointManager(
+        settings.sqlite_db_path,
+        passive_bytes=settings.wal_passive_mb * 1024 * 1024,
+        restart_bytes=settings.wal_restart_mb * 1024 * 1024,
+        journal_size_limit=settings.wal_journal_size_limit_mb * 1024 * 1024
+    )
+    wal_before = manager.wal_size()
+    if mode == 'auto':
+        mode = manager.run_once()
+        if not mode:
+            click.echo(f"WAL is {wal_before} bytes, below the {manager.passive_bytes} byte threshold; nothing to do")
+        else:
+            click.echo(f"✅ {mode} checkpoint, WAL {wal_before} -> {manager.wal_size()} bytes")
+        return
+    
+    result = manager.checkpoint(mode)
+    if result is None:
+        click.echo(f"❌ {mode.upper()} checkpoint failed")
+        return
+    click.echo(f"✅ {mode.upper()} checkpoint: {result['checkpointed_frames']}/{result['log_frames']} frames"
+               f"{' (blocked by readers)' if result['busy'] else ''}, WAL {wal_before} -> {manager.wal_size()} bytes")
+
+@cli.command()
+@click.option('--output', type=click.Path(dir_okay=False), default=None,
+              help='Backup file to write (default: a timestamped file in --dir)')
+@click.option('--dir', 'directory', default=None, help='Directory for timestamped backups (default: BACKUP_DIR)')
+@click.option('--keep', default=None, type=int, help='Timestamped backups to keep (default: BACKUP_KEEP)')
+@click.option('--pages', default=None, type=int, help='Pages copied per step (default: BACKUP_PAGES_PER_STEP)')
+@click.option('--sleep-ms', default=None, type=int, help='Pause between steps (default: BACKUP_STEP_SLEEP_MS)')
+@click.option('--every-hours', default=None, type=float,
+              help='Keep running and back up on this interval (0: BACKUP_INTERVAL_HOURS)')
+def backup(output, directory, keep, pages, sleep_ms, every_hours):
+    """Back up the database online without stopping writers"""
+    from .database.backup import DatabaseBackup
+    
+    database_backup = DatabaseBackup(
+        settings.sqlite_db_path,
+        pages_per_step=pages or settings.backup_pages_per_step,
+        step_sleep=(settings.backup_step_sleep_ms if sleep_ms is None else sleep_ms) / 1000
+    )
+    directory = directory or settings.backup_dir
+    keep = settings.backup_keep if keep is None else keep
+    
+    if every_hours is not None:
+        try:
+            database_backup.start_schedule(directory, every_hours or settings.backup_interval_hours, keep)
+        except KeyboardInterrupt:
+            logger.info("Received interrupt signal, stopping scheduled backups...")
+        return
+    
+    result = database_backup.backup(output) if output else database_backup.backup_to_directory(directory, keep)
+    if not result:
+        click.echo("❌ Backup failed")
+        sys.exit(1)
+    
+    click.echo(f"✅ Backed up {result['pages']} pages ({result['bytes'] / 1024 / 1024:.1f} MB) to {result['destination']}")
+    click.echo(f"  {result['duration_seconds']}s, {result['pages_per_second']} pages/s over {result['steps']} steps")
+    click.echo(f"  Source lock held {result['stall_seconds_total']}s in total, longest step {result['stall_seconds_max'] * 1000:.1f} ms")
+
+@cli.command('import-csv')
+@click.argument('csv_path', type=click.Path(exists=True))
+@click.option('--batch-size', default=20000, help='Rows per transaction')
+@click.option('--workers', default=None, type=int, help='Files imported in parallel (default: CPU count)')
+@click.option('--restart', is_flag=True, help='Delete rows from earlier imports of the files and import them from the start')
+def import_csv(csv_path, batch_size, workers, restart):
+    """Bulk import Weather Underground CSV exports (file or directory, .gz/.xz accepted)"""
+    from .database.bulk_import import CsvBulkImporter
+    
+    importer = CsvBulkImporter(settings.sqlite_db_path, batch_size=batch_size, workers=workers)
+    summary = importer.import_path(csv_path, restart=restart)
+    
+    click.echo(f"✅ Imported {summary['rows']} observations from {summary['files']} file(s) in "
+               f"{summary['duration_seconds']}s ({summary['rows_per_second']} rows/s, {summary['errors']} bad rows)")
+    for failed in summary['failed_files']:
+        click.echo(f"❌ {failed} failed; rerun to resume from its checkpoint")
+    if summary['failed_files']:
+        sys.exit(1)
+
+@cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', help='Output format')
+@click.option('--station', default=None, help='Only this station ID')
+@click.option('--start', default=None, help='Start time, inclusive (ISO date or datetime)')
+@click.option('--end', default=None, help='End time, exclusive (ISO date or datetime)')
+@click.option('--columns', default=None, help='Comma-separated columns (default: all)')
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the output with gzip')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default='-', help='Output file (default: stdout)')
+@click.option('--chunk-size', default=5000, type=click.IntRange(min=1), help='Rows fetched per query')
+def export(fmt, station, start, end, columns, compress, output, chunk_size):
+    """Stream observations to CSV or NDJSON with constant memory"""
+    from .database.database_factory import get_database_manager
+    from .services import observation_export
+    
+    if output == '-':
+        # Keep log lines out of the exported data
+        logger.remove()
+        logger.add(sys.stderr, level=settings.log_level, format="{time:HH:mm:ss} | {level} | {message}")
+    
+    try:
+        stream = observation_export.export_observations(
+            get_database_manager(),
+            fmt=fmt,
+            compress=compress,
+            station_id=station,
+            start=observation_export.parse_time_bound(start),
+            end=observation_export.parse_time_bound(end),
+            columns=observation_export.parse_columns(columns),
+            chunk_size=chunk_size
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    
+    with click.open_file(output, 'wb') as out:
+        for chunk in stream:
+            out.write(chunk)
+
+@cli.command()
+@click.option('--older-than-hours', default=None, type=float,
+              help='Compact observations older than this (default: OBSERVATION_COMPACT_AFTER_HOURS)')
+@click.option('--vacuum', is_flag=True, help='Rebuild the database file afterwards to release the freed pages')
+def compact(older_than_hours, vacuum):
+    """Pack older observations into compressed time-series blocks"""
+    import sqlite3
+    from .database.database_factory import get_database_manager
+    
+    db_manager = get_database_manager()
+    hours = settings.observation_compact_after_hours if older_than_hours is None else older_than_hours
+    result = db_manager.compact_observations(hours)
+    if result is None:
+        click.echo("❌ Compaction failed")
+        sys.exit(1)
+    click.echo(f"✅ Compacted {result['rows']} observations into {result['blocks']} blocks ({result['duration_seconds']}s)")
+    
+    if vacuum:
+        with sqlite3.connect(settings.sqlite_db_path) as conn:
+            conn.execute("VACUUM")
+    
+    blocks = db_manager.get_observation_block_stats()
+    click.echo(f"  {blocks.get('readings', 0)} readings in {blocks.get('blocks', 0)} blocks, "
+               f"{blocks.get('payload_bytes', 0) / 1024 / 1024:.1f} MB ({blocks.get('bytes_per_reading')} bytes per reading)")
+
+@cli.command()
+@click.option('--refresh', is_flag=True, help='Recount every tracked table before reporting')
+def stats(refresh):
+    """Show row counts and time ranges from the table_stats counters"""
+    from .database.database_factory import get_database_manager
+    
+    db_manager = get_database_manager()
+    if refresh and not db_manager.refresh_table_stats():
+        click.echo("❌ Refreshing table stats failed")
+        sys.exit(1)
+    
+    database = db_manager.get_database_stats()
+    click.echo(f"Observations: {database.get('observations_count', 0)} "
+               f"({database.get('earliest_observation')} to {database.get('latest_observation')})")
+    click.echo(f"Stations: {database.get('stations_count', 0)}, database size: {database.get('database_size_mb', 0)} MB")
+    for table, partitions in sorted(db_manager.get_table_stats().items()):
+        for key, counters in sorted(partitions.items()):
+            click.echo(f"  {table}{f' [{key}]' if key else ''}: {counters['rows']} rows, "
+                       f"{counters['min']} to {counters['max']}")
+
+@cli.command()
+@click.option('--days', default=None, type=int,
+              help='Archive months with observations older than this (default: DATA_RETENTION_DAYS)')
+@click.option('--all', 'archive_all', is_flag=True, help='Archive every observation in the database')
+@click.option('--dir', 'directory', default=None, help='Archive directory (default: ARCHIVE_DIR)')
+def archive(days, archive_all, directory):
+    """Copy observation history into the columnar archive"""
+    from .database.columnar_archive import ColumnarArchiver
+    
+    archiver = ColumnarArchiver(settings.sqlite_db_path, directory or settings.archive_dir)
+    if archive_all:
+        summary = archiver.archive_before('9999-12-31 23:59:59')
+    else:
+        summary = archiver.archive_older_than(settings.data_retention_days if days is None else days)
+    if summary is None:
+        click.echo("❌ Archiving failed")
+        sys.exit(1)
+    click.echo(f"✅ Archived {summary['rows']} new observations in {summary['months']} station months "
+               f"to {archiver.archive_dir} ({summary['duration_seconds']}s)")
+
+@cli.command('archive-query')
+@click.argument('station_id')
+@click.option('--column', default='temperature', help='Column to aggregate')
+@click.option('--start', default=None, help='Start time, inclusive (ISO date or datetime, UTC)')
+@click.option('--end', default=None, help='End time, exclusive (ISO date or datetime, UTC)')
+@click.option('--daily', is_flag=True, help='Print per-day statistics')
+@click.option('--dir', 'directory', default=None, help='Archive directory (default: ARCHIVE_DIR)')
+def archive_query(station_id, column, start, end, daily, directory):
+    """Aggregate a column of a station's archived observations"""
+    import time
+    from datetime import datetime, timezone
+    from .database.columnar_archive import ColumnarArchive
+    
+    archive_reader = ColumnarArchive(directory or settings.archive_dir)
+    started = time.perf_counter()
+    try:
+        if daily:
+            stats = archive_reader.daily(station_id, column, start, end)
+        else:
+            stats = archive_reader.aggregate(station_id, column, start, end)
+    except (ValueError, FileNotFoundError) as e:
+        raise click.BadParameter(str(e))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    if daily:
+        for day, count, mean, low, high in zip(stats['day'], stats['count'], stats['mean'], stats['min'], stats['max']):
+            click.echo(f"{datetime.fromtimestamp(int(day), tz=timezone.utc).date()}  n={count:<5d} "
+                       f"mean={mean:8.2f}  min={low:8.2f}  max={high:8.2f}")
+        click.echo(f"{len(stats['day'])} days in {elapsed_ms:.1f} ms")
+    else:
+        click.echo(f"{station_id} {column}: {stats} ({elapsed_ms:.1f} ms)")
+
+def _server_options(servers=('dev', 'gunicorn')):
+    """Add the production server options shared by the API commands"""
+    server_help = {
+        'dev': 'Flask development server',
+        'gunicorn': 'multi-worker production server',
+        'aiohttp': 'single-process asyncio server',
+    }
+    options = [
+        click.option('--server', type=click.Choice(list(servers)), default='dev',
+                     help='; '.join(f"{server}: {server_help[server]}" for server in servers)),
+        click.option('--workers', type=int, default=None, help='Worker processes (default: 2 x cores + 1)'),
+        click.option('--threads', type=int, default=4, help='Threads per worker'),
+        click.option('--keep-alive', 'keepalive', type=int, default=5, help='Seconds to hold idle keep-alive connections'),
+        click.option('--timeout', type=int, default=30, help='Seconds before a silent worker is restarted'),
+        click.option('--graceful-timeout', type=int, default=30,
+                     help='Seconds workers get to finish requests on reload (SIGHUP) or shutdown'),
+        click.option('--max-requests', type=int, default=0, help='Recycle a worker after this many requests (0: never)'),
+    ]
+    
+    def decorator(command):
+        for option in reversed(options):
+            command = option(command)
+        return command
+    return decorator
+
+def _serve(app_factory, name, host, port, debug, server, **server_options):
+    """Run an API with the development server or the production server"""
+    if server == 'dev':
+        app_factory().run(host=host, port=port, debug=debug)
+        return
+    
+    from .api.wsgi_server import ProductionServer
+    
+    ProductionServer(lambda: app_factory().app, name, host=host, port=port, **server_options).run()
+
 @cli.command()
 @click.option('--host', default='0.0.0.0', help='Host to bind to')
 @click.option('--port', default=5000, help='Port to bind to')
 @click.option('--debug', is_flag=True, help='Enable debug mode')
-def radar_api(host, port, debug):
+@_server_options(('dev', 'gunicorn', 'aiohttp'))
+def radar_api(host, port, debug, **server_options):
     """Start radar API proxy server"""
     from .api.radar_proxy import RadarProxyAPI
     
-    api = RadarProxyAPI()
-    api.run(host=host, port=port, debug=debug)
+    if server_options['server'] == 'aiohttp':
+        from .api.async_radar_proxy import AsyncRadarProxyAPI
+        
+        # One process on one event loop; the gunicorn process model options have no equivalent
+        ctx = click.get_current_context()
+        ignored = [f"--{name.replace('_', '-')}" for name in ('workers', 'threads', 'timeout', 'max_requests')
+                   if ctx.get_parameter_source(name) != click.core.ParameterSource.DEFAULT]
+        if ignored:
+            raise click.UsageError(f"{', '.join(ignored)} cannot be used with --server aiohttp")
+        
+        AsyncRadarProxyAPI().run(host=host, port=port, keepalive=server_options['keepalive'],
+                                 graceful_timeout=server_options['graceful_timeout'])
+        return
+    
+    _serve(RadarProxyAPI, 'radar-api', host, port, debug, **server_options)
 
 @cli.command()
 @click.option('--host', default='0.0.0.0', help='Host to bind to')
 @click.option('--port', default=5001, help='Port to bind to')
 @click.option('--debug', is_flag=True, help='Enable debug mode')
-def admin_api(host, port, debug):
+@_server_options()
+def admin_api(host, port, debug, **server_options):
     """Start admin API server for station management"""
     from .api.admin_api import AdminAPI
     
-    api = AdminAPI()
-    api.run(host=host, port=port, debug=debug)
+    _serve(AdminAPI, 'admin-api', host, port, debug, **server_options)
+
+def _load_radar_regions(region_specs, regions_file):
+    """Build the radar region list from --region specs and a regions file"""
+    from .models.radar import RadarRegion
+    from .services.radar_collector import RadarDataCollector
+    
+    regions = []
+    if regions_file:
+        regions.extend(RadarDataCollector.load_regions(Path(regions_file)))
+    regions.extend(RadarRegion.from_spec(spec) for spec in region_specs)
+    return regions
 
 @cli.command()
-@click.option('--lat', default=45.575, help='Center latitude for radar collection')
-@click.option('--lon', default=-73.88, help='Center longitude for radar collection')
-def radar_collect(lat, lon):
+@click.option('--lat', type=float, default=None, help='Center latitude for radar collection (default: station footprint)')
+@click.option('--lon', type=float, default=None, help='Center longitude for radar collection (default: station footprint)')
+@click.option('--region', 'region_specs', multiple=True,
+              help='Region to cover as name:min_lat,min_lon,max_lat,max_lon (repeatable)')
+@click.option('--regions-file', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file listing regions to cover')
+def radar_collect(lat, lon, region_specs, regions_file):
     """Start radar data collection service"""
     from .services.radar_collector import RadarDataCollector
     
-    collector = RadarDataCollector(center_lat=lat, center_lon=lon)
+    regions = _load_radar_regions(region_specs, regions_file)
+    collector = RadarDataCollector(center_lat=lat, center_lon=lon, regions=regions)
     try:
         collector.start_collection()
     except KeyboardInterrupt:
@@ -86,13 +371,18 @@ def radar_collect(lat, lon):
 
 @cli.command()
 @click.option('--hours', default=2, help='Hours of historical data to collect')
-@click.option('--lat', default=45.575, help='Center latitude for radar collection')
-@click.option('--lon', default=-73.88, help='Center longitude for radar collection')
-def radar_historical(hours, lat, lon):
+@click.option('--lat', type=float, default=None, help='Center latitude for radar collection (default: station footprint)')
+@click.option('--lon', type=float, default=None, help='Center longitude for radar collection (default: station footprint)')
+@click.option('--region', 'region_specs', multiple=True,
+              help='Region to cover as name:min_lat,min_lon,max_lat,max_lon (repeatable)')
+@click.option('--regions-file', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file listing regions to cover')
+def radar_historical(hours, lat, lon, region_specs, regions_file):
     """Collect historical radar data"""
     from .services.radar_collector import RadarDataCollector
     
-    collector = RadarDataCollector(center_lat=lat, center_lon=lon)
+    regions = _load_radar_regions(region_specs, regions_file)
+    collector = RadarDataCollector(center_lat=lat, center_lon=lon, regions=regions)
     success = collector.collect_historical_data(hours=hours)
     
     if success:
@@ -103,22 +393,71 @@ def radar_historical(hours, lat, lon):
     collector.close()
 
 @cli.command()
-def radar_status():
+@click.option('--region', 'region_specs', multiple=True,
+              help='Region to report as name:min_lat,min_lon,max_lat,max_lon (repeatable)')
+@click.option('--regions-file', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file listing regions to report')
+def radar_status(region_specs, regions_file):
     """Show radar collection status"""
     from .services.radar_collector import RadarDataCollector
     
-    collector = RadarDataCollector()
+    regions = _load_radar_regions(region_specs, regions_file)
+    collector = RadarDataCollector(regions=regions)
     status = collector.get_collection_status()
     
     click.echo("Radar Collection Status:")
     click.echo(f"  Running: {status.get('running', False)}")
-    click.echo(f"  Center: {status.get('center_coordinates', {})}")
+    click.echo(f"  Coverage tiles per zoom: {status.get('coverage_tiles', {})}")
+    
+    for name, region in status.get('regions', {}).items():
+        click.echo(f"  Region {name}: {region['tiles']} tiles ({region['shared_tiles']} shared), "
+                   f"latest frame {region['latest_frame_stored']}/{region['tiles']} stored"
+                   f"{' ✅' if region['latest_frame_complete'] else ''}")
+        if region['bbox']:
+            click.echo(f"    Bbox: {tuple(round(value, 4) for value in region['bbox'])}")
     click.echo(f"  Radar tiles stored: {status.get('radar_tiles_stored', 0)}")
     click.echo(f"  Satellite tiles stored: {status.get('satellite_tiles_stored', 0)}")
     click.echo(f"  Latest radar data: {status.get('latest_radar_data', 'None')}")
     click.echo(f"  Latest collection: {status.get('latest_collection', 'None')}")
+    click.echo(f"  Frames complete: {status.get('frames_complete', 0)}, partial: {status.get('frames_partial', 0)}")
+    
+    for frame in status.get('frames', []):
+        marker = "✅" if frame['complete'] else "⏳"
+        click.echo(f"    {marker} {frame['data_type']} {frame['tile_path']} ({frame['timestamp']}): "
+                   f"{frame['stored_count']}/{frame['expected_count']} tiles")
     
     collector.close()
 
+@cli.command()
+@click.option('--once', is_flag=True, help='Run a single sync and exit')
+@click.option('--interval', default=None, type=int, help='Seconds between syncs (default: GRAFANA_MIRROR_INTERVAL)')
+@click.option('--status', is_flag=True, help='Show the mirror sync position and row counts')
+def grafana_mirror(once, interval, status):
+    """Keep the read-optimized Grafana database in sync"""
+    from .database.grafana_mirror import GrafanaMirror
+    
+    mirror = GrafanaMirror(settings.sqlite_db_path, settings.grafana_mirror_path)
+    if status:
+        mirror_status = mirror.get_status()
+        click.echo(f"Grafana mirror: {settings.grafana_mirror_path}")
+        for table, state in mirror_status.get('sync_state', {}).items():
+            click.echo(f"  {table}: rowid {state['last_rowid']} (synced {state['synced_at']})")
+        for table, count in mirror_status.get('row_counts', {}).items():
+            click.echo(f"  {table}: {count} rows")
+        return
+    
+    if once:
+        copied = mirror.sync()
+        if copied is None:
+            click.echo("❌ Grafana mirror sync failed")
+        else:
+            click.echo(f"✅ Grafana mirror synced: {copied}")
+        return
+    
+    try:
+        mirror.start_sync(interval or settings.grafana_mirror_interval)
+    except KeyboardInterrupt:
+        mirror.stop_sync()
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
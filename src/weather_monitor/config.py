@@ -15,10 +15,43 @@ class Settings(BaseSettings):
     # Database Configuration
     database_type: str = os.getenv("DATABASE_TYPE", "sqlite")
     sqlite_db_path: str = os.getenv("SQLITE_DB_PATH", "/app/data/weather_data.db")
+    sqlite_reader_pool_size: int = int(os.getenv("SQLITE_READER_POOL_SIZE", "4"))
+    
+    # Observation storage: "rows", or "blocks" to compact older observations into compressed blocks
+    observation_storage: str = os.getenv("OBSERVATION_STORAGE", "rows")
+    observation_block_seconds: int = int(os.getenv("OBSERVATION_BLOCK_SECONDS", "3600"))
+    observation_compact_after_hours: float = float(os.getenv("OBSERVATION_COMPACT_AFTER_HOURS", "48"))
+    
+    # WAL checkpointing of the main database, run by the weather monitor
+    wal_checkpoint_interval: int = int(os.getenv("WAL_CHECKPOINT_INTERVAL", "30"))
+    wal_passive_mb: int = int(os.getenv("WAL_PASSIVE_MB", "4"))
+    wal_restart_mb: int = int(os.getenv("WAL_RESTART_MB", "16"))
+    wal_journal_size_limit_mb: int = int(os.getenv("WAL_JOURNAL_SIZE_LIMIT_MB", "64"))
+    
+    # Online backups of the main database
+    backup_dir: str = os.getenv("BACKUP_DIR", "/app/backups")
+    backup_interval_hours: float = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+    backup_keep: int = int(os.getenv("BACKUP_KEEP", "7"))
+    backup_pages_per_step: int = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+    backup_step_sleep_ms: int = int(os.getenv("BACKUP_STEP_SLEEP_MS", "5"))
+    
+    # Prometheus metrics endpoint of the weather monitor (0 disables it)
+    metrics_port: int = int(os.getenv("METRICS_PORT", "8000"))
+    
+    # Read-optimized copy of the database that Grafana reads
+    grafana_mirror_path: str = os.getenv("GRAFANA_MIRROR_PATH", "/app/data/grafana_mirror.db")
+    grafana_mirror_interval: int = int(os.getenv("GRAFANA_MIRROR_INTERVAL", "60"))
+    
+    # Radar collection settings
+    radar_poll_interval: int = int(os.getenv("RADAR_POLL_INTERVAL", "60"))
+    radar_proxy_url: str = os.getenv("RADAR_PROXY_URL", "")
     
     # Data retention settings
     data_retention_days: int = int(os.getenv("DATA_RETENTION_DAYS", "30"))
     
+    # Columnar archive that observations are copied to before retention cleanup (empty disables it)
+    archive_dir: str = os.getenv("ARCHIVE_DIR", "/app/data/archive")
+    
     # Logging Configuration
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
     log_file: str = os.getenv("LOG_FILE", "logs/weather_monitor.log")
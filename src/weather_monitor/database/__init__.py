@@ -1,3 +1,4 @@
 from .sqlite_db import SQLiteManager
+from .async_sqlite_db import AsyncSQLiteManager
 
-__all__ = ['SQLiteManager']
\ No newline at end of file
+__all__ = ['SQLiteManager', 'AsyncSQLiteManager']
\ No newline at end of file
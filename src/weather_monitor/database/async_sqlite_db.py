@@ -0,0 +1,396 @@
+import aiosqlite
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime
+from loguru import logger
+from typing import AsyncIterator, Optional, List, Tuple, Dict
+
+from . import sqlite_operations as operations
+from .observation_blocks import ObservationBlockStore
+from .sqlite_operations import Operation, run_async
+from ..models.weather import WeatherObservation, WeatherStation
+
+
+class AsyncSQLiteManager:
+    """Async counterpart of SQLiteManager, built on aiosqlite
+    
+    Both managers run the same statements from sqlite_operations. All writes
+    go through one writer connection serialized by a lock, which matches
+    SQLite's single-writer model and avoids busy retries. Reads borrow a
+    connection from a pool of read-only connections and, with WAL, run
+    concurrently with the writer. aiosqlite runs each connection on its own
+    thread, so the event loop never blocks on disk I/O. Connections are opened
+    on first use.
+    
+    The schema is not created here: create it with SQLiteManager first, as
+    get_database_manager(asynchronous=True) does. Compaction and the streaming
+    export also stay with SQLiteManager.
+    """
+    
+    def __init__(self, db_path: str = "weather_data.db", reader_pool_size: int = 4, block_seconds: int = 3600):
+        self.db_path = db_path
+        self.reader_pool_size = max(1, reader_pool_size)
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        
+        # Compacted observation history; read together with weather_observations
+        self.block_store = ObservationBlockStore(block_seconds)
+    
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        """Open one connection with the pragmas shared by the writer and the readers"""
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        await conn.execute("PRAGMA busy_timeout=5000")
+        if read_only:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+    
+    async def _open(self):
+        """Open the writer and the reader pool on first use"""
+        if self._writer is not None:
+            return
+        
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            readers = asyncio.Queue()
+            for _ in range(self.reader_pool_size):
+                conn = await self._connect(read_only=True)
+                self._reader_connections.append(conn)
+                readers.put_nowait(conn)
+            self._readers = readers
+            self._writer = await self._connect()
+            logger.debug(f"Opened async SQLite writer and {self.reader_pool_size} readers on {self.db_path}")
+    
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool"""
+        await self._open()
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run statements on the writer connection and commit them as one transaction"""
+        await self._open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+    
+    async def _read(self, operation: Operation):
+        """Run an operation on a pooled reader"""
+        async with self._reader() as conn:
+            return await run_async(conn, operation)
+    
+    async def _write(self, operation: Operation):
+        """Run an operation on the writer and commit it as one transaction"""
+        async with self._transaction() as conn:
+            return await run_async(conn, operation)
+    
+    async def write_weather_data(self, observation: WeatherObservation) -> bool:
+        """Write weather observation to SQLite"""
+        try:
+            await self._write(operations.write_observations([observation]))
+            logger.info(f"Successfully wrote weather data for station {observation.station_id}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing to SQLite: {e}")
+            return False
+    
+    async def write_weather_data_batch(self, observations: List[WeatherObservation]) -> bool:
+        """Write several weather observations in one transaction"""
+        if not observations:
+            return True
+        
+        try:
+            await self._write(operations.write_observations(observations))
+            logger.info(f"Successfully wrote {len(observations)} weather observations")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing observation batch to SQLite: {e}")
+            return False
+    
+    async def test_connection(self) -> bool:
+        """Test SQLite connection"""
+        try:
+            async with self._reader() as conn:
+                await conn.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.error(f"Async SQLite connection test failed: {e}")
+            return False
+    
+    async def write_station_metadata(self, station: WeatherStation) -> bool:
+        """Write weather station metadata to SQLite"""
+        try:
+            await self._write(operations.write_station_metadata(station))
+            logger.info(f"Successfully wrote station metadata for {station.station_id}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing station metadata to SQLite: {e}")
+            return False
+    
+    async def get_latest_observations(self, station_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Get latest weather observations"""
+        try:
+            observations = await self._read(operations.latest_observation_rows(station_id, limit))
+            
+            # Older observations may already be compacted into blocks; decoding them runs off the event loop
+            if len(observations) < limit:
+                observations.extend(await asyncio.to_thread(
+                    self._latest_block_rows, station_id, limit - len(observations)
+                ))
+            
+            return observations
+        
+        except Exception as e:
+            logger.error(f"Error querying SQLite: {e}")
+            return []
+    
+    def _latest_block_rows(self, station_id: Optional[str], limit: int) -> List[dict]:
+        """Newest compacted readings, read on a short-lived connection in a worker thread"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self.block_store.latest_rows(conn, station_id, limit)
+        finally:
+            conn.close()
+    
+    async def cleanup_old_data(self, days_to_keep: int = 30) -> bool:
+        """Remove old data to keep database size manageable"""
+        try:
+            deleted_rows, deleted_blocks = await self._write(operations.cleanup_old_data(days_to_keep))
+            logger.info(f"Cleaned up {deleted_rows} old weather observations and {deleted_blocks} observation blocks")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error cleaning up old data: {e}")
+            return False
+    
+    async def delete_station_data(self, station_id: str) -> bool:
+        """Delete all data for a specific station"""
+        try:
+            deleted_observations, deleted_metadata = await self._write(operations.delete_station_data(station_id))
+            logger.info(f"Deleted {deleted_observations} observations and {deleted_metadata} metadata records for station {station_id}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error deleting station data for {station_id}: {e}")
+            return False
+    
+    async def get_database_stats(self) -> dict:
+        """Get database statistics"""
+        try:
+            return await self._read(operations.get_database_stats())
+        
+        except Exception as e:
+            logger.error(f"Error getting database stats: {e}")
+            return {}
+    
+    async def get_table_stats(self) -> Dict[str, Dict[str, dict]]:
+        """Row counts and min/max timestamps by table and partition, read from table_stats"""
+        try:
+            return await self._read(operations.get_table_stats())
+        
+        except Exception as e:
+            logger.error(f"Error getting table stats: {e}")
+            return {}
+    
+    async def refresh_table_stats(self) -> bool:
+        """Recount the tracked tables with full scans, e.g. after writes that bypassed the managers"""
+        try:
+            await self._write(operations.refresh_table_stats())
+            logger.info("Refreshed table stats")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error refreshing table stats: {e}")
+            return False
+    
+    async def write_radar_tile(self, timestamp: datetime, data_type: str, tile_path: str,
+                               zoom: int, x: int, y: int, tile_data: bytes,
+                               color_scheme: int = 1, snow: bool = False, smooth: bool = True) -> bool:
+        """Write radar tile data to SQLite"""
+        try:
+            await self._write(operations.write_radar_tile(timestamp, data_type, tile_path, zoom, x, y, tile_data,
+                                                  color_scheme, snow, smooth))
+            logger.debug(f"Successfully wrote radar tile {tile_path} ({zoom}/{x}/{y})")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar tile to SQLite: {e}")
+            return False
+    
+    async def replace_radar_tiles(self, timestamp: datetime, data_type: str, tile_path: str,
+                                  zoom: int, tiles: Dict[Tuple[int, int], bytes]) -> bool:
+        """Replace the stored tiles of a locally produced layer in one transaction"""
+        try:
+            await self._write(operations.replace_radar_tiles(timestamp, data_type, tile_path, zoom, tiles))
+            logger.debug(f"Replaced {len(tiles)} radar tiles of {tile_path} at zoom {zoom}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error replacing radar tiles in SQLite: {e}")
+            return False
+    
+    async def get_radar_tile(self, tile_path: str, zoom: int, x: int, y: int,
+                             max_age_hours: int = 1, color_scheme: int = 1) -> Optional[bytes]:
+        """Get cached radar tile from SQLite"""
+        try:
+            return await self._read(operations.get_radar_tile(tile_path, zoom, x, y, max_age_hours, color_scheme))
+        
+        except Exception as e:
+            logger.error(f"Error getting radar tile from SQLite: {e}")
+            return None
+    
+    async def get_radar_tiles(self, tile_path: str, zoom: int, tiles: List[Tuple[int, int]],
+                              max_age_hours: int = 1, color_scheme: int = 1) -> Optional[Dict[Tuple[int, int], bytes]]:
+        """Get cached tiles of one frame and zoom level, keyed by (x, y), in one query"""
+        if not tiles:
+            return {}
+        
+        try:
+            return await self._read(operations.get_radar_tiles(tile_path, zoom, tiles, max_age_hours, color_scheme))
+        
+        except Exception as e:
+            logger.error(f"Error getting radar tiles from SQLite: {e}")
+            return None
+    
+    async def get_missing_radar_tiles(self, tile_path: str, tiles: List[Tuple[int, int, int]],
+                                      max_age_hours: int = 1, color_scheme: int = 1) -> Optional[List[Tuple[int, int, int]]]:
+        """Return the subset of (zoom, x, y) tiles not cached for a frame, in one query"""
+        if not tiles:
+            return []
+        
+        try:
+            return await self._read(operations.get_missing_radar_tiles(tile_path, tiles, max_age_hours, color_scheme))
+        
+        except Exception as e:
+            logger.error(f"Error checking missing radar tiles: {e}")
+            return None
+    
+    async def write_radar_animation(self, timestamp: datetime, version: str,
+                                    generated: datetime, host: str, frame_count: int) -> bool:
+        """Write radar animation metadata to SQLite"""
+        try:
+            await self._write(operations.write_radar_animation(timestamp, version, generated, host, frame_count))
+            logger.debug("Successfully wrote radar animation metadata")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar animation to SQLite: {e}")
+            return False
+    
+    async def get_historical_radar_frames(self, hours: int = 2, data_type: str = 'radar') -> List[dict]:
+        """Get historical radar frames from the last N hours"""
+        try:
+            return await self._read(operations.get_historical_radar_frames(hours, data_type))
+        
+        except Exception as e:
+            logger.error(f"Error querying historical radar frames: {e}")
+            return []
+    
+    async def get_radar_frame_state(self, tile_path: str, data_type: str = 'radar') -> Optional[dict]:
+        """Get collection state of a radar frame (expected and stored tile sets)"""
+        try:
+            return await self._read(operations.get_radar_frame_state(tile_path, data_type))
+        
+        except Exception as e:
+            logger.error(f"Error getting radar frame state: {e}")
+            return None
+    
+    async def write_radar_frame_state(self, tile_path: str, data_type: str, timestamp: datetime,
+                                      expected_tiles: List[Tuple[int, int, int]],
+                                      stored_tiles: List[Tuple[int, int, int]]) -> bool:
+        """Write collection state of a radar frame"""
+        try:
+            stored_count, expected_count = await self._write(operations.write_radar_frame_state(
+                tile_path, data_type, timestamp, expected_tiles, stored_tiles
+            ))
+            logger.debug(f"Frame {tile_path} ({data_type}): {stored_count}/{expected_count} tiles stored")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar frame state: {e}")
+            return False
+    
+    async def get_radar_frame_states(self, data_type: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """Get completeness summary of the most recent radar frames"""
+        try:
+            return await self._read(operations.get_radar_frame_states(data_type, limit))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar frame states: {e}")
+            return []
+    
+    async def write_radar_station_samples(self, samples: List[dict]) -> bool:
+        """Write radar samples taken at station locations in one transaction"""
+        try:
+            await self._write(operations.write_radar_station_samples(samples))
+            logger.debug(f"Successfully wrote {len(samples)} radar station samples")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar station samples to SQLite: {e}")
+            return False
+    
+    async def get_radar_station_samples(self, station_id: Optional[str] = None, hours: int = 24) -> List[dict]:
+        """Get radar samples at stations from the last N hours"""
+        try:
+            return await self._read(operations.get_radar_station_samples(station_id, hours))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar station samples: {e}")
+            return []
+    
+    async def write_radar_accumulations(self, samples: List[dict]) -> bool:
+        """Write rolling radar accumulation values at stations in one batch"""
+        try:
+            await self._write(operations.write_radar_accumulations(samples))
+            logger.debug(f"Successfully wrote {len(samples)} radar accumulation values")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar accumulations to SQLite: {e}")
+            return False
+    
+    async def get_radar_accumulations(self, station_id: Optional[str] = None, hours: Optional[int] = None) -> List[dict]:
+        """Get radar accumulations at stations, the latest set or the history of the last N hours"""
+        try:
+            return await self._read(operations.get_radar_accumulations(station_id, hours))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar accumulations: {e}")
+            return []
+    
+    async def cleanup_old_radar_data(self, hours_to_keep: int = 24):
+        """Remove old radar data to save space"""
+        try:
+            deleted_tiles, deleted_animations = await self._write(operations.cleanup_old_radar_data(hours_to_keep))
+            logger.info(f"Cleaned up {deleted_tiles} old radar tiles and {deleted_animations} animations")
+        
+        except Exception as e:
+            logger.error(f"Error cleaning up radar data: {e}")
+    
+    async def close(self):
+        """Close the writer and every pooled reader"""
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+        for conn in self._reader_connections:
+            await conn.close()
+        self._reader_connections = []
+        self._readers = None
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from loguru import logger
+from typing import List, Optional
+
+import schedule
+
+class DatabaseBackup:
+    """Online backups of the SQLite database through the incremental backup API
+    
+    The backup copies pages_per_step pages per step and sleeps between steps, so
+    each step holds the source lock only briefly. The source connection keeps one
+    read transaction open for the whole copy: with WAL, writers carry on, and
+    the copy is a consistent snapshot from the start of the backup instead of
+    restarting every time another connection commits. The copy is written next
+    to the target and renamed into place once it passes an integrity check.
+    """
+    
+    def __init__(self, db_path: str, pages_per_step: int = 256, step_sleep: float = 0.005,
+                 verify: bool = True):
+        self.db_path = db_path
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.verify = verify
+        self.last_result: Optional[dict] = None
+    
+    def backup(self, destination: str) -> Optional[dict]:
+        """Write a consistent snapshot of the database to destination and return the copy statistics"""
+        partial_path = destination + ".partial"
+        step_times: List[float] = []
+        step_started = [0.0]
+        
+        def progress(status, remaining, total):
+            step_times.append(time.perf_counter() - step_started[0])
+            # sqlite3 only sleeps on BUSY, so the pause between steps happens here
+            if remaining and self.step_sleep:
+                time.sleep(self.step_sleep)
+            step_started[0] = time.perf_counter()
+        
+        try:
+            Path(destination).parent.mkdir(parents=True, exist_ok=True)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            
+            source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, isolation_level=None)
+            target = sqlite3.connect(partial_path)
+            try:
+                # Pin one snapshot for every step of the copy
+                source.execute("BEGIN")
+                source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+                
+                started = time.perf_counter()
+                step_started[0] = started
+                source.backup(target, pages=self.pages_per_step, progress=progress)
+                duration = time.perf_counter() - started
+                source.execute("COMMIT")
+                
+                page_count = target.execute("PRAGMA page_count").fetchone()[0]
+                page_size = target.execute("PRAGMA page_size").fetchone()[0]
+                if self.verify:
+                    check = target.execute("PRAGMA quick_check").fetchone()[0]
+                    if check != "ok":
+                        raise sqlite3.DatabaseError(f"Backup failed integrity check: {check}")
+            finally:
+                target.close()
+                source.close()
+            
+            os.replace(partial_path, destination)
+            
+            result = {
+                'destination': destination,
+                'pages': page_count,
+                'bytes': page_count * page_size,
+                'steps': len(step_times),
+                'duration_seconds': round(duration, 3),
+                'pages_per_second': round(page_count / duration, 1) if duration > 0 else float(page_count),
+                # Time spent inside backup steps, when the source lock was held
+                'stall_seconds_total': round(sum(step_times), 4),
+                'stall_seconds_max': round(max(step_times, default=0.0), 4),
+                'completed_at': datetime.now().isoformat()
+            }
+            self.last_result = result
+            logger.info(f"Backed up {self.db_path} to {destination}: {page_count} pages in {duration:.2f}s "
+                        f"({result['pages_per_second']} pages/s, longest step {result['stall_seconds_max'] * 1000:.1f} ms)")
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error backing up database to {destination}: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+    
+    def backup_to_directory(self, directory: str, keep: int = 7) -> Optional[dict]:
+        """Write a timestamped backup into directory and keep only the newest ones"""
+        stem = Path(self.db_path).stem
+        destination = os.path.join(directory, f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+        result = self.backup(destination)
+        if result:
+            self.prune(directory, keep)
+        return result
+    
+    def prune(self, directory: str, keep: int) -> List[str]:
+        """Delete all but the newest keep backups in directory"""
+        stem = Path(self.db_path).stem
+        backups = sorted(Path(directory).glob(f"{stem}-*.db"))
+        removed = []
+        for old in backups[:-keep] if keep > 0 else []:
+            try:
+                old.unlink()
+                removed.append(str(old))
+            except OSError as e:
+                logger.warning(f"Could not remove old backup {old}: {e}")
+        if removed:
+            logger.info(f"Removed {len(removed)} old backups from {directory}")
+        return removed
+    
+    def start_schedule(self, directory: str, every_hours: float = 24, keep: int = 7):
+        """Back up into directory every few hours until interrupted, starting with one right away"""
+        logger.info(f"Backing up {self.db_path} to {directory} every {every_hours}h, keeping {keep}")
+        scheduler = schedule.Scheduler()
+        scheduler.every(int(every_hours * 60)).minutes.do(self.backup_to_directory, directory, keep)
+        
+        self.backup_to_directory(directory, keep)
+        while True:
+            scheduler.run_pending()
+            time.sleep(min(60, max(1, scheduler.idle_seconds or 60)))
@@ -0,0 +1,166 @@
+import struct
+import zlib
+from typing import Dict, Tuple
+
+import numpy as np
+
+BLOCK_MAGIC = b'WOB1'
+
+# Measurement columns stored in every block, in order
+BLOCK_VALUE_COLUMNS = [
+    "temperature", "humidity", "dewpoint", "heat_index", "wind_speed", "wind_gust",
+    "wind_direction", "pressure", "uv_index", "solar_radiation",
+    "precipitation_rate", "precipitation_total"
+]
+
+MODE_NULL = 0     # Every value missing
+MODE_DECIMAL = 1  # Values with at most `scale` decimals, stored as delta-encoded integers
+MODE_XOR = 2      # IEEE bits XORed with the previous value
+
+MAX_DECIMAL_SCALE = 6
+
+_HEADER = struct.Struct('<4sIB')
+_SECTION = struct.Struct('<BBBI')
+_INT_HEADER = struct.Struct('<qq')
+_WIDTHS = (1, 2, 4, 8)
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64))
+
+def _pack_unsigned(values: np.ndarray) -> Tuple[int, bytes]:
+    """Narrowest fixed width for the values, with the bytes of equal significance grouped together"""
+    width = next(width for width in _WIDTHS if not len(values) or int(values.max()) < 1 << (8 * width))
+    packed = values.astype(f'<u{width}')
+    # Byte shuffle: the high bytes of small deltas are runs of zeros that zlib removes
+    return width, packed.view(np.uint8).reshape(-1, width).T.tobytes()
+
+def _unpack_unsigned(payload: bytes, width: int, count: int) -> np.ndarray:
+    shuffled = np.frombuffer(payload, dtype=np.uint8, count=count * width).reshape(width, count)
+    return np.ascontiguousarray(shuffled.T).view(f'<u{width}').reshape(count).astype(np.uint64)
+
+def encode_timestamps(timestamps: np.ndarray) -> Tuple[int, bytes]:
+    """First timestamp and first delta, then zigzagged delta-of-deltas"""
+    timestamps = timestamps.astype(np.int64)
+    first = int(timestamps[0]) if len(timestamps) else 0
+    first_delta = int(timestamps[1] - timestamps[0]) if len(timestamps) > 1 else 0
+    width, packed = _pack_unsigned(_zigzag(np.diff(timestamps, n=2)))
+    return width, _INT_HEADER.pack(first, first_delta) + packed
+
+def decode_timestamps(payload: bytes, width: int, count: int) -> np.ndarray:
+    first, first_delta = _INT_HEADER.unpack_from(payload)
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    delta_of_deltas = _unzigzag(_unpack_unsigned(payload[_INT_HEADER.size:], width, max(count - 2, 0)))
+    deltas = np.cumsum(np.concatenate([[first_delta], delta_of_deltas]), dtype=np.int64)
+    return first + np.concatenate([[0], np.cumsum(deltas[:count - 1], dtype=np.int64)])
+
+def encode_integers(values: np.ndarray) -> Tuple[int, bytes]:
+    """First value, then zigzagged deltas"""
+    values = values.astype(np.int64)
+    first = int(values[0]) if len(values) else 0
+    width, packed = _pack_unsigned(_zigzag(np.diff(values)))
+    return width, _INT_HEADER.pack(first, 0) + packed
+
+def decode_integers(payload: bytes, width: int, count: int) -> np.ndarray:
+    first, _ = _INT_HEADER.unpack_from(payload)
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    deltas = _unzigzag(_unpack_unsigned(payload[_INT_HEADER.size:], width, count - 1))
+    return first + np.concatenate([[0], np.cumsum(deltas, dtype=np.int64)])
+
+def _decimal_scale(values: np.ndarray) -> int:
+    """Smallest number of decimals that reproduces every value exactly, or -1"""
+    if np.abs(values).max() >= 2 ** 40:
+        return -1
+    for scale in range(MAX_DECIMAL_SCALE + 1):
+        factor = 10.0 ** scale
+        scaled = np.round(values * factor)
+        if np.array_equal(scaled / factor, values):
+            return scale
+    return -1
+
+def encode_values(values: np.ndarray) -> Tuple[int, int, int, bytes]:
+    """(mode, scale, width, payload) of one float column; NaN marks a missing value"""
+    values = values.astype(np.float64)
+    missing = np.isnan(values)
+    present = values[~missing]
+    if not len(present):
+        return MODE_NULL, 0, 0, b''
+    
+    scale = _decimal_scale(present)
+    if scale >= 0:
+        mask = np.packbits(missing).tobytes() if missing.any() else b''
+        width, payload = encode_integers(np.round(present * 10.0 ** scale))
+        return MODE_DECIMAL, scale, width, struct.pack('<I', len(mask)) + mask + payload
+    
+    bits = values.view(np.uint64)
+    xored = bits ^ np.concatenate([[np.uint64(0)], bits[:-1]])
+    return MODE_XOR, 0, 8, xored.astype('<u8').view(np.uint8).reshape(-1, 8).T.tobytes()
+
+def decode_values(mode: int, scale: int, width: int, payload: bytes, count: int) -> np.ndarray:
+    if mode == MODE_NULL:
+        return np.full(count, np.nan)
+    
+    if mode == MODE_DECIMAL:
+        mask_length, = struct.unpack_from('<I', payload)
+        mask = payload[4:4 + mask_length]
+        missing = (np.unpackbits(np.frombuffer(mask, dtype=np.uint8), count=count).astype(bool)
+                   if mask_length else np.zeros(count, dtype=bool))
+        integers = decode_integers(payload[4 + mask_length:], width, int(count - missing.sum()))
+        values = np.full(count, np.nan)
+        values[~missing] = integers / 10.0 ** scale
+        return values
+    
+    if mode == MODE_XOR:
+        xored = _unpack_unsigned(payload, 8, count)
+        # XOR is its own inverse, so a running XOR restores the bit patterns
+        return np.bitwise_xor.accumulate(xored).view(np.float64)
+    
+    raise ValueError(f"Unknown block column mode: {mode}")
+
+def encode_block(timestamps: np.ndarray, ids: np.ndarray, columns: Dict[str, np.ndarray],
+                 level: int = 6) -> bytes:
+    """Pack one station's readings, sorted by time, into a compressed block"""
+    count = len(timestamps)
+    sections = []
+    
+    width, payload = encode_timestamps(timestamps)
+    sections.append(_SECTION.pack(0, 0, width, len(payload)) + payload)
+    width, payload = encode_integers(ids)
+    sections.append(_SECTION.pack(0, 0, width, len(payload)) + payload)
+    
+    for name in BLOCK_VALUE_COLUMNS:
+        values = columns.get(name)
+        mode, scale, width, payload = encode_values(np.full(count, np.nan) if values is None else values)
+        sections.append(_SECTION.pack(mode, scale, width, len(payload)) + payload)
+    
+    body = b''.join(sections)
+    return _HEADER.pack(BLOCK_MAGIC, count, len(BLOCK_VALUE_COLUMNS)) + zlib.compress(body, level)
+
+def decode_block(blob: bytes) -> Dict[str, np.ndarray]:
+    """Arrays of a block: int64 'timestamp' (epoch seconds) and 'id', float64 measurements with NaN for missing"""
+    magic, count, column_count = _HEADER.unpack_from(blob)
+    if magic != BLOCK_MAGIC:
+        raise ValueError("Not an observation block")
+    body = zlib.decompress(blob[_HEADER.size:])
+    
+    sections = []
+    offset = 0
+    for _ in range(column_count + 2):
+        mode, scale, width, length = _SECTION.unpack_from(body, offset)
+        offset += _SECTION.size
+        sections.append((mode, scale, width, body[offset:offset + length]))
+        offset += length
+    
+    arrays = {
+        'timestamp': decode_timestamps(sections[0][3], sections[0][2], count),
+        'id': decode_integers(sections[1][3], sections[1][2], count),
+    }
+    for name, (mode, scale, width, payload) in zip(BLOCK_VALUE_COLUMNS, sections[2:]):
+        arrays[name] = decode_values(mode, scale, width, payload, count)
+    return arrays
@@ -0,0 +1,295 @@
+import csv
+import gzip
+import lzma
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from loguru import logger
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .sqlite_db import SQLiteManager
+from .table_stats import count_deleted, count_inserted
+
+def _float(value: str) -> Optional[float]:
+    return float(value) if value else None
+
+def _int(value: str) -> Optional[int]:
+    return int(float(value)) if value else None
+
+def _text(value: str) -> Optional[str]:
+    return value or None
+
+def _timestamp(value: str) -> str:
+    # Same text the sqlite3 datetime adapter writes for the live observations
+    return datetime.fromisoformat(value).isoformat(sep=' ')
+
+# Weather Underground export column -> (observation column, converter)
+CSV_COLUMNS: Dict[str, Tuple[str, Callable]] = {
+    'obsTimeLocal': ('timestamp', _timestamp),
+    'stationID': ('station_id', str),
+    'neighborhood': ('neighborhood', _text),
+    'temp': ('temperature', _float),
+    'humidity': ('humidity', _float),
+    'dewpt': ('dewpoint', _float),
+    'heatIndex': ('heat_index', _float),
+    'windSpeed': ('wind_speed', _float),
+    'windGust': ('wind_gust', _float),
+    'winddir': ('wind_direction', _int),
+    'pressure': ('pressure', _float),
+    'uv': ('uv_index', _float),
+    'solarRadiation': ('solar_radiation', _float),
+    'precipRate': ('precipitation_rate', _float),
+    'precipTotal': ('precipitation_total', _float),
+}
+REQUIRED_COLUMNS = ('obsTimeLocal', 'stationID')
+
+OPENERS = {'.gz': gzip.open, '.xz': lzma.open, '.lzma': lzma.open}
+CSV_PATTERNS = ('*.csv', '*.csv.gz', '*.csv.xz', '*.csv.lzma')
+
+class CsvBulkImporter:
+    """Streams Weather Underground CSV exports into weather_observations
+    
+    Rows are converted with plain per-column functions instead of a pydantic
+    model each, and written with executemany in large transactions while the
+    connection runs with relaxed durability. The byte offset after the last
+    committed row is stored in import_checkpoints in the same transaction, so an
+    interrupted import resumes exactly where it stopped. The id range of every
+    batch is kept in import_batches, so a restarted import first deletes the
+    rows the file already added. Compressed files are read as streams; a
+    directory is split over worker processes that each parse their own files
+    and take turns on the write lock.
+    """
+    
+    def __init__(self, db_path: str, batch_size: int = 20000, workers: Optional[int] = None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        
+        SQLiteManager(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS import_checkpoints (
+                    source TEXT PRIMARY KEY,
+                    byte_offset INTEGER NOT NULL,
+                    rows_imported INTEGER NOT NULL DEFAULT 0,
+                    completed BOOLEAN DEFAULT FALSE,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS import_batches (
+                    source TEXT NOT NULL,
+                    first_id INTEGER NOT NULL,
+                    last_id INTEGER NOT NULL,
+                    PRIMARY KEY (source, first_id)
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+    
+    @staticmethod
+    def find_files(path: str) -> List[str]:
+        """CSV files to import: the path itself, or every (compressed) CSV in a directory"""
+        root = Path(path)
+        if root.is_dir():
+            return sorted(str(file) for pattern in CSV_PATTERNS for file in root.rglob(pattern))
+        return [str(root)]
+    
+    def import_path(self, path: str, restart: bool = False) -> dict:
+        """Import a file or a directory of files, in parallel when there are several"""
+        files = self.find_files(path)
+        started = time.perf_counter()
+        results = []
+        
+        if len(files) <= 1 or self.workers <= 1:
+            results = [self.import_file(file, restart) for file in files]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(files))) as pool:
+                futures = [
+                    pool.submit(_import_file_worker, self.db_path, self.batch_size, file, restart)
+                    for file in files
+                ]
+                results = [future.result() for future in as_completed(futures)]
+        
+        duration = time.perf_counter() - started
+        rows = sum(result['rows'] for result in results)
+        summary = {
+            'files': len(files),
+            'rows': rows,
+            'errors': sum(result['errors'] for result in results),
+            'failed_files': [result['source'] for result in results if result.get('failed')],
+            'duration_seconds': round(duration, 2),
+            'rows_per_second': round(rows / duration, 1) if duration > 0 else 0.0
+        }
+        logger.info(f"Imported {rows} observations from {len(files)} file(s) in {duration:.1f}s "
+                    f"({summary['rows_per_second']} rows/s, {summary['errors']} bad rows)")
+        return summary
+    
+    @staticmethod
+    def _checkpoint(conn: sqlite3.Connection, source: str) -> Tuple[int, int, bool]:
+        """Stored (byte offset, rows imported, completed) of a source file"""
+        row = conn.execute("""
+            SELECT byte_offset, rows_imported, completed FROM import_checkpoints WHERE source = ?
+        """, (source,)).fetchone()
+        return (row[0], row[1], bool(row[2])) if row else (0, 0, False)
+    
+    @staticmethod
+    def _save_checkpoint(conn: sqlite3.Connection, source: str, offset: int, rows: int, completed: bool = False):
+        """Record the offset after the last committed row; runs inside the batch transaction"""
+        conn.execute("""
+            INSERT INTO import_checkpoints (source, byte_offset, rows_imported, completed, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(source) DO UPDATE SET
+                byte_offset = excluded.byte_offset,
+                rows_imported = excluded.rows_imported,
+                completed = excluded.completed,
+                updated_at = excluded.updated_at
+        """, (source, offset, rows, completed))
+    
+    def _discard_import(self, conn: sqlite3.Connection, source: str):
+        """Delete the rows an earlier import of source added, along with its checkpoint
+        
+        Refuses when they can no longer all be found by id: imports checkpointed
+        before batches were recorded, or rows since compacted into observation
+        blocks.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _, imported, _ = self._checkpoint(conn, source)
+            ranges = conn.execute(
+                "SELECT first_id, last_id FROM import_batches WHERE source = ?", (source,)
+            ).fetchall()
+            found = sum(
+                conn.execute(
+                    "SELECT COUNT(*) FROM weather_observations WHERE id BETWEEN ? AND ?", id_range
+                ).fetchone()[0]
+                for id_range in ranges
+            )
+            if found < imported:
+                raise ValueError(f"only {found} of the {imported} rows imported earlier can be found; "
+                                 f"remove them by hand and delete its import_checkpoints row to restart")
+            
+            for id_range in ranges:
+                conn.execute("DELETE FROM weather_observations WHERE id BETWEEN ? AND ?", id_range)
+            if found:
+                conn.execute(*count_deleted('weather_observations', found))
+            conn.execute("DELETE FROM import_batches WHERE source = ?", (source,))
+            conn.execute("DELETE FROM import_checkpoints WHERE source = ?", (source,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if found:
+            logger.info(f"Deleted {found} rows from the earlier import of {source}")
+    
+    def import_file(self, path: str, restart: bool = False) -> dict:
+        """Import one (optionally compressed) CSV file, resuming from its checkpoint"""
+        source = os.path.abspath(path)
+        result = {'source': source, 'rows': 0, 'errors': 0}
+        conn = sqlite3.connect(self.db_path, timeout=120, isolation_level=None)
+        
+        try:
+            # Durability of the bulk load is covered by the checkpoint; the WAL stays on for other processes
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            
+            if restart:
+                self._discard_import(conn, source)
+            offset, imported, completed = self._checkpoint(conn, source)
+            if completed:
+                logger.info(f"Skipping {path}: already imported ({imported} rows)")
+                return result
+            
+            opener = OPENERS.get(Path(path).suffix.lower(), open)
+            with opener(path, 'rb') as stream:
+                header_line = stream.readline()
+                header = next(csv.reader([header_line.decode('utf-8-sig')]))
+                missing = [column for column in REQUIRED_COLUMNS if column not in header]
+                if missing:
+                    raise ValueError(f"missing columns {missing}")
+                
+                converters = [
+                    (header.index(name), converter) for name, (_, converter) in CSV_COLUMNS.items() if name in header
+                ]
+                columns = [CSV_COLUMNS[header[index]][0] for index, _ in converters]
+                insert = f"""
+                    INSERT INTO weather_observations ({", ".join(columns)})
+                    VALUES ({", ".join("?" for _ in columns)})
+                """
+                timestamp_index = columns.index('timestamp')
+                
+                if offset > len(header_line):
+                    logger.info(f"Resuming {path} at byte {offset} after {imported} rows")
+                    stream.seek(offset)
+                else:
+                    offset = len(header_line)
+                position = [offset]
+                
+                batch = []
+                for row in csv.reader(self._lines(stream, position)):
+                    if not row:
+                        continue
+                    try:
+                        batch.append(tuple(converter(row[index]) for index, converter in converters))
+                    except (ValueError, IndexError) as e:
+                        result['errors'] += 1
+                        if result['errors'] <= 10:
+                            logger.warning(f"Skipping bad row in {path} near byte {position[0]}: {e}")
+                        continue
+                    
+                    if len(batch) >= self.batch_size:
+                        written = self._write_batch(conn, insert, batch, timestamp_index, source, position[0], imported)
+                        imported += written
+                        result['rows'] += written
+                        batch = []
+                
+                written = self._write_batch(conn, insert, batch, timestamp_index, source, position[0], imported, completed=True)
+                imported += written
+                result['rows'] += written
+            
+            logger.info(f"Imported {result['rows']} rows from {path} ({result['errors']} bad rows)")
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error importing {path}: {e}")
+            result['failed'] = True
+            return result
+        
+        finally:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.close()
+    
+    @staticmethod
+    def _lines(stream, position: List[int]) -> Iterator[str]:
+        """Decoded lines of a binary stream, advancing position past each line handed out"""
+        for line in stream:
+            position[0] += len(line)
+            yield line.decode('utf-8')
+    
+    def _write_batch(self, conn: sqlite3.Connection, insert: str, batch: list, timestamp_index: int,
+                     source: str, offset: int, imported: int, completed: bool = False) -> int:
+        """Insert a batch and advance the file's checkpoint in one transaction"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(insert, batch)
+            if batch:
+                timestamps = [row[timestamp_index] for row in batch]
+                conn.execute(*count_inserted('weather_observations', len(batch), min(timestamps), max(timestamps)))
+                # Ids are consecutive: nothing else can insert while the write lock is held
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                conn.execute("INSERT INTO import_batches (source, first_id, last_id) VALUES (?, ?, ?)",
+                             (source, last_id - len(batch) + 1, last_id))
+            self._save_checkpoint(conn, source, offset, imported + len(batch), completed)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.debug(f"Committed {len(batch)} rows of {source} up to byte {offset}")
+        return len(batch)
+
+def _import_file_worker(db_path: str, batch_size: int, path: str, restart: bool) -> dict:
+    """Import one file in a worker process"""
+    return CsvBulkImporter(db_path, batch_size=batch_size, workers=1).import_file(path, restart)
@@ -0,0 +1,310 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime, timezone
+from loguru import logger
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from .observation_blocks import ObservationBlockStore, text_to_epoch
+
+ARCHIVE_VERSION = 1
+
+# Observation column -> array dtype; missing values are stored as NaN
+ARCHIVE_COLUMNS = {
+    'temperature': np.float32,
+    'humidity': np.float32,
+    'dewpoint': np.float32,
+    'heat_index': np.float32,
+    'wind_speed': np.float32,
+    'wind_gust': np.float32,
+    'wind_direction': np.float32,
+    'pressure': np.float32,
+    'uv_index': np.float32,
+    'solar_radiation': np.float32,
+    'precipitation_rate': np.float32,
+    'precipitation_total': np.float32,
+}
+
+TimeBound = Union[None, int, float, str, datetime]
+
+def _epoch(value: TimeBound) -> Optional[int]:
+    """Seconds since the epoch of a bound given as a number, ISO string or datetime (naive means UTC)"""
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def _month_key(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m')
+
+def _check_station_id(station_id: str):
+    if not station_id or station_id != Path(station_id).name or station_id.startswith('.'):
+        raise ValueError(f"Invalid station ID for the archive: {station_id!r}")
+
+class ColumnarArchiver:
+    """Moves observation history into per-station, per-month column files
+    
+    Each month is a directory of .npy arrays, one per column: int64 epoch
+    seconds in timestamp.npy and float32 measurements with NaN for missing
+    values, sorted by time, plus a meta.json. Archiving a month that already has
+    files merges the new rows in, so running it before every retention cleanup
+    keeps the archive complete even when the cleanup cutoff falls mid-month. A
+    month is written to a temporary directory and swapped in whole; readers that
+    still map the old files keep a valid view.
+    """
+    
+    def __init__(self, db_path: str, archive_dir: str):
+        self.db_path = db_path
+        self.archive_dir = Path(archive_dir)
+    
+    def month_dir(self, station_id: str, month: str) -> Path:
+        _check_station_id(station_id)
+        return self.archive_dir / station_id / month
+    
+    def archive_older_than(self, days: int) -> Optional[dict]:
+        """Archive every station month holding observations that a cleanup of days would delete"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{int(days)} days',)).fetchone()[0]
+            return self.archive_before(cutoff)
+        except Exception as e:
+            logger.error(f"Error archiving observations older than {days} days: {e}")
+            return None
+    
+    def archive_before(self, cutoff: str) -> Optional[dict]:
+        """Archive every station month that has observations before cutoff ('YYYY-MM-DD HH:MM:SS')"""
+        started = time.perf_counter()
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                months = conn.execute("""
+                    SELECT station_id, strftime('%Y-%m', timestamp) AS month
+                    FROM weather_observations
+                    WHERE timestamp < ?
+                    UNION
+                    SELECT station_id, strftime('%Y-%m', block_start, 'unixepoch') AS month
+                    FROM observation_blocks
+                    WHERE block_start < ?
+                    ORDER BY station_id, month
+                """, (cutoff, text_to_epoch(cutoff))).fetchall()
+            
+            rows = sum(self.archive_month(station_id, month) for station_id, month in months)
+            summary = {
+                'months': len(months),
+                'rows': rows,
+                'duration_seconds': round(time.perf_counter() - started, 2)
+            }
+            logger.info(f"Archived {rows} new observations in {len(months)} station months before {cutoff} "
+                        f"to {self.archive_dir} in {summary['duration_seconds']}s")
+            return summary
+        
+        except Exception as e:
+            logger.error(f"Error archiving observations before {cutoff}: {e}")
+            return None
+    
+    def archive_month(self, station_id: str, month: str) -> int:
+        """Write (or merge into) the column files of one station month and return the rows it added"""
+        target = self.month_dir(station_id, month)
+        month_start = datetime.strptime(month, '%Y-%m')
+        next_month = month_start.replace(year=month_start.year + month_start.month // 12,
+                                         month=month_start.month % 12 + 1)
+        
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute(f"""
+                SELECT CAST(strftime('%s', timestamp) AS INTEGER), {", ".join(ARCHIVE_COLUMNS)},
+                       neighborhood, city, latitude, longitude
+                FROM weather_observations
+                WHERE station_id = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            """, (station_id, month_start.isoformat(sep=' '), next_month.isoformat(sep=' '))).fetchall()
+            # Readings already compacted into blocks
+            blocks = ObservationBlockStore().read(conn, station_id, text_to_epoch(month_start.isoformat()),
+                                                  text_to_epoch(next_month.isoformat()))
+            last = rows[-1][-4:] if rows else conn.execute("""
+                SELECT neighborhood, city, latitude, longitude FROM observation_blocks
+                WHERE station_id = ? AND block_start < ?
+                ORDER BY block_start DESC
+                LIMIT 1
+            """, (station_id, text_to_epoch(next_month.isoformat()))).fetchone()
+        
+        columns = {'timestamp': np.concatenate([
+            blocks['timestamp'], np.array([row[0] for row in rows], dtype=np.int64)
+        ])}
+        for index, (name, dtype) in enumerate(ARCHIVE_COLUMNS.items(), start=1):
+            columns[name] = np.concatenate([
+                blocks[name], np.array([row[index] for row in rows], dtype=np.float64)
+            ]).astype(dtype)
+        order = np.argsort(columns['timestamp'], kind='stable')
+        columns = {name: values[order] for name, values in columns.items()}
+        
+        archived_rows = 0
+        if (target / 'timestamp.npy').exists():
+            existing = {name: np.load(target / f'{name}.npy') for name in columns}
+            archived_rows = len(existing['timestamp'])
+            # Rows from the database win over archived rows with the same timestamp
+            merged = {name: np.concatenate([existing[name], columns[name]]) for name in columns}
+            order = np.argsort(merged['timestamp'], kind='stable')
+            timestamps = merged['timestamp'][order]
+            keep = np.append(timestamps[1:] != timestamps[:-1], True) if len(timestamps) else np.ones(0, bool)
+            columns = {name: values[order][keep] for name, values in merged.items()}
+        
+        meta = {
+            'version': ARCHIVE_VERSION,
+            'station_id': station_id,
+            'month': month,
+            'rows': int(len(columns['timestamp'])),
+            'first': int(columns['timestamp'][0]) if len(columns['timestamp']) else None,
+            'last': int(columns['timestamp'][-1]) if len(columns['timestamp']) else None,
+            'columns': {name: np.dtype(values.dtype).name for name, values in columns.items()},
+            'neighborhood': last[0] if last else None,
+            'city': last[1] if last else None,
+            'latitude': last[2] if last else None,
+            'longitude': last[3] if last else None,
+            'archived_at': datetime.now(timezone.utc).isoformat()
+        }
+        
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f'.{month}.tmp')
+        retired = target.with_name(f'.{month}.old')
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir()
+        for name, values in columns.items():
+            np.save(staging / f'{name}.npy', values)
+        with open(staging / 'meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        
+        if target.exists():
+            shutil.rmtree(retired, ignore_errors=True)
+            os.replace(target, retired)
+        os.replace(staging, target)
+        shutil.rmtree(retired, ignore_errors=True)
+        
+        # Rows already in the archive are rewritten but not counted again
+        added_rows = meta['rows'] - archived_rows
+        logger.debug(f"Archived {added_rows} new observations of {station_id} for {month}, {meta['rows']} in total")
+        return added_rows
+
+class ColumnarArchive:
+    """Reads the column files written by ColumnarArchiver through memory maps
+    
+    Slices are views on the mapped files, so only the pages an aggregation
+    touches are read from disk, and nothing goes through the database.
+    """
+    
+    def __init__(self, archive_dir: str):
+        self.archive_dir = Path(archive_dir)
+    
+    def stations(self) -> List[str]:
+        """Station IDs with archived months"""
+        if not self.archive_dir.exists():
+            return []
+        return sorted(path.name for path in self.archive_dir.iterdir() if path.is_dir() and not path.name.startswith('.'))
+    
+    def months(self, station_id: str) -> List[str]:
+        """Archived months of a station as 'YYYY-MM'"""
+        _check_station_id(station_id)
+        station_dir = self.archive_dir / station_id
+        if not station_dir.exists():
+            return []
+        return sorted(path.name for path in station_dir.iterdir() if (path / 'timestamp.npy').exists())
+    
+    def metadata(self, station_id: str, month: str) -> dict:
+        """meta.json of a station month"""
+        _check_station_id(station_id)
+        with open(self.archive_dir / station_id / month / 'meta.json') as f:
+            return json.load(f)
+    
+    def open_month(self, station_id: str, month: str,
+                   columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Memory-map the timestamp and requested columns of a station month"""
+        _check_station_id(station_id)
+        month_dir = self.archive_dir / station_id / month
+        names = ['timestamp'] + [name for name in (columns or ARCHIVE_COLUMNS) if name != 'timestamp']
+        unknown = [name for name in names if name != 'timestamp' and name not in ARCHIVE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {', '.join(unknown)}")
+        return {name: np.load(month_dir / f'{name}.npy', mmap_mode='r') for name in names}
+    
+    def iter_slices(self, station_id: str, start: TimeBound = None, end: TimeBound = None,
+                    columns: Optional[List[str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """Month by month views of the observations in [start, end)"""
+        start_epoch, end_epoch = _epoch(start), _epoch(end)
+        first_month = _month_key(start_epoch) if start_epoch is not None else None
+        last_month = _month_key(end_epoch - 1) if end_epoch is not None else None
+        
+        for month in self.months(station_id):
+            if (first_month and month < first_month) or (last_month and month > last_month):
+                continue
+            arrays = self.open_month(station_id, month, columns)
+            timestamps = arrays['timestamp']
+            lo = int(np.searchsorted(timestamps, start_epoch, 'left')) if start_epoch is not None else 0
+            hi = int(np.searchsorted(timestamps, end_epoch, 'left')) if end_epoch is not None else len(timestamps)
+            if hi > lo:
+                yield {name: values[lo:hi] for name, values in arrays.items()}
+    
+    def load(self, station_id: str, start: TimeBound = None, end: TimeBound = None,
+             columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Observations in [start, end) as contiguous in-memory arrays"""
+        slices = list(self.iter_slices(station_id, start, end, columns))
+        if not slices:
+            names = ['timestamp'] + [name for name in (columns or ARCHIVE_COLUMNS) if name != 'timestamp']
+            return {name: np.empty(0, dtype=np.int64 if name == 'timestamp' else ARCHIVE_COLUMNS[name])
+                    for name in names}
+        return {name: np.concatenate([part[name] for part in slices]) for name in slices[0]}
+    
+    def aggregate(self, station_id: str, column: str, start: TimeBound = None,
+                  end: TimeBound = None) -> dict:
+        """Count, min, max, mean and sum of a column over [start, end), ignoring missing values"""
+        count, total = 0, 0.0
+        minimum, maximum = np.inf, -np.inf
+        for part in self.iter_slices(station_id, start, end, [column]):
+            values = part[column]
+            valid = values[~np.isnan(values)]
+            if len(valid):
+                count += len(valid)
+                total += float(valid.sum(dtype=np.float64))
+                minimum = min(minimum, float(valid.min()))
+                maximum = max(maximum, float(valid.max()))
+        return {
+            'count': count,
+            'min': minimum if count else None,
+            'max': maximum if count else None,
+            'mean': total / count if count else None,
+            'sum': total
+        }
+    
+    def daily(self, station_id: str, column: str, start: TimeBound = None,
+              end: TimeBound = None) -> Dict[str, np.ndarray]:
+        """Per UTC day count, mean, min and max of a column over [start, end)"""
+        parts = []
+        for part in self.iter_slices(station_id, start, end, [column]):
+            values = part[column]
+            valid = ~np.isnan(values)
+            days = part['timestamp'][valid] // 86400
+            values = values[valid].astype(np.float64)
+            if not len(days):
+                continue
+            # Timestamps are sorted, so each day is one contiguous run
+            bounds = np.flatnonzero(np.diff(days)) + 1
+            starts = np.concatenate([[0], bounds])
+            counts = np.diff(np.append(starts, len(days)))
+            parts.append((
+                days[starts],
+                counts,
+                np.add.reduceat(values, starts) / counts,
+                np.minimum.reduceat(values, starts),
+                np.maximum.reduceat(values, starts),
+            ))
+        
+        if not parts:
+            return {key: np.empty(0) for key in ('day', 'count', 'mean', 'min', 'max')}
+        day, count, mean, minimum, maximum = (np.concatenate(values) for values in zip(*parts))
+        # Month files split at UTC month boundaries, so days never span two parts
+        return {'day': day * 86400, 'count': count, 'mean': mean, 'min': minimum, 'max': maximum}
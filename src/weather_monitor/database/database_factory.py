@@ -1,9 +1,20 @@
+from typing import Union
+
 from ..config import settings
 from .sqlite_db import SQLiteManager
+from .async_sqlite_db import AsyncSQLiteManager
 
-def get_database_manager() -> SQLiteManager:
-    """Factory function to get the appropriate database manager based on configuration"""
+def get_database_manager(asynchronous: bool = False) -> Union[SQLiteManager, AsyncSQLiteManager]:
+    """Factory function to get the appropriate database manager based on configuration
+    
+    With asynchronous=True the manager's methods are coroutines, for use in asyncio services.
+    """
     if settings.database_type.lower() == "sqlite":
-        return SQLiteManager(settings.sqlite_db_path)
+        if asynchronous:
+            # The async manager expects the schema; creating and migrating it stays synchronous
+            SQLiteManager(settings.sqlite_db_path, block_seconds=settings.observation_block_seconds)
+            return AsyncSQLiteManager(settings.sqlite_db_path, reader_pool_size=settings.sqlite_reader_pool_size,
+                                      block_seconds=settings.observation_block_seconds)
+        return SQLiteManager(settings.sqlite_db_path, block_seconds=settings.observation_block_seconds)
     else:
         raise ValueError(f"Unsupported database type: {settings.database_type}. Only 'sqlite' is supported.")
\ No newline at end of file
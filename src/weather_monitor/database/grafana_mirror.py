@@ -0,0 +1,386 @@
+import sqlite3
+import time
+from datetime import datetime
+from loguru import logger
+from typing import Dict, Optional
+
+OBSERVATION_COLUMNS = [
+    "timestamp", "station_id", "neighborhood", "city", "latitude", "longitude",
+    "temperature", "humidity", "dewpoint", "heat_index", "wind_speed", "wind_gust",
+    "wind_direction", "pressure", "uv_index", "solar_radiation",
+    "precipitation_rate", "precipitation_total"
+]
+
+# Rollup resolutions in seconds, matching the dashboards' 5-minute and hourly buckets
+ROLLUP_RESOLUTIONS = (300, 3600)
+
+ROLLUP_AVERAGES = [
+    "temperature", "humidity", "dewpoint", "heat_index", "wind_speed", "wind_gust",
+    "pressure", "uv_index", "solar_radiation", "precipitation_rate"
+]
+
+# Grafana-facing radar tables, upserted on their natural key
+RADAR_TABLES = {
+    "radar_at_station": ["timestamp", "station_id", "tile_path", "zoom", "dbz", "rain_rate"],
+    "radar_accumulation_at_station": ["timestamp", "station_id", "window_hours", "precipitation_mm", "frame_count"],
+}
+
+class GrafanaMirror:
+    """Read-optimized copy of the weather database for Grafana
+    
+    Grafana reads a separate SQLite file holding only observations, rollups,
+    the latest observation per station and the radar values at stations, so
+    dashboard queries never touch the tile BLOBs or pin the main database's WAL.
+    Each sync copies the source rows with a rowid above the last synced one, then
+    recomputes only the rollup buckets and latest values those rows touched.
+    """
+    
+    def __init__(self, source_path: str, mirror_path: str, batch_size: int = 5000):
+        self.source_path = source_path
+        self.mirror_path = mirror_path
+        self.batch_size = batch_size
+        self.running = False
+        self._init_database()
+    
+    def _init_database(self):
+        """Create the mirror tables and the indexes the dashboards filter on"""
+        try:
+            with sqlite3.connect(self.mirror_path) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                
+                columns = ",\n".join(f"{name} {self._column_type(name)}" for name in OBSERVATION_COLUMNS)
+                
+                # Same columns as the source so existing dashboard queries keep working; id is the source rowid
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS weather_observations (
+                        id INTEGER PRIMARY KEY,
+                        epoch INTEGER NOT NULL,
+                        {columns}
+                    )
+                """)
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS latest_observations (
+                        station_id TEXT PRIMARY KEY,
+                        id INTEGER NOT NULL,
+                        epoch INTEGER NOT NULL,
+                        {",".join(f"{name} {self._column_type(name)}" for name in OBSERVATION_COLUMNS if name != 'station_id')}
+                    )
+                """)
+                
+                averages = ",\n".join(f"{name}_avg REAL" for name in ROLLUP_AVERAGES)
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS observation_rollups (
+                        resolution_seconds INTEGER NOT NULL,
+                        station_id TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        city TEXT,
+                        samples INTEGER NOT NULL,
+                        {averages},
+                        temperature_min REAL,
+                        temperature_max REAL,
+                        wind_gust_max REAL,
+                        precipitation_total_max REAL,
+                        PRIMARY KEY (resolution_seconds, station_id, bucket)
+                    ) WITHOUT ROWID
+                """)
+                
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS weather_stations (
+                        station_id TEXT PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        city TEXT NOT NULL,
+                        latitude REAL NOT NULL,
+                        longitude REAL NOT NULL,
+                        active BOOLEAN DEFAULT TRUE
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS radar_at_station (
+                        timestamp DATETIME NOT NULL,
+                        station_id TEXT NOT NULL,
+                        tile_path TEXT NOT NULL,
+                        zoom INTEGER NOT NULL,
+                        dbz REAL,
+                        rain_rate REAL,
+                        PRIMARY KEY (station_id, tile_path)
+                    )
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS radar_accumulation_at_station (
+                        timestamp DATETIME NOT NULL,
+                        station_id TEXT NOT NULL,
+                        window_hours INTEGER NOT NULL,
+                        precipitation_mm REAL,
+                        frame_count INTEGER,
+                        PRIMARY KEY (station_id, window_hours, timestamp)
+                    )
+                """)
+                
+                # Highest source rowid copied per table
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS mirror_sync_state (
+                        table_name TEXT PRIMARY KEY,
+                        last_rowid INTEGER NOT NULL DEFAULT 0,
+                        synced_at DATETIME
+                    )
+                """)
+                
+                # Latest-value panels read latest_observations and trend panels the rollups; the wind rose
+                # filters raw rows by station or city and epoch, the all-station panels by timestamp
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_timestamp ON weather_observations(timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_station_epoch ON weather_observations(station_id, epoch)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_city_epoch ON weather_observations(city, epoch)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_epoch ON weather_observations(epoch)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_rollup_bucket ON observation_rollups(resolution_seconds, bucket)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_radar_timestamp ON radar_at_station(timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_mirror_accumulation_timestamp ON radar_accumulation_at_station(timestamp)")
+                
+                conn.commit()
+                logger.info(f"Grafana mirror database initialized at {self.mirror_path}")
+        
+        except Exception as e:
+            logger.error(f"Error initializing Grafana mirror database: {e}")
+            raise
+    
+    @staticmethod
+    def _column_type(name: str) -> str:
+        """SQL type of an observation column"""
+        if name == "timestamp":
+            return "DATETIME NOT NULL"
+        if name in ("station_id", "neighborhood", "city"):
+            return "TEXT"
+        return "REAL"
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the mirror with the source attached read-only"""
+        conn = sqlite3.connect(self.mirror_path, uri=True)
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{self.source_path}?mode=ro",))
+        return conn
+    
+    @staticmethod
+    def _last_rowid(conn: sqlite3.Connection, table: str) -> int:
+        """Highest source rowid already copied for a table"""
+        row = conn.execute("SELECT last_rowid FROM mirror_sync_state WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+    
+    @staticmethod
+    def _set_last_rowid(conn: sqlite3.Connection, table: str, rowid: int):
+        """Record the sync position of a table"""
+        conn.execute("""
+            INSERT INTO mirror_sync_state (table_name, last_rowid, synced_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(table_name) DO UPDATE SET
+                last_rowid = excluded.last_rowid,
+                synced_at = excluded.synced_at
+        """, (table, rowid))
+    
+    def sync(self) -> Optional[Dict[str, int]]:
+        """Copy new source rows into the mirror, returning the number of rows copied per table"""
+        try:
+            conn = self._connect()
+        except Exception as e:
+            logger.error(f"Error opening Grafana mirror: {e}")
+            return None
+        
+        try:
+            self._reset_if_source_replaced(conn)
+            copied = {'weather_observations': self._sync_observations(conn)}
+            for table, columns in RADAR_TABLES.items():
+                copied[table] = self._sync_radar_table(conn, table, columns)
+            self._sync_stations(conn)
+            self._apply_deletions(conn)
+            conn.commit()
+            
+            conn.execute("PRAGMA main.optimize")
+            if any(copied.values()):
+                logger.info(f"Grafana mirror synced: {copied}")
+            return copied
+        
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error syncing Grafana mirror: {e}")
+            return None
+        
+        finally:
+            conn.close()
+    
+    def _reset_if_source_replaced(self, conn: sqlite3.Connection):
+        """Start over when the source's rowids went backwards (database recreated)"""
+        # AUTOINCREMENT's sequence never decreases, even when the newest rows are deleted
+        row = conn.execute("SELECT seq FROM src.sqlite_sequence WHERE name = 'weather_observations'").fetchone()
+        if (row[0] if row else 0) >= self._last_rowid(conn, 'weather_observations'):
+            return
+        
+        logger.warning("Source database was replaced, rebuilding the Grafana mirror")
+        for table in ('weather_observations', 'latest_observations', 'observation_rollups',
+                      'mirror_sync_state', *RADAR_TABLES):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+    
+    def _sync_observations(self, conn: sqlite3.Connection) -> int:
+        """Tail new observations in batches, refreshing the rollups and latest values each batch touches"""
+        columns = ", ".join(OBSERVATION_COLUMNS)
+        last_rowid = self._last_rowid(conn, 'weather_observations')
+        copied = 0
+        
+        while True:
+            cursor = conn.execute(f"""
+                INSERT OR REPLACE INTO weather_observations (id, epoch, {columns})
+                SELECT id, COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0), {columns}
+                FROM src.weather_observations
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_rowid, self.batch_size))
+            if cursor.rowcount <= 0:
+                break
+            copied += cursor.rowcount
+            
+            # Summaries are refreshed in the batch's transaction, so a crash never leaves
+            # copied rows behind the saved position without their rollups
+            for station_id, first_epoch, last_epoch in conn.execute("""
+                SELECT station_id, MIN(epoch), MAX(epoch) FROM weather_observations
+                WHERE id > ?
+                GROUP BY station_id
+            """, (last_rowid,)).fetchall():
+                self._refresh_rollups(conn, station_id, first_epoch, last_epoch)
+                self._refresh_latest(conn, station_id)
+            
+            last_rowid = conn.execute("SELECT MAX(id) FROM weather_observations").fetchone()[0]
+            self._set_last_rowid(conn, 'weather_observations', last_rowid)
+            
+            # Committing per batch keeps the read snapshot on the source short
+            conn.commit()
+        
+        return copied
+    
+    def _refresh_rollups(self, conn: sqlite3.Connection, station_id: str, first_epoch: int, last_epoch: int):
+        """Recompute a station's rollup buckets between those holding its earliest and latest new rows"""
+        averages = ", ".join(f"AVG({name})" for name in ROLLUP_AVERAGES)
+        average_columns = ", ".join(f"{name}_avg" for name in ROLLUP_AVERAGES)
+        
+        for resolution in ROLLUP_RESOLUTIONS:
+            conn.execute(f"""
+                INSERT OR REPLACE INTO observation_rollups
+                (resolution_seconds, station_id, bucket, city, samples, {average_columns},
+                 temperature_min, temperature_max, wind_gust_max, precipitation_total_max)
+                SELECT ?, station_id, epoch / ? * ?, MAX(city), COUNT(*), {averages},
+                       MIN(temperature), MAX(temperature), MAX(wind_gust), MAX(precipitation_total)
+                FROM weather_observations
+                WHERE station_id = ? AND epoch >= ? AND epoch < ?
+                GROUP BY epoch / ?
+            """, (resolution, resolution, resolution, station_id, first_epoch // resolution * resolution,
+                  (last_epoch // resolution + 1) * resolution, resolution))
+    
+    def _refresh_latest(self, conn: sqlite3.Connection, station_id: str):
+        """Store the newest observation of a station"""
+        columns = ", ".join(OBSERVATION_COLUMNS)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO latest_observations (id, epoch, {columns})
+            SELECT id, epoch, {columns}
+            FROM weather_observations
+            WHERE station_id = ?
+            ORDER BY epoch DESC, id DESC
+            LIMIT 1
+        """, (station_id,))
+    
+    def _sync_radar_table(self, conn: sqlite3.Connection, table: str, columns) -> int:
+        """Tail a radar-at-station table; replaced source rows get new rowids and are upserted"""
+        column_list = ", ".join(columns)
+        last_rowid = self._last_rowid(conn, table)
+        
+        cursor = conn.execute(f"""
+            INSERT OR REPLACE INTO main.{table} ({column_list})
+            SELECT {column_list} FROM src.{table}
+            WHERE id > ?
+            ORDER BY id
+        """, (last_rowid,))
+        copied = max(cursor.rowcount, 0)
+        if copied:
+            last_rowid = conn.execute(f"SELECT MAX(id) FROM src.{table}").fetchone()[0]
+            self._set_last_rowid(conn, table, last_rowid)
+        return copied
+    
+    def _sync_stations(self, conn: sqlite3.Connection):
+        """Copy the small station metadata table whole"""
+        conn.execute("DELETE FROM weather_stations")
+        conn.execute("""
+            INSERT INTO weather_stations (station_id, name, city, latitude, longitude, active)
+            SELECT station_id, name, city, latitude, longitude, active FROM src.weather_stations
+        """)
+    
+    def _apply_deletions(self, conn: sqlite3.Connection):
+        """Follow retention cleanup and deleted stations in the source"""
+        # Compaction moves older rows into src.observation_blocks, so only what is older than
+        # both the oldest row and the oldest block was removed by retention
+        has_blocks = conn.execute(
+            "SELECT 1 FROM src.sqlite_master WHERE type = 'table' AND name = 'observation_blocks'"
+        ).fetchone() is not None
+        oldest = conn.execute("""
+            SELECT CAST(strftime('%s', MIN(timestamp)) AS INTEGER) FROM src.weather_observations
+        """).fetchone()[0]
+        if has_blocks:
+            oldest_block = conn.execute("SELECT MIN(block_start) FROM src.observation_blocks").fetchone()[0]
+            oldest = min(filter(lambda value: value is not None, [oldest, oldest_block]), default=None)
+        if oldest is not None:
+            conn.execute("DELETE FROM weather_observations WHERE epoch < ?", (oldest,))
+        conn.execute("""
+            DELETE FROM observation_rollups
+            WHERE bucket + resolution_seconds <= (SELECT MIN(epoch) FROM weather_observations)
+        """)
+        
+        # One indexed lookup per mirrored station instead of a scan of the source
+        for (station_id,) in conn.execute("SELECT station_id FROM latest_observations").fetchall():
+            exists = conn.execute(
+                "SELECT 1 FROM src.weather_observations WHERE station_id = ? LIMIT 1", (station_id,)
+            ).fetchone() or (has_blocks and conn.execute(
+                "SELECT 1 FROM src.observation_blocks WHERE station_id = ? LIMIT 1", (station_id,)
+            ).fetchone())
+            if not exists:
+                logger.info(f"Removing deleted station {station_id} from the Grafana mirror")
+                for table in ('weather_observations', 'latest_observations', 'observation_rollups'):
+                    conn.execute(f"DELETE FROM {table} WHERE station_id = ?", (station_id,))
+        
+        for table in RADAR_TABLES:
+            conn.execute(f"""
+                DELETE FROM main.{table}
+                WHERE timestamp < (SELECT MIN(timestamp) FROM src.{table})
+            """)
+    
+    def start_sync(self, interval: int = 60):
+        """Sync the mirror every interval seconds until stopped"""
+        self.running = True
+        logger.info(f"Syncing Grafana mirror {self.mirror_path} from {self.source_path} every {interval}s")
+        
+        while self.running:
+            started = time.monotonic()
+            self.sync()
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    
+    def stop_sync(self):
+        """Stop the sync loop"""
+        self.running = False
+        logger.info("Stopping Grafana mirror sync...")
+    
+    def get_status(self) -> dict:
+        """Sync position and row counts of the mirror"""
+        try:
+            with sqlite3.connect(self.mirror_path) as conn:
+                state = {
+                    table: {'last_rowid': last_rowid, 'synced_at': synced_at}
+                    for table, last_rowid, synced_at in conn.execute(
+                        "SELECT table_name, last_rowid, synced_at FROM mirror_sync_state"
+                    )
+                }
+                counts = {
+                    table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ('weather_observations', 'latest_observations', 'observation_rollups',
+                                  'weather_stations', *RADAR_TABLES)
+                }
+            return {'sync_state': state, 'row_counts': counts, 'checked_at': datetime.now().isoformat()}
+        
+        except Exception as e:
+            logger.error(f"Error getting Grafana mirror status: {e}")
+            return {}
@@ -0,0 +1,221 @@
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .block_codec import BLOCK_VALUE_COLUMNS, decode_block, encode_block
+from .table_stats import count_deleted, count_inserted
+
+BLOCK_TEXT_COLUMNS = ["neighborhood", "city", "latitude", "longitude"]
+
+def epoch_to_text(epoch: int) -> str:
+    """Timestamp text in the format weather_observations sorts by"""
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def text_to_epoch(value: str) -> int:
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+class ObservationBlockStore:
+    """Observation history packed into one compressed block per station and time window
+    
+    Compaction moves rows older than a cutoff out of weather_observations into
+    observation_blocks, a window of block_seconds per row, encoded by
+    block_codec: delta-of-delta timestamps, delta-encoded ids and decimal or
+    XOR-encoded measurements. Rows that arrive later for an already compacted
+    window are merged into its block on the next compaction. Timestamps keep
+    one-second resolution.
+    """
+    
+    def __init__(self, block_seconds: int = 3600):
+        self.block_seconds = block_seconds
+    
+    @staticmethod
+    def create_table(conn: sqlite3.Connection):
+        """Create the block table; it stays empty until observations are compacted"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS observation_blocks (
+                station_id TEXT NOT NULL,
+                block_start INTEGER NOT NULL,
+                block_end INTEGER NOT NULL,
+                row_count INTEGER NOT NULL,
+                neighborhood TEXT,
+                city TEXT,
+                latitude REAL,
+                longitude REAL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (station_id, block_start)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_start ON observation_blocks(block_start)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_blocks_end ON observation_blocks(block_end)")
+    
+    def compact(self, conn: sqlite3.Connection, cutoff_epoch: int, blocks_per_transaction: int = 200) -> Dict[str, int]:
+        """Move every complete window before cutoff_epoch from weather_observations into blocks"""
+        boundary = cutoff_epoch // self.block_seconds * self.block_seconds
+        windows = conn.execute("""
+            SELECT station_id, CAST(strftime('%s', timestamp) AS INTEGER) / ? * ? AS block_start
+            FROM weather_observations
+            WHERE timestamp < ?
+            GROUP BY station_id, block_start
+            ORDER BY block_start, station_id
+        """, (self.block_seconds, self.block_seconds, epoch_to_text(boundary))).fetchall()
+        
+        result = {'blocks': 0, 'rows': 0}
+        for index in range(0, len(windows), blocks_per_transaction):
+            # Rows are read and deleted under the write lock so none arrive in between; short
+            # transactions keep the monitor's inserts flowing during a large first compaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for station_id, block_start in windows[index:index + blocks_per_transaction]:
+                    result['rows'] += self._compact_window(conn, station_id, block_start)
+                    result['blocks'] += 1
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return result
+    
+    def _compact_window(self, conn: sqlite3.Connection, station_id: str, block_start: int) -> int:
+        """Merge the rows of one window into its block and delete them"""
+        bounds = (station_id, epoch_to_text(block_start), epoch_to_text(block_start + self.block_seconds))
+        rows = conn.execute(f"""
+            SELECT CAST(strftime('%s', timestamp) AS INTEGER), id, {", ".join(BLOCK_VALUE_COLUMNS)},
+                   {", ".join(BLOCK_TEXT_COLUMNS)}
+            FROM weather_observations
+            WHERE station_id = ? AND timestamp >= ? AND timestamp < ?
+            ORDER BY timestamp, id
+        """, bounds).fetchall()
+        if not rows:
+            return 0
+        
+        arrays = {
+            'timestamp': np.array([row[0] for row in rows], dtype=np.int64),
+            'id': np.array([row[1] for row in rows], dtype=np.int64),
+        }
+        for index, name in enumerate(BLOCK_VALUE_COLUMNS, start=2):
+            arrays[name] = np.array([row[index] for row in rows], dtype=np.float64)
+        text_values = rows[-1][-len(BLOCK_TEXT_COLUMNS):]
+        
+        existing = conn.execute("""
+            SELECT payload FROM observation_blocks WHERE station_id = ? AND block_start = ?
+        """, (station_id, block_start)).fetchone()
+        if existing:
+            previous = decode_block(existing[0])
+            arrays = {name: np.concatenate([previous[name], values]) for name, values in arrays.items()}
+        
+        order = np.lexsort((arrays['id'], arrays['timestamp']))
+        arrays = {name: values[order] for name, values in arrays.items()}
+        
+        conn.execute(f"""
+            INSERT OR REPLACE INTO observation_blocks
+            (station_id, block_start, block_end, row_count, {", ".join(BLOCK_TEXT_COLUMNS)}, payload)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (station_id, block_start, block_start + self.block_seconds, len(arrays['timestamp']),
+              *text_values, encode_block(arrays['timestamp'], arrays['id'], arrays)))
+        conn.execute("""
+            DELETE FROM weather_observations
+            WHERE station_id = ? AND timestamp >= ? AND timestamp < ?
+        """, bounds)
+        conn.execute(*count_deleted('weather_observations', len(rows)))
+        conn.execute(*count_inserted('observation_blocks', 0 if existing else 1, block_start,
+                                     block_start + self.block_seconds, total=len(rows)))
+        return len(rows)
+    
+    def iter_windows(self, conn: sqlite3.Connection, station_id: Optional[str] = None,
+                     start_epoch: Optional[int] = None, end_epoch: Optional[int] = None,
+                     descending: bool = False) -> Iterator[Tuple[int, List[Tuple[dict, Dict[str, np.ndarray]]]]]:
+        """Blocks overlapping [start, end), grouped by window start and sliced to the range"""
+        filters, params = ["1 = 1"], []
+        if station_id:
+            filters.append("station_id = ?")
+            params.append(station_id)
+        if start_epoch is not None:
+            filters.append("block_end > ?")
+            params.append(start_epoch)
+        if end_epoch is not None:
+            filters.append("block_start < ?")
+            params.append(end_epoch)
+        
+        order = "DESC" if descending else ""
+        window_starts = [row[0] for row in conn.execute(f"""
+            SELECT DISTINCT block_start FROM observation_blocks
+            WHERE {" AND ".join(filters)}
+            ORDER BY block_start {order}
+        """, params)]
+        
+        # One short query per window, so a long read never holds a snapshot
+        for block_start in window_starts:
+            blocks = []
+            for row in conn.execute(f"""
+                SELECT station_id, {", ".join(BLOCK_TEXT_COLUMNS)}, payload FROM observation_blocks
+                WHERE block_start = ? AND {" AND ".join(filters)}
+                ORDER BY station_id
+            """, (block_start, *params)).fetchall():
+                arrays = decode_block(row[-1])
+                selected = np.ones(len(arrays['timestamp']), dtype=bool)
+                if start_epoch is not None:
+                    selected &= arrays['timestamp'] >= start_epoch
+                if end_epoch is not None:
+                    selected &= arrays['timestamp'] < end_epoch
+                if selected.any():
+                    meta = dict(zip(['station_id', *BLOCK_TEXT_COLUMNS], row[:-1]))
+                    blocks.append((meta, {name: values[selected] for name, values in arrays.items()}))
+            if blocks:
+                yield block_start, blocks
+    
+    def read(self, conn: sqlite3.Connection, station_id: str, start_epoch: Optional[int] = None,
+             end_epoch: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Column arrays of one station's block readings in [start, end), sorted by time"""
+        parts = [arrays for _, blocks in self.iter_windows(conn, station_id, start_epoch, end_epoch)
+                 for _, arrays in blocks]
+        if not parts:
+            return {name: np.empty(0, dtype=np.int64 if name in ('timestamp', 'id') else np.float64)
+                    for name in ['timestamp', 'id', *BLOCK_VALUE_COLUMNS]}
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    
+    def latest_rows(self, conn: sqlite3.Connection, station_id: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Newest block readings as weather_observations-style dicts, newest first"""
+        observations: List[dict] = []
+        for _, blocks in self.iter_windows(conn, station_id, descending=True):
+            if len(observations) >= limit:
+                break
+            rows = [row for meta, arrays in blocks for row in self.rows(meta, arrays)]
+            rows.sort(key=lambda row: (row['timestamp'], row['id']), reverse=True)
+            observations.extend(rows[:limit - len(observations)])
+        return observations
+    
+    @staticmethod
+    def rows(meta: dict, arrays: Dict[str, np.ndarray]) -> List[dict]:
+        """Decoded readings as weather_observations-style dicts"""
+        values = {name: arrays[name].tolist() for name in BLOCK_VALUE_COLUMNS}
+        return [
+            {
+                'id': int(row_id),
+                'timestamp': epoch_to_text(epoch),
+                **meta,
+                **{name: (None if values[name][index] != values[name][index] else values[name][index])
+                   for name in BLOCK_VALUE_COLUMNS}
+            }
+            for index, (epoch, row_id) in enumerate(zip(arrays['timestamp'].tolist(), arrays['id'].tolist()))
+        ]
+    
+    @staticmethod
+    def stats(conn: sqlite3.Connection) -> dict:
+        """Block count, readings, payload bytes and time range of the block store"""
+        blocks, readings, payload_bytes, first, last = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(LENGTH(payload)), 0),
+                   MIN(block_start), MAX(block_end)
+            FROM observation_blocks
+        """).fetchone()
+        return {
+            'blocks': blocks,
+            'readings': readings,
+            'payload_bytes': payload_bytes,
+            'bytes_per_reading': round(payload_bytes / readings, 1) if readings else None,
+            'earliest': epoch_to_text(first) if first is not None else None,
+            'latest': epoch_to_text(last) if last is not None else None
+        }
@@ -1,17 +1,32 @@
+import heapq
 import sqlite3
+import time
 import aiosqlite
 from datetime import datetime
 from loguru import logger
-from typing import Optional, List
-import json
+from typing import Iterator, Optional, List, Tuple, Dict
 
 from ..models.weather import WeatherObservation, WeatherStation
+from .observation_blocks import ObservationBlockStore, text_to_epoch
+from . import sqlite_operations as operations
+from .sqlite_operations import Operation, run
+from .table_stats import create_table_stats, refresh_table_stats
+
+# Observation columns that can be exported
+OBSERVATION_EXPORT_COLUMNS = [
+    "id", "timestamp", "station_id", "neighborhood", "city", "latitude", "longitude",
+    "temperature", "humidity", "dewpoint", "heat_index", "wind_speed", "wind_gust",
+    "wind_direction", "pressure", "uv_index", "solar_radiation",
+    "precipitation_rate", "precipitation_total"
+]
 
 class SQLiteManager:
-    def __init__(self, db_path: str = "weather_data.db"):
+    def __init__(self, db_path: str = "weather_data.db", block_seconds: int = 3600):
         self.db_path = db_path
+        # Compacted observation history; read together with weather_observations
+        self.block_store = ObservationBlockStore(block_seconds)
         self._init_database()
-        
+    
     def _init_database(self):
         """Initialize database tables"""
         try:
@@ -62,12 +77,16 @@ class SQLiteManager:
                     )
                 """)
                 
+                # Databases created before nowcast and accumulation tiles had their own
+                # data_type only allowed radar and satellite; the table is rebuilt once
+                legacy_tiles = self._rename_legacy_radar_tiles(conn)
+                
                 # Radar data table for caching tiles
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS radar_tiles (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         timestamp DATETIME NOT NULL,
-                        data_type TEXT NOT NULL CHECK(data_type IN ('radar', 'satellite')),
+                        data_type TEXT NOT NULL CHECK(data_type IN ('radar', 'satellite', 'nowcast', 'accumulation')),
                         tile_path TEXT NOT NULL,
                         zoom INTEGER NOT NULL,
                         x INTEGER NOT NULL,
@@ -80,6 +99,9 @@ class SQLiteManager:
                     )
                 """)
                 
+                if legacy_tiles:
+                    self._copy_legacy_radar_tiles(conn)
+                
                 # Radar animation metadata table
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS radar_animations (
@@ -93,6 +115,55 @@ class SQLiteManager:
                     )
                 """)
                 
+                # Per-frame collection state so complete frames can be skipped
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS radar_frames (
+                        tile_path TEXT NOT NULL,
+                        data_type TEXT NOT NULL,
+                        timestamp DATETIME NOT NULL,
+                        expected_tiles TEXT NOT NULL DEFAULT '[]',
+                        stored_tiles TEXT NOT NULL DEFAULT '[]',
+                        expected_count INTEGER DEFAULT 0,
+                        stored_count INTEGER DEFAULT 0,
+                        complete BOOLEAN DEFAULT FALSE,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (tile_path, data_type)
+                    )
+                """)
+                
+                # Radar-derived precipitation sampled at each station
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS radar_at_station (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        timestamp DATETIME NOT NULL,
+                        station_id TEXT NOT NULL,
+                        tile_path TEXT NOT NULL,
+                        zoom INTEGER NOT NULL,
+                        dbz REAL,
+                        rain_rate REAL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE (station_id, tile_path)
+                    )
+                """)
+                
+                # Rolling radar precipitation accumulations at station locations
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS radar_accumulation_at_station (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        timestamp DATETIME NOT NULL,
+                        station_id TEXT NOT NULL,
+                        window_hours INTEGER NOT NULL,
+                        precipitation_mm REAL,
+                        frame_count INTEGER,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE (station_id, window_hours, timestamp)
+                    )
+                """)
+                
+                # Observation history packed into compressed per-station blocks
+                ObservationBlockStore.create_table(conn)
+                
                 # Create indexes for better query performance
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON weather_observations(timestamp)")
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_station_id ON weather_observations(station_id)")
@@ -102,55 +173,92 @@ class SQLiteManager:
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_timestamp ON radar_tiles(timestamp)")
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_path ON radar_tiles(tile_path)")
                 conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_coords ON radar_tiles(zoom, x, y)")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_type ON radar_tiles(data_type)")
+                # Serves data_type filters and the per-type bounds kept in table_stats
+                conn.execute("DROP INDEX IF EXISTS idx_radar_type")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_type_timestamp ON radar_tiles(data_type, timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_tile_lookup ON radar_tiles(tile_path, zoom, x, y)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_frames_timestamp ON radar_frames(data_type, timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_station_timestamp ON radar_at_station(station_id, timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_accumulation_timestamp ON radar_accumulation_at_station(timestamp)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_radar_animations_created ON radar_animations(created_at)")
                 
                 conn.commit()
-                logger.info("SQLite database initialized successfully")
                 
+                # Row counts and time ranges kept current by the write paths, read by the stats APIs
+                create_table_stats(conn)
+                if legacy_tiles:
+                    # Moved tiles changed data_type partitions
+                    refresh_table_stats(conn)
+                    conn.commit()
+                logger.info("SQLite database initialized successfully")
+        
         except Exception as e:
             logger.error(f"Error initializing SQLite database: {e}")
             raise
     
+    @staticmethod
+    def _rename_legacy_radar_tiles(conn: sqlite3.Connection) -> bool:
+        """Move a radar_tiles table with the old data_type constraint out of the way"""
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'radar_tiles'").fetchone()
+        if not row or 'nowcast' in row[0]:
+            return False
+        
+        logger.info("Rebuilding radar_tiles to allow nowcast and accumulation data types")
+        # Committed by _copy_legacy_radar_tiles, so an interrupted rebuild leaves the old table in place
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("ALTER TABLE radar_tiles RENAME TO radar_tiles_legacy")
+        return True
+    
+    @staticmethod
+    def _copy_legacy_radar_tiles(conn: sqlite3.Connection):
+        """Copy the renamed tiles into the new table, reclassifying locally produced ones"""
+        conn.execute("""
+            INSERT INTO radar_tiles
+            (id, timestamp, data_type, tile_path, zoom, x, y, color_scheme, snow, smooth, tile_data, created_at)
+            SELECT id, timestamp,
+                   CASE WHEN tile_path LIKE '/nowcast/%' THEN 'nowcast'
+                        WHEN tile_path LIKE '/accumulation/%' THEN 'accumulation'
+                        ELSE data_type END,
+                   tile_path, zoom, x, y, color_scheme, snow, smooth, tile_data, created_at
+            FROM radar_tiles_legacy
+        """)
+        # Drops the old indexes too, so they are recreated on the new table below
+        conn.execute("DROP TABLE radar_tiles_legacy")
+        conn.commit()
+    
+    def _run(self, operation: Operation):
+        """Run an operation on a short-lived connection and commit it as one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                return run(conn, operation)
+        finally:
+            conn.close()
+    
     def write_weather_data(self, observation: WeatherObservation) -> bool:
         """Write weather observation to SQLite"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO weather_observations 
-                    (timestamp, station_id, neighborhood, city, latitude, longitude,
-                     temperature, humidity, dewpoint, heat_index, wind_speed, wind_gust,
-                     wind_direction, pressure, uv_index, solar_radiation, 
-                     precipitation_rate, precipitation_total)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    observation.timestamp,
-                    observation.station_id,
-                    observation.neighborhood,
-                    observation.city,
-                    observation.latitude,
-                    observation.longitude,
-                    observation.temperature,
-                    observation.humidity,
-                    observation.dewpoint,
-                    observation.heat_index,
-                    observation.wind_speed,
-                    observation.wind_gust,
-                    observation.wind_direction,
-                    observation.pressure,
-                    observation.uv_index,
-                    observation.solar_radiation,
-                    observation.precipitation_rate,
-                    observation.precipitation_total
-                ))
-                conn.commit()
-                
+            self._run(operations.write_observations([observation]))
             logger.info(f"Successfully wrote weather data for station {observation.station_id}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error writing to SQLite: {e}")
             return False
     
+    def write_weather_data_batch(self, observations: List[WeatherObservation]) -> bool:
+        """Write several weather observations in one transaction"""
+        if not observations:
+            return True
+        
+        try:
+            self._run(operations.write_observations(observations))
+            logger.info(f"Successfully wrote {len(observations)} weather observations")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing observation batch to SQLite: {e}")
+            return False
     
     def test_connection(self) -> bool:
         """Test SQLite connection"""
@@ -166,24 +274,10 @@ class SQLiteManager:
     def write_station_metadata(self, station: WeatherStation) -> bool:
         """Write weather station metadata to SQLite"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO weather_stations 
-                    (station_id, name, city, latitude, longitude, active, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                """, (
-                    station.station_id,
-                    station.name,
-                    station.city,
-                    station.latitude,
-                    station.longitude,
-                    station.active
-                ))
-                conn.commit()
-                
+            self._run(operations.write_station_metadata(station))
             logger.info(f"Successfully wrote station metadata for {station.station_id}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error writing station metadata to SQLite: {e}")
             return False
@@ -191,44 +285,133 @@ class SQLiteManager:
     def get_latest_observations(self, station_id: Optional[str] = None, limit: int = 100) -> List[dict]:
         """Get latest weather observations"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
-                if station_id:
-                    cursor = conn.execute("""
-                        SELECT * FROM weather_observations 
-                        WHERE station_id = ? 
-                        ORDER BY timestamp DESC 
-                        LIMIT ?
-                    """, (station_id, limit))
-                else:
-                    cursor = conn.execute("""
-                        SELECT * FROM weather_observations 
-                        ORDER BY timestamp DESC 
-                        LIMIT ?
-                    """, (limit,))
+            conn = sqlite3.connect(self.db_path)
+            try:
+                observations = run(conn, operations.latest_observation_rows(station_id, limit))
                 
-                return [dict(row) for row in cursor.fetchall()]
+                # Older observations may already be compacted into blocks
+                if len(observations) < limit:
+                    observations.extend(self.block_store.latest_rows(conn, station_id, limit - len(observations)))
                 
+                return observations
+            finally:
+                conn.close()
+        
         except Exception as e:
             logger.error(f"Error querying SQLite: {e}")
             return []
     
+    def iter_observations(self, station_id: Optional[str] = None, start: Optional[str] = None,
+                          end: Optional[str] = None, columns: Optional[List[str]] = None,
+                          chunk_size: int = 5000) -> Iterator[List[tuple]]:
+        """Yield observations in timestamp order as chunks of row tuples
+        
+        Each chunk is its own short query that continues after the last
+        (timestamp, id) seen, so memory stays constant and a long export never
+        holds a read snapshot that would keep the WAL from being checkpointed.
+        Compacted blocks are decoded one window at a time and merged in.
+        """
+        columns = columns or OBSERVATION_EXPORT_COLUMNS
+        unknown = [column for column in columns if column not in OBSERVATION_EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown observation columns: {', '.join(unknown)}")
+        
+        merged = heapq.merge(
+            self._iter_block_observations(station_id, start, end, columns),
+            self._iter_row_observations(station_id, start, end, columns, chunk_size),
+            key=lambda row: row[:2]
+        )
+        chunk = []
+        for row in merged:
+            chunk.append(row[2:])
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _iter_row_observations(self, station_id: Optional[str], start: Optional[str], end: Optional[str],
+                               columns: List[str], chunk_size: int) -> Iterator[tuple]:
+        """Rows of weather_observations as (timestamp, id, *columns), paged by keyset queries"""
+        filters = []
+        params: list = []
+        if station_id:
+            filters.append("station_id = ?")
+            params.append(station_id)
+        if start:
+            filters.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            filters.append("timestamp < ?")
+            params.append(end)
+        
+        query = """
+            SELECT timestamp, id, {columns} FROM weather_observations
+            WHERE {filters} (timestamp, id) > (?, ?)
+            ORDER BY timestamp, id
+            LIMIT ?
+        """.format(columns=", ".join(columns), filters="".join(f"{condition} AND " for condition in filters))
+        
+        last_key = ("", -1)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                while True:
+                    rows = conn.execute(query, (*params, *last_key, chunk_size)).fetchall()
+                    if not rows:
+                        return
+                    last_key = rows[-1][:2]
+                    yield from rows
+                    if len(rows) < chunk_size:
+                        return
+        
+        except Exception as e:
+            logger.error(f"Error streaming observations: {e}")
+            raise
+    
+    def _iter_block_observations(self, station_id: Optional[str], start: Optional[str], end: Optional[str],
+                                 columns: List[str]) -> Iterator[tuple]:
+        """Readings of compacted blocks as (timestamp, id, *columns) in the same order"""
+        start_epoch = text_to_epoch(start) if start else None
+        end_epoch = text_to_epoch(end) if end else None
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                for _, blocks in self.block_store.iter_windows(conn, station_id, start_epoch, end_epoch):
+                    rows = [row for meta, arrays in blocks for row in self.block_store.rows(meta, arrays)]
+                    rows.sort(key=lambda row: (row['timestamp'], row['id']))
+                    for row in rows:
+                        yield (row['timestamp'], row['id'], *(row[column] for column in columns))
+        
+        except Exception as e:
+            logger.error(f"Error streaming compacted observations: {e}")
+            raise
+    
+    def compact_observations(self, older_than_hours: float = 48) -> Optional[dict]:
+        """Pack observations older than older_than_hours into compressed blocks"""
+        started = time.perf_counter()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                result = self.block_store.compact(conn, int(time.time() - older_than_hours * 3600))
+            finally:
+                conn.close()
+            
+            result['duration_seconds'] = round(time.perf_counter() - started, 2)
+            if result['rows']:
+                logger.info(f"Compacted {result['rows']} observations into {result['blocks']} blocks "
+                            f"in {result['duration_seconds']}s")
+            return result
+        
+        except Exception as e:
+            logger.error(f"Error compacting observations: {e}")
+            return None
+    
     def cleanup_old_data(self, days_to_keep: int = 30) -> bool:
         """Remove old data to keep database size manageable"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("""
-                    DELETE FROM weather_observations 
-                    WHERE timestamp < datetime('now', '-{} days')
-                """.format(days_to_keep))
-                
-                deleted_rows = cursor.rowcount
-                conn.commit()
-                
-                logger.info(f"Cleaned up {deleted_rows} old weather observations")
-                return True
-                
+            deleted_rows, deleted_blocks = self._run(operations.cleanup_old_data(days_to_keep))
+            logger.info(f"Cleaned up {deleted_rows} old weather observations and {deleted_blocks} observation blocks")
+            return True
+        
         except Exception as e:
             logger.error(f"Error cleaning up old data: {e}")
             return False
@@ -236,27 +419,10 @@ class SQLiteManager:
     def delete_station_data(self, station_id: str) -> bool:
         """Delete all data for a specific station"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Delete weather observations
-                cursor = conn.execute("""
-                    DELETE FROM weather_observations 
-                    WHERE station_id = ?
-                """, (station_id,))
-                
-                deleted_observations = cursor.rowcount
-                
-                # Delete station metadata
-                cursor = conn.execute("""
-                    DELETE FROM weather_stations 
-                    WHERE station_id = ?
-                """, (station_id,))
-                
-                deleted_metadata = cursor.rowcount
-                conn.commit()
-                
-                logger.info(f"Deleted {deleted_observations} observations and {deleted_metadata} metadata records for station {station_id}")
-                return True
-                
+            deleted_observations, deleted_metadata = self._run(operations.delete_station_data(station_id))
+            logger.info(f"Deleted {deleted_observations} observations and {deleted_metadata} metadata records for station {station_id}")
+            return True
+        
         except Exception as e:
             logger.error(f"Error deleting station data for {station_id}: {e}")
             return False
@@ -264,99 +430,112 @@ class SQLiteManager:
     def get_database_stats(self) -> dict:
         """Get database statistics"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Get row counts
-                observations_count = conn.execute("SELECT COUNT(*) FROM weather_observations").fetchone()[0]
-                stations_count = conn.execute("SELECT COUNT(*) FROM weather_stations").fetchone()[0]
-                
-                # Get database size
-                db_size = conn.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()").fetchone()[0]
-                
-                # Get date range
-                date_range = conn.execute("""
-                    SELECT MIN(timestamp) as earliest, MAX(timestamp) as latest 
-                    FROM weather_observations
-                """).fetchone()
-                
-                return {
-                    "observations_count": observations_count,
-                    "stations_count": stations_count,
-                    "database_size_bytes": db_size,
-                    "database_size_mb": round(db_size / 1024 / 1024, 2),
-                    "earliest_observation": date_range[0],
-                    "latest_observation": date_range[1]
-                }
-                
+            return self._run(operations.get_database_stats())
+        
         except Exception as e:
             logger.error(f"Error getting database stats: {e}")
             return {}
     
+    def get_observation_block_stats(self) -> dict:
+        """Block store statistics including payload size; scans every block"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return self.block_store.stats(conn)
+        
+        except Exception as e:
+            logger.error(f"Error getting observation block stats: {e}")
+            return {}
+    
+    def get_table_stats(self) -> Dict[str, Dict[str, dict]]:
+        """Row counts and min/max timestamps by table and partition, read from table_stats"""
+        try:
+            return self._run(operations.get_table_stats())
+        
+        except Exception as e:
+            logger.error(f"Error getting table stats: {e}")
+            return {}
+    
+    def refresh_table_stats(self) -> bool:
+        """Recount the tracked tables with full scans, e.g. after writes that bypassed the managers"""
+        try:
+            self._run(operations.refresh_table_stats())
+            logger.info("Refreshed table stats")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error refreshing table stats: {e}")
+            return False
+    
     def write_radar_tile(self, timestamp: datetime, data_type: str, tile_path: str, 
                         zoom: int, x: int, y: int, tile_data: bytes, 
                         color_scheme: int = 1, snow: bool = False, smooth: bool = True) -> bool:
         """Write radar tile data to SQLite"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO radar_tiles 
-                    (timestamp, data_type, tile_path, zoom, x, y, color_scheme, snow, smooth, tile_data)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    timestamp,
-                    data_type,
-                    tile_path,
-                    zoom,
-                    x,
-                    y,
-                    color_scheme,
-                    snow,
-                    smooth,
-                    tile_data
-                ))
-                conn.commit()
-                
+            self._run(operations.write_radar_tile(timestamp, data_type, tile_path, zoom, x, y, tile_data,
+                                                  color_scheme, snow, smooth))
             logger.debug(f"Successfully wrote radar tile {tile_path} ({zoom}/{x}/{y})")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error writing radar tile to SQLite: {e}")
             return False
     
+    def replace_radar_tiles(self, timestamp: datetime, data_type: str, tile_path: str,
+                            zoom: int, tiles: Dict[Tuple[int, int], bytes]) -> bool:
+        """Replace the stored tiles of a locally produced layer in one transaction"""
+        try:
+            self._run(operations.replace_radar_tiles(timestamp, data_type, tile_path, zoom, tiles))
+            logger.debug(f"Replaced {len(tiles)} radar tiles of {tile_path} at zoom {zoom}")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error replacing radar tiles in SQLite: {e}")
+            return False
+    
     def get_radar_tile(self, tile_path: str, zoom: int, x: int, y: int, 
-                      max_age_hours: int = 1) -> Optional[bytes]:
+                      max_age_hours: int = 1, color_scheme: int = 1) -> Optional[bytes]:
         """Get cached radar tile from SQLite"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("""
-                    SELECT tile_data FROM radar_tiles 
-                    WHERE tile_path = ? AND zoom = ? AND x = ? AND y = ?
-                    AND created_at > datetime('now', '-{} hours')
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                """.format(max_age_hours), (tile_path, zoom, x, y))
-                
-                row = cursor.fetchone()
-                return row[0] if row else None
-                
+            return self._run(operations.get_radar_tile(tile_path, zoom, x, y, max_age_hours, color_scheme))
+        
         except Exception as e:
             logger.error(f"Error getting radar tile from SQLite: {e}")
             return None
     
+    def get_radar_tiles(self, tile_path: str, zoom: int, tiles: List[Tuple[int, int]],
+                        max_age_hours: int = 1, color_scheme: int = 1) -> Optional[Dict[Tuple[int, int], bytes]]:
+        """Get cached tiles of one frame and zoom level, keyed by (x, y), in one query"""
+        if not tiles:
+            return {}
+        
+        try:
+            return self._run(operations.get_radar_tiles(tile_path, zoom, tiles, max_age_hours, color_scheme))
+        
+        except Exception as e:
+            logger.error(f"Error getting radar tiles from SQLite: {e}")
+            return None
+    
+    def get_missing_radar_tiles(self, tile_path: str, tiles: List[Tuple[int, int, int]],
+                                max_age_hours: int = 1, color_scheme: int = 1) -> Optional[List[Tuple[int, int, int]]]:
+        """Return the subset of (zoom, x, y) tiles not cached for a frame, in one query"""
+        if not tiles:
+            return []
+        
+        try:
+            return self._run(operations.get_missing_radar_tiles(tile_path, tiles, max_age_hours, color_scheme))
+        
+        except Exception as e:
+            logger.error(f"Error checking missing radar tiles: {e}")
+            return None
+    
     def write_radar_animation(self, timestamp: datetime, version: str, 
                             generated: datetime, host: str, frame_count: int) -> bool:
         """Write radar animation metadata to SQLite"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute("""
-                    INSERT INTO radar_animations 
-                    (timestamp, version, generated, host, frame_count)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (timestamp, version, generated, host, frame_count))
-                conn.commit()
-                
+            self._run(operations.write_radar_animation(timestamp, version, generated, host, frame_count))
             logger.debug(f"Successfully wrote radar animation metadata")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error writing radar animation to SQLite: {e}")
             return False
@@ -364,47 +543,94 @@ class SQLiteManager:
     def get_historical_radar_frames(self, hours: int = 2, data_type: str = 'radar') -> List[dict]:
         """Get historical radar frames from the last N hours"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                
-                cursor = conn.execute("""
-                    SELECT DISTINCT timestamp, tile_path 
-                    FROM radar_tiles 
-                    WHERE data_type = ? 
-                    AND timestamp > datetime('now', '-{} hours')
-                    ORDER BY timestamp DESC
-                """.format(hours), (data_type,))
-                
-                return [dict(row) for row in cursor.fetchall()]
-                
+            return self._run(operations.get_historical_radar_frames(hours, data_type))
+        
         except Exception as e:
             logger.error(f"Error querying historical radar frames: {e}")
             return []
     
+    def get_radar_frame_state(self, tile_path: str, data_type: str = 'radar') -> Optional[dict]:
+        """Get collection state of a radar frame (expected and stored tile sets)"""
+        try:
+            return self._run(operations.get_radar_frame_state(tile_path, data_type))
+        
+        except Exception as e:
+            logger.error(f"Error getting radar frame state: {e}")
+            return None
+    
+    def write_radar_frame_state(self, tile_path: str, data_type: str, timestamp: datetime,
+                                expected_tiles: List[Tuple[int, int, int]],
+                                stored_tiles: List[Tuple[int, int, int]]) -> bool:
+        """Write collection state of a radar frame"""
+        try:
+            stored_count, expected_count = self._run(operations.write_radar_frame_state(
+                tile_path, data_type, timestamp, expected_tiles, stored_tiles
+            ))
+            logger.debug(f"Frame {tile_path} ({data_type}): {stored_count}/{expected_count} tiles stored")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar frame state: {e}")
+            return False
+    
+    def get_radar_frame_states(self, data_type: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """Get completeness summary of the most recent radar frames"""
+        try:
+            return self._run(operations.get_radar_frame_states(data_type, limit))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar frame states: {e}")
+            return []
+    
+    def write_radar_station_samples(self, samples: List[dict]) -> bool:
+        """Write radar samples taken at station locations in one transaction"""
+        try:
+            self._run(operations.write_radar_station_samples(samples))
+            logger.debug(f"Successfully wrote {len(samples)} radar station samples")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar station samples to SQLite: {e}")
+            return False
+    
+    def get_radar_station_samples(self, station_id: Optional[str] = None, hours: int = 24) -> List[dict]:
+        """Get radar samples at stations from the last N hours"""
+        try:
+            return self._run(operations.get_radar_station_samples(station_id, hours))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar station samples: {e}")
+            return []
+    
+    def write_radar_accumulations(self, samples: List[dict]) -> bool:
+        """Write rolling radar accumulation values at stations in one batch"""
+        try:
+            self._run(operations.write_radar_accumulations(samples))
+            logger.debug(f"Successfully wrote {len(samples)} radar accumulation values")
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error writing radar accumulations to SQLite: {e}")
+            return False
+    
+    def get_radar_accumulations(self, station_id: Optional[str] = None, hours: Optional[int] = None) -> List[dict]:
+        """Get radar accumulations at stations, the latest set or the history of the last N hours"""
+        try:
+            return self._run(operations.get_radar_accumulations(station_id, hours))
+        
+        except Exception as e:
+            logger.error(f"Error querying radar accumulations: {e}")
+            return []
+    
     def cleanup_old_radar_data(self, hours_to_keep: int = 24):
         """Remove old radar data to save space"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("""
-                    DELETE FROM radar_tiles 
-                    WHERE created_at < datetime('now', '-{} hours')
-                """.format(hours_to_keep))
-                
-                deleted_tiles = cursor.rowcount
-                
-                cursor = conn.execute("""
-                    DELETE FROM radar_animations 
-                    WHERE created_at < datetime('now', '-{} hours')
-                """.format(hours_to_keep))
-                
-                deleted_animations = cursor.rowcount
-                conn.commit()
-                
-                logger.info(f"Cleaned up {deleted_tiles} old radar tiles and {deleted_animations} animations")
-                
+            deleted_tiles, deleted_animations = self._run(operations.cleanup_old_radar_data(hours_to_keep))
+            logger.info(f"Cleaned up {deleted_tiles} old radar tiles and {deleted_animations} animations")
+        
         except Exception as e:
             logger.error(f"Error cleaning up radar data: {e}")
-
+    
     def close(self):
         """Close database connection - no-op for SQLite"""
         pass
\ No newline at end of file
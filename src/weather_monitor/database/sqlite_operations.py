@@ -0,0 +1,511 @@
+"""
+SQL of the database managers, shared by SQLiteManager and AsyncSQLiteManager
+
+Each operation is a generator that yields the Statements it needs and receives
+their Results, and returns the value of the manager method. It does no I/O
+itself, so the synchronous manager drives it with run() on a sqlite3
+connection and the async manager with run_async() on an aiosqlite one, and
+the statements and table_stats bookkeeping cannot diverge between the two.
+An operation's statements run on one connection; write operations are
+committed by the manager as one transaction.
+"""
+
+import json
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Generator, List, Optional, Tuple
+
+from ..models.weather import WeatherObservation, WeatherStation
+from .observation_blocks import epoch_to_text
+from .table_stats import (
+    READ_TABLE_STATS, count_deleted, count_inserted, refresh_table_stats_statements, table_stats_from_rows
+)
+
+OBSERVATION_COLUMNS = (
+    "timestamp, station_id, neighborhood, city, latitude, longitude, "
+    "temperature, humidity, dewpoint, heat_index, wind_speed, wind_gust, "
+    "wind_direction, pressure, uv_index, solar_radiation, "
+    "precipitation_rate, precipitation_total"
+)
+
+
+@dataclass
+class Statement:
+    """One statement of an operation; many runs it once per parameter set in params"""
+    sql: str
+    params: Any = ()
+    many: bool = False
+
+
+@dataclass
+class Result:
+    """Rows and row count of an executed Statement"""
+    rows: list = field(default_factory=list)
+    rowcount: int = -1
+
+
+Operation = Generator[Statement, Result, Any]
+
+
+def run(conn, operation: Operation):
+    """Drive an operation on a sqlite3 connection"""
+    try:
+        statement = next(operation)
+        while True:
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            if statement.many:
+                cursor.executemany(statement.sql, statement.params)
+                result = Result(rowcount=cursor.rowcount)
+            else:
+                cursor.execute(statement.sql, statement.params)
+                result = Result(cursor.fetchall(), cursor.rowcount)
+            cursor.close()
+            statement = operation.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_async(conn, operation: Operation):
+    """Drive an operation on an aiosqlite connection"""
+    try:
+        statement = next(operation)
+        while True:
+            if statement.many:
+                cursor = await conn.executemany(statement.sql, statement.params)
+                result = Result(rowcount=cursor.rowcount)
+            else:
+                cursor = await conn.execute(statement.sql, statement.params)
+                result = Result(await cursor.fetchall(), cursor.rowcount)
+            await cursor.close()
+            statement = operation.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _observation_row(observation: WeatherObservation) -> tuple:
+    """Column values of an observation in OBSERVATION_COLUMNS order"""
+    return (
+        observation.timestamp,
+        observation.station_id,
+        observation.neighborhood,
+        observation.city,
+        observation.latitude,
+        observation.longitude,
+        observation.temperature,
+        observation.humidity,
+        observation.dewpoint,
+        observation.heat_index,
+        observation.wind_speed,
+        observation.wind_gust,
+        observation.wind_direction,
+        observation.pressure,
+        observation.uv_index,
+        observation.solar_radiation,
+        observation.precipitation_rate,
+        observation.precipitation_total
+    )
+
+
+def write_observations(observations: List[WeatherObservation]) -> Operation:
+    """Insert observations and add them to the table_stats counters"""
+    yield Statement(f"""
+        INSERT INTO weather_observations ({OBSERVATION_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [_observation_row(observation) for observation in observations], many=True)
+    timestamps = [observation.timestamp for observation in observations]
+    yield Statement(*count_inserted('weather_observations', len(observations), min(timestamps), max(timestamps)))
+    return len(observations)
+
+
+def write_station_metadata(station: WeatherStation) -> Operation:
+    yield Statement("""
+        INSERT OR REPLACE INTO weather_stations
+        (station_id, name, city, latitude, longitude, active, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (station.station_id, station.name, station.city, station.latitude, station.longitude, station.active))
+
+
+def latest_observation_rows(station_id: Optional[str], limit: int) -> Operation:
+    """Newest rows of weather_observations as dicts; compacted readings are read by the block store"""
+    if station_id:
+        result = yield Statement("""
+            SELECT * FROM weather_observations
+            WHERE station_id = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (station_id, limit))
+    else:
+        result = yield Statement("""
+            SELECT * FROM weather_observations
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (limit,))
+    return [dict(row) for row in result.rows]
+
+
+def delete_observation_blocks(condition: str, params: tuple = ()) -> Operation:
+    """Delete matching observation blocks and take them, with their readings, off the counters"""
+    result = yield Statement(f"""
+        SELECT COUNT(*), COALESCE(SUM(row_count), 0) FROM observation_blocks WHERE {condition}
+    """, params)
+    blocks, readings = result.rows[0]
+    if blocks:
+        yield Statement(f"DELETE FROM observation_blocks WHERE {condition}", params)
+        yield Statement(*count_deleted('observation_blocks', blocks, total=readings))
+    return blocks
+
+
+def cleanup_old_data(days_to_keep: int) -> Operation:
+    """Delete observations, blocks and station radar samples older than days_to_keep
+    
+    Returns the deleted observation rows and blocks.
+    """
+    result = yield Statement("""
+        DELETE FROM weather_observations
+        WHERE timestamp < datetime('now', '-{} days')
+    """.format(days_to_keep))
+    deleted_rows = result.rowcount
+    yield Statement(*count_deleted('weather_observations', deleted_rows))
+    deleted_blocks = yield from delete_observation_blocks(
+        "block_end <= ?", (int(time.time()) - days_to_keep * 86400,)
+    )
+    
+    # Radar samples at stations follow the observation retention
+    yield Statement("""
+        DELETE FROM radar_at_station
+        WHERE timestamp < datetime('now', '-{} days')
+    """.format(days_to_keep))
+    yield Statement("""
+        DELETE FROM radar_accumulation_at_station
+        WHERE timestamp < datetime('now', '-{} days')
+    """.format(days_to_keep))
+    return deleted_rows, deleted_blocks
+
+
+def delete_station_data(station_id: str) -> Operation:
+    """Delete a station's observations, blocks and metadata; returns the deleted observations and metadata rows"""
+    result = yield Statement("""
+        DELETE FROM weather_observations
+        WHERE station_id = ?
+    """, (station_id,))
+    deleted_observations = result.rowcount
+    yield Statement(*count_deleted('weather_observations', deleted_observations))
+    deleted_observations += yield from delete_observation_blocks("station_id = ?", (station_id,))
+    
+    result = yield Statement("""
+        DELETE FROM weather_stations
+        WHERE station_id = ?
+    """, (station_id,))
+    return deleted_observations, result.rowcount
+
+
+def get_table_stats() -> Operation:
+    result = yield Statement(READ_TABLE_STATS)
+    return table_stats_from_rows(result.rows)
+
+
+def refresh_table_stats() -> Operation:
+    """Recount the tracked tables; the first statement takes the write lock before any count"""
+    for sql in refresh_table_stats_statements():
+        yield Statement(sql)
+
+
+def get_database_stats() -> Operation:
+    # Row counts and date range come from the counters instead of table scans
+    stats = yield from get_table_stats()
+    rows = stats.get('weather_observations', {}).get('', {'rows': 0, 'min': None, 'max': None})
+    blocks = stats.get('observation_blocks', {}).get('', {'rows': 0, 'total': 0, 'min': None, 'max': None})
+    result = yield Statement("SELECT COUNT(*) FROM weather_stations")
+    stations_count = result.rows[0][0]
+    result = yield Statement("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
+    db_size = result.rows[0][0]
+    
+    blocks_earliest = epoch_to_text(blocks['min']) if blocks['min'] is not None else None
+    blocks_latest = epoch_to_text(blocks['max']) if blocks['max'] is not None else None
+    earliest = min(filter(None, [rows['min'], blocks_earliest]), default=None)
+    
+    return {
+        "observations_count": rows['rows'] + blocks['total'],
+        "stations_count": stations_count,
+        "database_size_bytes": db_size,
+        "database_size_mb": round(db_size / 1024 / 1024, 2),
+        "earliest_observation": earliest,
+        "latest_observation": rows['max'] or blocks_latest,
+        "observation_blocks": {
+            "blocks": blocks['rows'],
+            "readings": blocks['total'],
+            "earliest": blocks_earliest,
+            "latest": blocks_latest
+        }
+    }
+
+
+def write_radar_tile(timestamp: datetime, data_type: str, tile_path: str, zoom: int, x: int, y: int,
+                     tile_data: bytes, color_scheme: int, snow: bool, smooth: bool) -> Operation:
+    yield Statement("""
+        INSERT INTO radar_tiles
+        (timestamp, data_type, tile_path, zoom, x, y, color_scheme, snow, smooth, tile_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (timestamp, data_type, tile_path, zoom, x, y, color_scheme, snow, smooth, tile_data))
+    yield Statement(*count_inserted('radar_tiles', 1, timestamp, timestamp, partition=data_type))
+
+
+def replace_radar_tiles(timestamp: datetime, data_type: str, tile_path: str, zoom: int,
+                        tiles: Dict[Tuple[int, int], bytes]) -> Operation:
+    result = yield Statement("""
+        SELECT data_type, COUNT(*) FROM radar_tiles
+        WHERE tile_path = ? AND zoom = ?
+        GROUP BY data_type
+    """, (tile_path, zoom))
+    yield Statement("""
+        DELETE FROM radar_tiles
+        WHERE tile_path = ? AND zoom = ?
+    """, (tile_path, zoom))
+    for replaced_type, count in result.rows:
+        yield Statement(*count_deleted('radar_tiles', count, partition=replaced_type))
+    if tiles:
+        yield Statement("""
+            INSERT INTO radar_tiles
+            (timestamp, data_type, tile_path, zoom, x, y, tile_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (timestamp, data_type, tile_path, zoom, x, y, tile_data)
+            for (x, y), tile_data in tiles.items()
+        ], many=True)
+        yield Statement(*count_inserted('radar_tiles', len(tiles), timestamp, timestamp, partition=data_type))
+
+
+def get_radar_tile(tile_path: str, zoom: int, x: int, y: int, max_age_hours: int, color_scheme: int) -> Operation:
+    result = yield Statement("""
+        SELECT tile_data FROM radar_tiles
+        WHERE tile_path = ? AND zoom = ? AND x = ? AND y = ?
+        AND created_at > datetime('now', '-{} hours')
+        AND color_scheme = ?
+        ORDER BY created_at DESC
+        LIMIT 1
+    """.format(max_age_hours), (tile_path, zoom, x, y, color_scheme))
+    return result.rows[0][0] if result.rows else None
+
+
+def get_radar_tiles(tile_path: str, zoom: int, tiles: List[Tuple[int, int]],
+                    max_age_hours: int, color_scheme: int) -> Operation:
+    result = yield Statement("""
+        WITH wanted(x, y) AS (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+            FROM json_each(?)
+        )
+        SELECT t.x, t.y, t.tile_data FROM radar_tiles t
+        JOIN wanted w ON t.x = w.x AND t.y = w.y
+        WHERE t.tile_path = ? AND t.zoom = ? AND t.color_scheme = ?
+        AND t.created_at > datetime('now', '-{} hours')
+        ORDER BY t.created_at
+    """.format(max_age_hours), (json.dumps([list(tile) for tile in tiles]), tile_path, zoom, color_scheme))
+    
+    # Later rows win, so each tile maps to its most recent copy
+    return {(x, y): tile_data for x, y, tile_data in result.rows}
+
+
+def get_missing_radar_tiles(tile_path: str, tiles: List[Tuple[int, int, int]],
+                            max_age_hours: int, color_scheme: int) -> Operation:
+    # The wanted tile set is passed as a single JSON parameter so the
+    # query size does not depend on SQLite's bound-variable limit
+    result = yield Statement("""
+        WITH wanted(zoom, x, y) AS (
+            SELECT json_extract(value, '$[0]'),
+                   json_extract(value, '$[1]'),
+                   json_extract(value, '$[2]')
+            FROM json_each(?)
+        )
+        SELECT w.zoom, w.x, w.y FROM wanted w
+        WHERE NOT EXISTS (
+            SELECT 1 FROM radar_tiles t
+            WHERE t.tile_path = ? AND t.zoom = w.zoom AND t.x = w.x AND t.y = w.y
+            AND t.created_at > datetime('now', '-{} hours') AND t.color_scheme = ?
+        )
+    """.format(max_age_hours), (json.dumps([list(tile) for tile in tiles]), tile_path, color_scheme))
+    return [tuple(row) for row in result.rows]
+
+
+def write_radar_animation(timestamp: datetime, version: str, generated: datetime, host: str,
+                          frame_count: int) -> Operation:
+    # Set here rather than by the column default, so the counters get the same value
+    created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    yield Statement("""
+        INSERT INTO radar_animations
+        (timestamp, version, generated, host, frame_count, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (timestamp, version, generated, host, frame_count, created_at))
+    yield Statement(*count_inserted('radar_animations', 1, created_at, created_at))
+
+
+def get_historical_radar_frames(hours: int, data_type: str) -> Operation:
+    result = yield Statement("""
+        SELECT DISTINCT timestamp, tile_path
+        FROM radar_tiles
+        WHERE data_type = ?
+        AND tile_path NOT LIKE '/nowcast/%'
+        AND tile_path NOT LIKE '/accumulation/%'
+        AND timestamp > datetime('now', '-{} hours')
+        ORDER BY timestamp DESC
+    """.format(hours), (data_type,))
+    return [dict(row) for row in result.rows]
+
+
+def get_radar_frame_state(tile_path: str, data_type: str) -> Operation:
+    result = yield Statement("""
+        SELECT * FROM radar_frames
+        WHERE tile_path = ? AND data_type = ?
+    """, (tile_path, data_type))
+    if not result.rows:
+        return None
+    
+    state = dict(result.rows[0])
+    state['expected_tiles'] = [tuple(t) for t in json.loads(state['expected_tiles'])]
+    state['stored_tiles'] = [tuple(t) for t in json.loads(state['stored_tiles'])]
+    state['complete'] = bool(state['complete'])
+    return state
+
+
+def write_radar_frame_state(tile_path: str, data_type: str, timestamp: datetime,
+                            expected_tiles: List[Tuple[int, int, int]],
+                            stored_tiles: List[Tuple[int, int, int]]) -> Operation:
+    """Upsert a frame's tile sets; returns the stored and expected tile counts"""
+    expected = sorted(set(expected_tiles))
+    stored = sorted(set(stored_tiles))
+    stored_count = len(set(expected) & set(stored))
+    yield Statement("""
+        INSERT INTO radar_frames
+        (tile_path, data_type, timestamp, expected_tiles, stored_tiles,
+         expected_count, stored_count, complete)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(tile_path, data_type) DO UPDATE SET
+            timestamp = excluded.timestamp,
+            expected_tiles = excluded.expected_tiles,
+            stored_tiles = excluded.stored_tiles,
+            expected_count = excluded.expected_count,
+            stored_count = excluded.stored_count,
+            complete = excluded.complete,
+            updated_at = CURRENT_TIMESTAMP
+    """, (
+        tile_path,
+        data_type,
+        timestamp,
+        json.dumps(expected),
+        json.dumps(stored),
+        len(expected),
+        stored_count,
+        stored_count == len(expected)
+    ))
+    return stored_count, len(expected)
+
+
+def get_radar_frame_states(data_type: Optional[str], limit: int) -> Operation:
+    if data_type:
+        result = yield Statement("""
+            SELECT tile_path, data_type, timestamp, expected_count, stored_count, complete, updated_at
+            FROM radar_frames
+            WHERE data_type = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (data_type, limit))
+    else:
+        result = yield Statement("""
+            SELECT tile_path, data_type, timestamp, expected_count, stored_count, complete, updated_at
+            FROM radar_frames
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (limit,))
+    
+    frames = [dict(row) for row in result.rows]
+    for frame in frames:
+        frame['complete'] = bool(frame['complete'])
+    return frames
+
+
+def write_radar_station_samples(samples: List[dict]) -> Operation:
+    yield Statement("""
+        INSERT OR REPLACE INTO radar_at_station
+        (timestamp, station_id, tile_path, zoom, dbz, rain_rate)
+        VALUES (:timestamp, :station_id, :tile_path, :zoom, :dbz, :rain_rate)
+    """, samples, many=True)
+
+
+def get_radar_station_samples(station_id: Optional[str], hours: int) -> Operation:
+    if station_id:
+        result = yield Statement("""
+            SELECT timestamp, station_id, tile_path, zoom, dbz, rain_rate
+            FROM radar_at_station
+            WHERE station_id = ? AND timestamp > datetime('now', '-{} hours')
+            ORDER BY timestamp
+        """.format(hours), (station_id,))
+    else:
+        result = yield Statement("""
+            SELECT timestamp, station_id, tile_path, zoom, dbz, rain_rate
+            FROM radar_at_station
+            WHERE timestamp > datetime('now', '-{} hours')
+            ORDER BY timestamp, station_id
+        """.format(hours))
+    return [dict(row) for row in result.rows]
+
+
+def write_radar_accumulations(samples: List[dict]) -> Operation:
+    yield Statement("""
+        INSERT OR REPLACE INTO radar_accumulation_at_station
+        (timestamp, station_id, window_hours, precipitation_mm, frame_count)
+        VALUES (:timestamp, :station_id, :window_hours, :precipitation_mm, :frame_count)
+    """, samples, many=True)
+
+
+def get_radar_accumulations(station_id: Optional[str], hours: Optional[int]) -> Operation:
+    """The latest set of accumulations, or the history of the last N hours"""
+    if hours:
+        where = "timestamp > datetime('now', '-{} hours')".format(int(hours))
+    else:
+        where = "timestamp = (SELECT MAX(timestamp) FROM radar_accumulation_at_station)"
+    params = ()
+    if station_id:
+        where += " AND station_id = ?"
+        params = (station_id,)
+    
+    result = yield Statement("""
+        SELECT timestamp, station_id, window_hours, precipitation_mm, frame_count
+        FROM radar_accumulation_at_station
+        WHERE {}
+        ORDER BY timestamp, station_id, window_hours
+    """.format(where), params)
+    return [dict(row) for row in result.rows]
+
+
+def cleanup_old_radar_data(hours_to_keep: int) -> Operation:
+    """Delete radar tiles, animations and frame states older than hours_to_keep
+    
+    Returns the deleted tiles and animations.
+    """
+    result = yield Statement("""
+        SELECT data_type, COUNT(*) FROM radar_tiles
+        WHERE created_at < datetime('now', '-{} hours')
+        GROUP BY data_type
+    """.format(hours_to_keep))
+    expired = result.rows
+    yield Statement("""
+        DELETE FROM radar_tiles
+        WHERE created_at < datetime('now', '-{} hours')
+    """.format(hours_to_keep))
+    for data_type, count in expired:
+        yield Statement(*count_deleted('radar_tiles', count, partition=data_type))
+    
+    result = yield Statement("""
+        DELETE FROM radar_animations
+        WHERE created_at < datetime('now', '-{} hours')
+    """.format(hours_to_keep))
+    deleted_animations = result.rowcount
+    yield Statement(*count_deleted('radar_animations', deleted_animations))
+    
+    yield Statement("""
+        DELETE FROM radar_frames
+        WHERE created_at < datetime('now', '-{} hours')
+    """.format(hours_to_keep))
+    return sum(count for _, count in expired), deleted_animations
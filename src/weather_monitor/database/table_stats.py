@@ -0,0 +1,114 @@
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Tables counted in table_stats: (min column, max column, partition column, summed column).
+# A partition column keeps one counter row per value, e.g. per radar_tiles data_type; the summed
+# column adds up a per-row quantity such as the readings packed into each observation block.
+TRACKED_TABLES = {
+    'weather_observations': ('timestamp', 'timestamp', None, None),
+    'observation_blocks': ('block_start', 'block_end', None, 'row_count'),
+    'radar_tiles': ('timestamp', 'timestamp', 'data_type', None),
+    'radar_animations': ('created_at', 'created_at', None, None),
+}
+
+def create_table_stats(conn: sqlite3.Connection):
+    """Create the counter table, counting the existing rows once when it is new"""
+    conn.commit()
+    # Under the write lock, so no write lands between the initial count and the first update
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'table_stats'"
+        ).fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_stats (
+                table_name TEXT NOT NULL,
+                partition_key TEXT NOT NULL DEFAULT '',
+                row_count INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                min_value,
+                max_value,
+                PRIMARY KEY (table_name, partition_key)
+            ) WITHOUT ROWID
+        """)
+        if not exists:
+            refresh_table_stats(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+READ_TABLE_STATS = """
+    SELECT table_name, partition_key, row_count, total, min_value, max_value FROM table_stats
+"""
+
+def refresh_table_stats_statements() -> List[str]:
+    """Statements recounting every tracked table with full scans, run in one transaction"""
+    statements = ["DELETE FROM table_stats"]
+    for table, (min_column, max_column, partition, summed) in TRACKED_TABLES.items():
+        key = partition or "''"
+        statements.append(f"""
+            INSERT INTO table_stats (table_name, partition_key, row_count, total, min_value, max_value)
+            SELECT '{table}', {key}, COUNT(*), {f"SUM({summed})" if summed else "COUNT(*)"},
+                   MIN({min_column}), MAX({max_column})
+            FROM {table}
+            GROUP BY {key}
+        """)
+    return statements
+
+def refresh_table_stats(conn: sqlite3.Connection):
+    """Recount every tracked table with full scans"""
+    for statement in refresh_table_stats_statements():
+        conn.execute(statement)
+
+def count_inserted(table: str, rows: int, first, last, partition: str = '',
+                   total: Optional[int] = None) -> Tuple[str, tuple]:
+    """Statement adding inserted rows and their time range to a table's counters
+    
+    Run it on the connection and in the transaction of the insert, so both
+    commit or roll back together.
+    """
+    return """
+        INSERT INTO table_stats (table_name, partition_key, row_count, total, min_value, max_value)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (table_name, partition_key) DO UPDATE SET
+            row_count = row_count + excluded.row_count,
+            total = total + excluded.total,
+            min_value = CASE WHEN min_value IS NULL OR excluded.min_value < min_value
+                             THEN excluded.min_value ELSE min_value END,
+            max_value = CASE WHEN max_value IS NULL OR excluded.max_value > max_value
+                             THEN excluded.max_value ELSE max_value END
+    """, (table, partition, rows, rows if total is None else total, first, last)
+
+def count_deleted(table: str, rows: int, partition: str = '', total: Optional[int] = None) -> Tuple[str, dict]:
+    """Statement removing deleted rows from a table's counters and re-reading its time range
+    
+    The bounds come from MIN/MAX over an index on the time columns, so this
+    stays cheap however many rows were deleted.
+    """
+    min_column, max_column, partition_column, _ = TRACKED_TABLES[table]
+    scope = f"WHERE {partition_column} = :partition" if partition_column else ""
+    return f"""
+        UPDATE table_stats SET
+            row_count = row_count - :rows,
+            total = total - :total,
+            min_value = (SELECT MIN({min_column}) FROM {table} {scope}),
+            max_value = (SELECT MAX({max_column}) FROM {table} {scope})
+        WHERE table_name = :table AND partition_key = :partition
+    """, {'table': table, 'partition': partition, 'rows': rows, 'total': rows if total is None else total}
+
+def read_table_stats(conn: sqlite3.Connection) -> Dict[str, Dict[str, dict]]:
+    """Counters by table and partition; a table that never had rows is missing"""
+    return table_stats_from_rows(conn.execute(READ_TABLE_STATS))
+
+def table_stats_from_rows(rows: Iterable) -> Dict[str, Dict[str, dict]]:
+    """Group rows of READ_TABLE_STATS by table and partition"""
+    stats: Dict[str, Dict[str, dict]] = {}
+    for table, key, row_count, total, min_value, max_value in rows:
+        stats.setdefault(table, {})[key] = {
+            'rows': row_count,
+            'total': total,
+            'min': min_value,
+            'max': max_value
+        }
+    return stats
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+from typing import Dict, Optional
+
+from ..metrics import format_metrics
+
+CHECKPOINT_MODES = ('PASSIVE', 'RESTART', 'TRUNCATE')
+
+class WalCheckpointManager:
+    """Background WAL checkpointing for the main SQLite database
+    
+    SQLite's automatic checkpoints are PASSIVE: they stop at the first frame a
+    reader still needs, so with a continuous writer and long-lived Grafana reads
+    the WAL keeps growing. Once the WAL file passes passive_bytes this manager
+    runs a PASSIVE checkpoint on every interval and escalates from its result:
+    RESTART when the frames readers kept it from copying pass restart_bytes or
+    readers blocked several runs in a row, and TRUNCATE when the file passes
+    journal_size_limit. RESTART and TRUNCATE wait for readers at most
+    busy_timeout_ms, so writers are never stalled for long.
+    """
+    
+    def __init__(self, db_path: str, interval: float = 30.0,
+                 passive_bytes: int = 4 * 1024 * 1024,
+                 restart_bytes: int = 16 * 1024 * 1024,
+                 journal_size_limit: int = 64 * 1024 * 1024,
+                 busy_timeout_ms: int = 2000, blocked_runs_before_restart: int = 3):
+        self.db_path = db_path
+        self.wal_path = db_path + "-wal"
+        self.interval = interval
+        self.passive_bytes = passive_bytes
+        self.restart_bytes = restart_bytes
+        self.journal_size_limit = journal_size_limit
+        self.busy_timeout_ms = busy_timeout_ms
+        self.blocked_runs_before_restart = blocked_runs_before_restart
+        
+        self.running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._blocked_runs = 0  # Consecutive checkpoints that readers kept from finishing
+        self._frame_bytes = 4096 + 24  # WAL frame: page plus header, updated from the page size
+        self.stats = {
+            'wal_size_bytes': 0,
+            'checkpoints': {mode: 0 for mode in CHECKPOINT_MODES},
+            'busy': {mode: 0 for mode in CHECKPOINT_MODES},
+            'duration_seconds_sum': {mode: 0.0 for mode in CHECKPOINT_MODES},
+            'last_duration_seconds': {mode: 0.0 for mode in CHECKPOINT_MODES},
+            'frames_checkpointed': 0,
+            'errors': 0,
+            'last_checkpoint': None
+        }
+    
+    def wal_size(self) -> int:
+        """Current size of the WAL file in bytes"""
+        try:
+            return os.path.getsize(self.wal_path)
+        except OSError:
+            return 0
+    
+    def choose_escalation(self, wal_size: int, pending_bytes: int) -> Optional[str]:
+        """Mode to follow a PASSIVE checkpoint with, given the WAL file size and the bytes it left behind"""
+        if wal_size >= self.journal_size_limit:
+            return 'TRUNCATE'
+        if pending_bytes >= self.restart_bytes or (
+                pending_bytes > 0 and self._blocked_runs >= self.blocked_runs_before_restart):
+            return 'RESTART'
+        return None
+    
+    def checkpoint(self, mode: str = 'PASSIVE') -> Optional[Dict[str, int]]:
+        """Run one checkpoint and record its outcome"""
+        mode = mode.upper()
+        if mode not in CHECKPOINT_MODES:
+            raise ValueError(f"Unsupported checkpoint mode: {mode}")
+        
+        with self._lock:
+            try:
+                with sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000) as conn:
+                    conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+                    # Applies whenever this connection resets the WAL
+                    conn.execute(f"PRAGMA journal_size_limit={self.journal_size_limit}")
+                    self._frame_bytes = conn.execute("PRAGMA page_size").fetchone()[0] + 24
+                    
+                    started = time.perf_counter()
+                    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+                    duration = time.perf_counter() - started
+                
+                # Readers still holding old snapshots keep the checkpoint from reaching the end of the WAL
+                blocked = bool(busy) or (log_frames > 0 and checkpointed < log_frames)
+                self._blocked_runs = self._blocked_runs + 1 if blocked else 0
+                
+                self.stats['checkpoints'][mode] += 1
+                self.stats['busy'][mode] += int(bool(busy))
+                self.stats['duration_seconds_sum'][mode] += duration
+                self.stats['last_duration_seconds'][mode] = duration
+                self.stats['frames_checkpointed'] += max(checkpointed, 0)
+                self.stats['last_checkpoint'] = time.time()
+                self.stats['wal_size_bytes'] = self.wal_size()
+                
+                log = logger.warning if blocked and mode != 'PASSIVE' else logger.debug
+                log(f"WAL checkpoint {mode}: {checkpointed}/{log_frames} frames in {duration * 1000:.1f} ms"
+                    f"{' (blocked by readers)' if blocked else ''}, WAL now {self.stats['wal_size_bytes']} bytes")
+                return {'busy': busy, 'log_frames': log_frames, 'checkpointed_frames': checkpointed}
+            
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Error running WAL checkpoint ({mode}): {e}")
+                return None
+    
+    def run_once(self) -> Optional[str]:
+        """Check the WAL and checkpoint if needed, returning the strongest mode used"""
+        wal_size = self.wal_size()
+        self.stats['wal_size_bytes'] = wal_size
+        if wal_size < self.passive_bytes:
+            return None
+        
+        # A completed checkpoint leaves the file size unchanged, so escalation looks at what PASSIVE left behind
+        result = self.checkpoint('PASSIVE')
+        if result is None:
+            return 'PASSIVE'
+        pending_bytes = max(result['log_frames'] - result['checkpointed_frames'], 0) * self._frame_bytes
+        
+        mode = self.choose_escalation(wal_size, pending_bytes)
+        if mode:
+            self.checkpoint(mode)
+        return mode or 'PASSIVE'
+    
+    def start(self):
+        """Start checkpointing in a daemon thread"""
+        if self.running:
+            return
+        
+        self.running = True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+        self._thread.start()
+        logger.info(f"WAL checkpoint manager started for {self.db_path} (every {self.interval:.0f}s, "
+                    f"passive {self.passive_bytes} / restart {self.restart_bytes} / "
+                    f"truncate {self.journal_size_limit} bytes)")
+    
+    def _run(self):
+        """Checkpoint loop"""
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error in WAL checkpoint loop: {e}")
+    
+    def stop(self):
+        """Stop the checkpoint thread"""
+        self.running = False
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.busy_timeout_ms / 1000 + 5)
+            self._thread = None
+    
+    def render_metrics(self) -> str:
+        """WAL size and checkpoint counters in the Prometheus text format"""
+        stats = self.stats
+        return format_metrics([
+            ('weather_sqlite_wal_size_bytes', 'gauge', 'Size of the SQLite WAL file',
+             [('weather_sqlite_wal_size_bytes', {}, self.wal_size())]),
+            ('weather_sqlite_checkpoints_total', 'counter', 'WAL checkpoints run, by mode',
+             [('weather_sqlite_checkpoints_total', {'mode': mode}, count)
+              for mode, count in stats['checkpoints'].items()]),
+            ('weather_sqlite_checkpoint_busy_total', 'counter', 'WAL checkpoints that could not complete, by mode',
+             [('weather_sqlite_checkpoint_busy_total', {'mode': mode}, count)
+              for mode, count in stats['busy'].items()]),
+            ('weather_sqlite_checkpoint_duration_seconds', 'summary', 'Time spent in WAL checkpoints, by mode',
+             [sample for mode in CHECKPOINT_MODES for sample in (
+                 ('weather_sqlite_checkpoint_duration_seconds_sum', {'mode': mode},
+                  stats['duration_seconds_sum'][mode]),
+                 ('weather_sqlite_checkpoint_duration_seconds_count', {'mode': mode}, stats['checkpoints'][mode]),
+             )]),
+            ('weather_sqlite_checkpoint_last_duration_seconds', 'gauge', 'Duration of the last WAL checkpoint, by mode',
+             [('weather_sqlite_checkpoint_last_duration_seconds', {'mode': mode}, duration)
+              for mode, duration in stats['last_duration_seconds'].items()]),
+            ('weather_sqlite_checkpoint_frames_total', 'counter', 'WAL frames copied back into the database',
+             [('weather_sqlite_checkpoint_frames_total', {}, stats['frames_checkpointed'])]),
+            ('weather_sqlite_checkpoint_errors_total', 'counter', 'WAL checkpoints that failed',
+             [('weather_sqlite_checkpoint_errors_total', {}, stats['errors'])]),
+        ])
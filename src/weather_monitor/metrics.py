@@ -0,0 +1,84 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# A metric sample: name, labels, value
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def format_metrics(families: List[Tuple[str, str, str, List[Sample]]]) -> str:
+    """Render (name, type, help, samples) metric families in the Prometheus text format"""
+    lines = []
+    for name, metric_type, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for sample_name, labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in sorted(labels.items()))
+            lines.append(f"{sample_name}{{{label_text}}} {value}" if label_text else f"{sample_name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves /metrics for Prometheus from a background thread
+    
+    Collectors are callables returning the metric text of one component; they
+    run on every scrape, so they should only read counters kept in memory.
+    """
+    
+    def __init__(self, port: int = 8000, host: str = '0.0.0.0'):
+        self.host = host
+        self.port = port
+        self.collectors: List[Callable[[], str]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    def register(self, collector: Callable[[], str]):
+        """Add a collector to the scrape output"""
+        self.collectors.append(collector)
+    
+    def render(self) -> str:
+        """Metric text of every collector"""
+        parts = []
+        for collector in self.collectors:
+            try:
+                parts.append(collector())
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        return "".join(parts)
+    
+    def start(self) -> bool:
+        """Start serving in a daemon thread"""
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass  # Scrapes every few seconds would flood the log
+        
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True).start()
+            logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+            return True
+        except Exception as e:
+            logger.error(f"Error starting metrics server on port {self.port}: {e}")
+            return False
+    
+    def stop(self):
+        """Stop serving"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -12,6 +12,24 @@ class RadarTileInfo(BaseModel):
     snow: bool = Field(False, description="Snow radar data")
     smooth: bool = Field(True, description="Smooth radar data")
     
+class RadarRegion(BaseModel):
+    """Geographic region covered by radar collection"""
+    name: str = Field(..., description="Region name")
+    min_lat: float = Field(..., description="Southern edge latitude")
+    min_lon: float = Field(..., description="Western edge longitude")
+    max_lat: float = Field(..., description="Northern edge latitude")
+    max_lon: float = Field(..., description="Eastern edge longitude")
+    margin_km: float = Field(0.0, description="Extra margin around the bounding box in km")
+    
+    @classmethod
+    def from_spec(cls, spec: str) -> 'RadarRegion':
+        """Create RadarRegion from a 'name:min_lat,min_lon,max_lat,max_lon' string"""
+        name, _, coords = spec.partition(':')
+        values = [float(value) for value in coords.split(',')]
+        if not name or len(values) != 4:
+            raise ValueError(f"Invalid region '{spec}', expected name:min_lat,min_lon,max_lat,max_lon")
+        return cls(name=name, min_lat=values[0], min_lon=values[1], max_lat=values[2], max_lon=values[3])
+    
 class RadarFrame(BaseModel):
     """Radar animation frame from RainViewer API"""
     timestamp: datetime = Field(..., description="UTC timestamp of radar data")
@@ -7,7 +7,10 @@ from pathlib import Path
 from loguru import logger
 
 from .api.weather_client import WeatherAPIClient
+from .database.columnar_archive import ColumnarArchiver
 from .database.database_factory import get_database_manager
+from .database.wal_checkpoint import WalCheckpointManager
+from .metrics import MetricsServer
 from .config import settings
 from .station_manager import StationManager
 
@@ -18,8 +21,20 @@ class WeatherMonitor:
         self.station_manager = StationManager()
         self.running = True
         self.last_cleanup = datetime.now()
+        self.last_compaction = datetime.min
         self.config_reload_requested = False
         
+        # The monitor is the continuous writer, so it keeps the shared WAL in check
+        self.checkpoint_manager = WalCheckpointManager(
+            settings.sqlite_db_path,
+            interval=settings.wal_checkpoint_interval,
+            passive_bytes=settings.wal_passive_mb * 1024 * 1024,
+            restart_bytes=settings.wal_restart_mb * 1024 * 1024,
+            journal_size_limit=settings.wal_journal_size_limit_mb * 1024 * 1024
+        )
+        self.metrics_server = MetricsServer(port=settings.metrics_port) if settings.metrics_port else None
+        self.archiver = ColumnarArchiver(settings.sqlite_db_path, settings.archive_dir) if settings.archive_dir else None
+        
         # Track config file modification time
         self.config_file_path = Path(__file__).parent.parent.parent / "config" / "weather_stations.json"
         self.last_config_mtime = self._get_config_mtime()
@@ -65,6 +80,11 @@ class WeatherMonitor:
             logger.error("Database connection failed. Exiting.")
             sys.exit(1)
         
+        self.checkpoint_manager.start()
+        if self.metrics_server:
+            self.metrics_server.register(self.checkpoint_manager.render_metrics)
+            self.metrics_server.start()
+        
         logger.info(f"Monitoring weather data every {settings.weather_fetch_interval} seconds")
         
         # Get all active stations
@@ -107,10 +127,19 @@ class WeatherMonitor:
                         logger.error(f"Error fetching data for station {station.name}: {e}")
                         continue
                 
+                # Hourly compaction of older observations into blocks
+                if settings.observation_storage == "blocks" and (datetime.now() - self.last_compaction).total_seconds() >= 3600:
+                    self.db_manager.compact_observations(settings.observation_compact_after_hours)
+                    self.last_compaction = datetime.now()
+                
                 # Daily cleanup (run once per day)
                 if (datetime.now() - self.last_cleanup).days >= 1:
                     logger.info("Running daily database cleanup...")
-                    self.db_manager.cleanup_old_data(settings.data_retention_days)
+                    # Observations leave the database only once they are in the archive
+                    if self.archiver and self.archiver.archive_older_than(settings.data_retention_days) is None:
+                        logger.warning("Archiving failed, keeping old observations until the next cleanup")
+                    else:
+                        self.db_manager.cleanup_old_data(settings.data_retention_days)
                     self.last_cleanup = datetime.now()
                 
                 # Sleep until next fetch
@@ -140,6 +169,9 @@ class WeatherMonitor:
         """Clean up resources"""
         logger.info("Cleaning up resources...")
         self.weather_client.close()
+        self.checkpoint_manager.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
         self.db_manager.close()
         logger.info("Weather monitoring service stopped")
 
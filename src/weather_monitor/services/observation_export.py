@@ -0,0 +1,84 @@
+"""
+Streaming CSV / NDJSON export of weather observations
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional
+
+from ..database.sqlite_db import OBSERVATION_EXPORT_COLUMNS
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def parse_time_bound(value: Optional[str]) -> Optional[str]:
+    """Normalize an ISO date or datetime to the text stored in weather_observations (UTC, space separated)"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.isoformat(sep=' ')
+
+
+def parse_columns(value: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated column list, validated against the exportable columns"""
+    if not value:
+        return None
+    columns = [column.strip() for column in value.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in OBSERVATION_EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)} (available: {', '.join(OBSERVATION_EXPORT_COLUMNS)})")
+    return columns
+
+
+def _csv_chunks(chunks: Iterable[List[tuple]], columns: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(chunks: Iterable[List[tuple]], columns: List[str]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(columns, row)), separators=(',', ':')) + "\n" for row in rows).encode()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into gzip format on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_observations(db_manager, fmt: str = 'csv', compress: bool = False,
+                        station_id: Optional[str] = None, start: Optional[str] = None,
+                        end: Optional[str] = None, columns: Optional[List[str]] = None,
+                        chunk_size: int = 5000) -> Iterator[bytes]:
+    """Encoded export of the matching observations, produced chunk by chunk with constant memory"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (use {' or '.join(EXPORT_FORMATS)})")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    
+    columns = columns or OBSERVATION_EXPORT_COLUMNS
+    chunks = db_manager.iter_observations(
+        station_id=station_id, start=start, end=end, columns=columns, chunk_size=chunk_size
+    )
+    encoded = _csv_chunks(chunks, columns) if fmt == 'csv' else _ndjson_chunks(chunks, columns)
+    return gzip_stream(encoded) if compress else encoded
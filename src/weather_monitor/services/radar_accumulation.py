@@ -0,0 +1,200 @@
+"""
+Rolling radar precipitation accumulation, updated incrementally per frame
+"""
+
+import zlib
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .radar_intensity import dbz_to_rain_rate
+from .radar_sampler import FrameArrayCache, StationRadarSampler
+from .tile_image import TILE_SIZE, encode_tile
+
+ACCUMULATION_PATH_PREFIX = '/accumulation'
+
+# Lower bound in mm of each color step
+ACCUMULATION_PALETTE = [
+    (0.2, (190, 240, 190)),
+    (0.5, (120, 210, 120)),
+    (1.0, (40, 160, 60)),
+    (2.5, (30, 120, 210)),
+    (5.0, (10, 60, 230)),
+    (10.0, (140, 60, 220)),
+    (20.0, (220, 40, 180)),
+    (35.0, (240, 30, 30)),
+    (50.0, (250, 140, 0)),
+    (75.0, (255, 230, 0)),
+    (100.0, (255, 255, 255)),
+]
+
+
+def accumulation_path(window_hours: int) -> str:
+    """Tile path under which an accumulation raster is stored and served"""
+    return f"{ACCUMULATION_PATH_PREFIX}/{window_hours}h"
+
+
+def colorize_accumulation(depth: np.ndarray, palette=ACCUMULATION_PALETTE) -> np.ndarray:
+    """Map accumulated precipitation in mm to an RGBA tile (transparent below the first step)"""
+    thresholds = np.array([mm for mm, _ in palette], dtype=np.float64)
+    colors = np.array([(0, 0, 0, 0)] + [color + (255,) for _, color in palette], dtype=np.uint8)
+    return colors[np.searchsorted(thresholds, depth, side='right')]
+
+
+class RadarAccumulator:
+    """Keeps rolling precipitation sums over several windows from the stored radar frames
+    
+    Each new frame is added to every window and the frames that fell out of a
+    window are subtracted again, so an update decodes O(1) frames instead of the
+    whole window. The rain rate of every frame in the longest window is kept
+    zlib-compressed in memory (dry pixels compress to almost nothing), so an
+    expired frame is subtracted without reading its tiles, which may already
+    have been cleaned up.
+    """
+    
+    def __init__(self, db_manager, frame_cache: FrameArrayCache,
+                 station_sampler: Optional[StationRadarSampler] = None, zoom: int = 7,
+                 window_hours: Sequence[int] = (1, 3, 24), frame_minutes: float = 10.0,
+                 max_frame_minutes: float = 20.0):
+        self.db_manager = db_manager
+        self.frame_cache = frame_cache
+        self.station_sampler = station_sampler
+        self.zoom = zoom
+        self.window_hours = sorted(window_hours)
+        self.frame_minutes = frame_minutes  # Duration credited to the first frame
+        self.max_frame_minutes = max_frame_minutes  # Gaps in the data are not filled beyond this
+        
+        self.tiles: List[Tuple[int, int]] = []
+        self._latest: Optional[datetime] = None
+        self._sums: Dict[int, Dict[Tuple[int, int], np.ndarray]] = {}
+        self._members: Dict[int, Deque[dict]] = {}
+        self.reset([])
+    
+    def reset(self, tiles: List[Tuple[int, int]]):
+        """Drop all state and start over for a tile set"""
+        self.tiles = sorted(tiles)
+        self._latest = None
+        self._sums = {hours: self._zeros() for hours in self.window_hours}
+        self._members = {hours: deque() for hours in self.window_hours}
+    
+    def window_frames(self) -> Dict[int, int]:
+        """Number of frames currently summed in each window"""
+        return {hours: len(members) for hours, members in self._members.items()}
+    
+    def update(self, tiles: List[Tuple[int, int]]) -> bool:
+        """Add the complete radar frames newer than the last one added and publish the result"""
+        if sorted(tiles) != self.tiles:
+            self.reset(tiles)
+        if not self.tiles:
+            return False
+        
+        # 5-minute frames over the longest window, plus a margin
+        limit = max(self.window_hours) * 12 + 12
+        states = self.db_manager.get_radar_frame_states(data_type='radar', limit=limit)
+        frames = sorted(
+            (
+                (datetime.fromisoformat(str(state['timestamp'])), state['tile_path'])
+                for state in states if state['complete']
+            ),
+            key=lambda frame: frame[0]
+        )
+        if not frames:
+            return False
+        
+        cutoff = frames[-1][0] - timedelta(hours=max(self.window_hours))
+        new_frames = [
+            frame for frame in frames
+            if frame[0] > cutoff and (self._latest is None or frame[0] > self._latest)
+        ]
+        if not new_frames:
+            return False
+        
+        for timestamp, tile_path in new_frames:
+            self._add_frame(tile_path, timestamp)
+        
+        self._publish()
+        logger.info(f"Radar accumulation updated with {len(new_frames)} frame(s) up to {self._latest} "
+                    f"({', '.join(f'{hours}h: {count}' for hours, count in self.window_frames().items())} frames)")
+        return True
+    
+    def _zeros(self) -> Dict[Tuple[int, int], np.ndarray]:
+        """Empty sums for the current tile set"""
+        return {tile: np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.float64) for tile in self.tiles}
+    
+    def _frame_rates(self, tile_path: str) -> Dict[Tuple[int, int], np.ndarray]:
+        """Rain rate in mm/h of one frame, per tile"""
+        arrays = self.frame_cache.get_tiles(tile_path, self.zoom, self.tiles)
+        return {tile: dbz_to_rain_rate(dbz) for tile, dbz in arrays.items()}
+    
+    def _add_frame(self, tile_path: str, timestamp: datetime):
+        """Add one frame to every window and subtract the frames that expired"""
+        if self._latest is None:
+            minutes = self.frame_minutes
+        else:
+            minutes = min((timestamp - self._latest).total_seconds() / 60, self.max_frame_minutes)
+        hours = minutes / 60
+        self._latest = timestamp
+        
+        rates = self._frame_rates(tile_path)
+        entry = {
+            'tile_path': tile_path,
+            'timestamp': timestamp,
+            'hours': hours,
+            'rates': {tile: zlib.compress(values.tobytes(), 1) for tile, values in rates.items()}
+        }
+        
+        for window in self.window_hours:
+            sums = self._sums[window]
+            members = self._members[window]
+            for tile, values in rates.items():
+                sums[tile] += values.astype(np.float64) * hours
+            members.append(entry)
+            
+            cutoff = timestamp - timedelta(hours=window)
+            while members and members[0]['timestamp'] <= cutoff:
+                for tile, values in self._expand(members.popleft()).items():
+                    sums[tile] -= values
+    
+    @staticmethod
+    def _expand(entry: dict) -> Dict[Tuple[int, int], np.ndarray]:
+        """Depth in mm a window member contributed, per tile"""
+        return {
+            tile: np.frombuffer(zlib.decompress(blob), dtype=np.float32)
+                  .reshape(TILE_SIZE, TILE_SIZE).astype(np.float64) * entry['hours']
+            for tile, blob in entry['rates'].items()
+        }
+    
+    def _publish(self):
+        """Store the accumulation rasters as tiles and the values at stations"""
+        samples = []
+        for window in self.window_hours:
+            # Subtraction leaves tiny negative rounding residue
+            sums = {tile: np.maximum(values, 0.0) for tile, values in self._sums[window].items()}
+            
+            self.db_manager.replace_radar_tiles(
+                timestamp=self._latest,
+                data_type='accumulation',
+                tile_path=accumulation_path(window),
+                zoom=self.zoom,
+                tiles={tile: encode_tile(colorize_accumulation(values)) for tile, values in sums.items()}
+            )
+            
+            if self.station_sampler and self.station_sampler.station_ids:
+                values, has_tile = self.station_sampler.gather(sums)
+                samples.extend(
+                    {
+                        'timestamp': self._latest,
+                        'station_id': station_id,
+                        'window_hours': window,
+                        'precipitation_mm': round(float(values[i]), 2),
+                        'frame_count': len(self._members[window])
+                    }
+                    for i, station_id in enumerate(self.station_sampler.station_ids)
+                    if has_tile[i]
+                )
+        
+        if samples:
+            self.db_manager.write_radar_accumulations(samples)
@@ -1,38 +1,176 @@
+import json
+import math
 import time
 import asyncio
 from datetime import datetime, timezone
-from typing import List, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+import requests
 from loguru import logger
 
 from ..api.radar_client import RainViewerClient
-from ..models.radar import RadarTileInfo, RadarAnimation
+from ..models.radar import RadarTileInfo, RadarAnimation, RadarRegion
 from ..database.database_factory import get_database_manager
 from ..config import settings
+from ..station_manager import StationManager
+from .tile_pyramid import TilePyramidBuilder, child_tiles, parent_tiles
+from .radar_sampler import FrameArrayCache, StationRadarSampler
+from .radar_nowcast import RadarNowcaster
+from .radar_accumulation import RadarAccumulator
+from .radar_intensity import DBZ_COLOR_SCHEME
+
+DEFAULT_CENTER = (45.575, -73.88)  # Greater Montreal
+KM_PER_DEGREE = 111.32
 
 class RadarDataCollector:
     """Service for collecting and storing radar data"""
     
-    def __init__(self, center_lat: float = 45.575, center_lon: float = -73.88):
+    def __init__(self, center_lat: Optional[float] = None, center_lon: Optional[float] = None,
+                 station_manager: Optional[StationManager] = None,
+                 regions: Optional[List[RadarRegion]] = None):
         self.radar_client = RainViewerClient()
         self.db_manager = get_database_manager()
         self.center_lat = center_lat
         self.center_lon = center_lon
         self.collection_interval = 600  # 10 minutes
+        self.poll_interval = settings.radar_poll_interval  # Weather-maps index checks between collections
+        self._seen_frame_paths: Set[str] = set()
         self.running = False
         
-        # Montreal area coverage
-        self.zoom_levels = [6, 7]  # Different zoom levels for different detail
-        self.tile_radius = 3  # Tiles around center point
+        self.zoom_levels = [7]  # Zoom levels fetched from RainViewer
+        self.analysis_zoom = max(self.zoom_levels)  # Level sampled, nowcast and accumulated, fetched as dBZ too
+        self.derived_zoom_levels = [6]  # Zoom levels built locally by downsampling the level below
+        self.tile_radius = 3  # Tiles around center point, used when an explicit center is given
+        self.coverage_margin_km = 10.0  # Margin around the station bounding box
+        
+        # Coverage follows the station network unless explicit regions or a center are given
+        self.regions = regions or []
+        self.station_manager = station_manager or StationManager()
+        self.region_bboxes: Dict[str, Tuple[float, float, float, float]] = {}
+        self.region_tiles: Dict[str, Dict[int, List[Tuple[int, int]]]] = {}
+        self.coverage_tiles: Dict[int, List[Tuple[int, int]]] = {}
+        self.station_manager.add_reload_listener(self._refresh_coverage)
+        self._refresh_coverage()
+        
+        self.pyramid_builder = TilePyramidBuilder(self.db_manager)
+        # Shared by the station sampler and the accumulator, which reads up to 24h of frames once on startup
+        self.frame_cache = FrameArrayCache(self.db_manager, max_frames=24, max_age_hours=25)
+        self.station_sampler = StationRadarSampler(
+            self.db_manager, self.station_manager, zoom=self.analysis_zoom, frame_cache=self.frame_cache
+        )
+        self.nowcaster = RadarNowcaster(self.db_manager, zoom=self.analysis_zoom)
+        self.accumulator = RadarAccumulator(
+            self.db_manager, self.frame_cache, self.station_sampler, zoom=self.analysis_zoom
+        )
+    
+    @staticmethod
+    def load_regions(path: Path) -> List[RadarRegion]:
+        """Load radar regions from a JSON configuration file"""
+        with open(path, 'r') as f:
+            config = json.load(f)
+        return [RadarRegion(**region) for region in config.get("regions", [])]
+    
+    def _expand_bbox(self, bbox: Tuple[float, float, float, float],
+                     margin_km: float) -> Tuple[float, float, float, float]:
+        """Grow a (min_lat, min_lon, max_lat, max_lon) box by a margin in km"""
+        min_lat, min_lon, max_lat, max_lon = bbox
+        lat_margin = margin_km / KM_PER_DEGREE
+        lon_margin = margin_km / (KM_PER_DEGREE * math.cos(math.radians((min_lat + max_lat) / 2)))
+        return (min_lat - lat_margin, min_lon - lon_margin,
+                max_lat + lat_margin, max_lon + lon_margin)
+    
+    def _center_tiles(self, center_lat: float, center_lon: float) -> Dict[int, List[Tuple[int, int]]]:
+        """Tiles within tile_radius of a center point, per fetched zoom level"""
+        return {
+            zoom: self.radar_client.get_coverage_tiles(center_lat, center_lon, zoom, self.tile_radius)
+            for zoom in self.zoom_levels
+        }
+    
+    def _refresh_coverage(self):
+        """Recompute the tile set to collect for each region and zoom level"""
+        self.region_bboxes = {}
+        self.region_tiles = {}
+        
+        if self.regions:
+            for region in self.regions:
+                self.region_bboxes[region.name] = self._expand_bbox(
+                    (region.min_lat, region.min_lon, region.max_lat, region.max_lon), region.margin_km
+                )
+        elif self.center_lat is not None and self.center_lon is not None:
+            self.region_tiles['center'] = self._center_tiles(self.center_lat, self.center_lon)
+        else:
+            bbox = self.station_manager.get_bounding_box()
+            if bbox:
+                self.region_bboxes['stations'] = self._expand_bbox(bbox, self.coverage_margin_km)
+            else:
+                # Only this refresh falls back; the next station reload is picked up as usual
+                logger.warning("No active stations configured, falling back to default coverage center")
+                self.region_tiles['center'] = self._center_tiles(*DEFAULT_CENTER)
+        
+        for name, bbox in self.region_bboxes.items():
+            self.region_tiles[name] = {
+                zoom: self.radar_client.get_bbox_tiles(*bbox, zoom=zoom)
+                for zoom in self.zoom_levels
+            }
+        
+        # Overlapping regions share tiles, so each tile is fetched once per frame
+        self.coverage_tiles = {
+            zoom: sorted({tile for tiles in self.region_tiles.values() for tile in tiles.get(zoom, [])})
+            for zoom in self.zoom_levels
+        }
+        
+        for name, tiles in self.region_tiles.items():
+            tile_counts = ", ".join(f"z{zoom}: {len(zoom_tiles)}" for zoom, zoom_tiles in tiles.items())
+            logger.info(f"Radar coverage region '{name}' {self.region_bboxes.get(name, '')} ({tile_counts} tiles)")
+        
+        total_region_tiles = sum(len(zoom_tiles) for tiles in self.region_tiles.values() for zoom_tiles in tiles.values())
+        total_tiles = sum(len(tiles) for tiles in self.coverage_tiles.values())
+        logger.info(f"Radar coverage: {total_tiles} unique tiles across {len(self.region_tiles)} regions "
+                    f"({total_region_tiles - total_tiles} shared)")
+    
+    def _get_region_stats(self) -> Dict[str, dict]:
+        """Get per-region tile counts and completeness of the latest radar frame"""
+        latest = self.db_manager.get_radar_frame_states(data_type='radar', limit=1)
+        state = self.db_manager.get_radar_frame_state(latest[0]['tile_path'], 'radar') if latest else None
+        stored_tiles = set(state['stored_tiles']) if state else set()
         
+        region_stats = {}
+        for name, tiles in self.region_tiles.items():
+            region_set = {(zoom, x, y) for zoom, zoom_tiles in tiles.items() for x, y in zoom_tiles}
+            other_set = {
+                (zoom, x, y)
+                for other, other_tiles in self.region_tiles.items() if other != name
+                for zoom, zoom_tiles in other_tiles.items() for x, y in zoom_tiles
+            }
+            region_stats[name] = {
+                'bbox': self.region_bboxes.get(name),
+                'tiles': len(region_set),
+                'shared_tiles': len(region_set & other_set),
+                'latest_frame': state['tile_path'] if state else None,
+                'latest_frame_stored': len(region_set & stored_tiles),
+                'latest_frame_complete': bool(state) and region_set <= stored_tiles
+            }
+        return region_stats
+    
     def start_collection(self):
         """Start radar data collection in background"""
         self.running = True
         logger.info("Starting radar data collection service...")
         
+        next_collection = 0.0
         while self.running:
             try:
-                self._collect_radar_data()
-                time.sleep(self.collection_interval)
+                # Coverage is recomputed through the reload listener
+                self.station_manager.reload_if_changed()
+                
+                if time.monotonic() >= next_collection:
+                    self._collect_radar_data()
+                    next_collection = time.monotonic() + self.collection_interval
+                else:
+                    # Cheap index check so a new frame is cached within one poll interval
+                    self._poll_new_frames()
+                
+                time.sleep(min(self.poll_interval, self.collection_interval))
             except Exception as e:
                 logger.error(f"Error in radar collection loop: {e}")
                 time.sleep(60)  # Wait 1 minute on error before retrying
@@ -65,8 +203,8 @@ class RadarDataCollector:
             # Collect tiles for the most recent radar frames (last 3 frames)
             recent_frames = animation.radar[-3:] if len(animation.radar) >= 3 else animation.radar
             
-            for frame in recent_frames:
-                self._collect_frame_tiles(frame, animation.host, 'radar')
+            self._prefetch_frames(recent_frames, animation.host)
+            self._seen_frame_paths = {frame.path for frame in animation.radar}
             
             # Also collect satellite data if available
             if animation.satellite:
@@ -78,81 +216,215 @@ class RadarDataCollector:
             self.db_manager.cleanup_old_radar_data(hours_to_keep=24)
             
             logger.info("Radar data collection completed successfully")
-            
+        
         except Exception as e:
             logger.error(f"Error collecting radar data: {e}")
     
+    def _poll_new_frames(self):
+        """Check the weather-maps index and prefetch radar frames published since the last check"""
+        animation = self.radar_client.get_weather_maps()
+        if not animation:
+            return
+        
+        new_frames = [frame for frame in animation.radar[-3:] if frame.path not in self._seen_frame_paths]
+        if new_frames:
+            logger.info(f"New radar frame(s) published: {', '.join(frame.path for frame in new_frames)}, prefetching")
+            self._prefetch_frames(new_frames, animation.host)
+        
+        self._seen_frame_paths = {frame.path for frame in animation.radar}
+    
+    def _prefetch_frames(self, frames, host: str):
+        """Collect radar frames, update the derived products and warm the proxy cache"""
+        new_paths = [frame.path for frame in frames if frame.path not in self._seen_frame_paths]
+        
+        for frame in frames:
+            self._collect_frame_tiles(frame, host, 'radar')
+        
+        # Extrapolate the latest complete frame (runs once per new frame)
+        self._update_nowcast()
+        
+        # Roll the accumulation windows forward before old frames are cleaned up
+        self._update_accumulation()
+        
+        self._warm_proxy_cache(new_paths)
+    
+    def _warm_proxy_cache(self, frame_paths: List[str]):
+        """Ask the radar proxy to load freshly collected frames into its in-memory cache"""
+        if not settings.radar_proxy_url or not frame_paths:
+            return
+        
+        try:
+            response = requests.post(
+                f"{settings.radar_proxy_url.rstrip('/')}/api/radar/cache/warm",
+                json={'paths': frame_paths},
+                timeout=5
+            )
+            response.raise_for_status()
+            logger.info(f"Warmed radar proxy cache with {response.json().get('warmed', 0)} tiles")
+        except Exception as e:
+            logger.warning(f"Could not warm radar proxy cache: {e}")
+    
+    def _get_expected_tiles(self) -> List[Tuple[int, int, int]]:
+        """Get the (zoom, x, y) tile set every collected frame should contain"""
+        tiles_by_zoom = dict(self.coverage_tiles)
+        
+        # Derived levels cover the parents of the level below, deepest first
+        derived = []
+        for zoom in sorted(self.derived_zoom_levels, reverse=True):
+            if zoom not in tiles_by_zoom and zoom + 1 in tiles_by_zoom:
+                tiles_by_zoom[zoom] = parent_tiles(tiles_by_zoom[zoom + 1])
+                derived.append(zoom)
+        
+        # A parent is only derived from all four children, so the level below is widened
+        # to whole 2x2 blocks; shallowest first so the widening carries down the pyramid
+        for zoom in reversed(derived):
+            tiles_by_zoom[zoom + 1] = sorted(
+                set(tiles_by_zoom[zoom + 1]) | {child for x, y in tiles_by_zoom[zoom] for child in child_tiles(x, y)}
+            )
+        
+        expected = []
+        for zoom, coverage_tiles in tiles_by_zoom.items():
+            expected.extend((zoom, x, y) for x, y in coverage_tiles)
+        return expected
+    
+    def _update_nowcast(self):
+        """Produce nowcast frames over each region at the nowcast zoom level"""
+        try:
+            self.nowcaster.update([
+                tiles.get(self.nowcaster.zoom, []) for tiles in self.region_tiles.values()
+            ])
+        except Exception as e:
+            logger.error(f"Error producing radar nowcast: {e}")
+    
+    def _update_accumulation(self):
+        """Add new radar frames to the rolling accumulation windows"""
+        try:
+            self.accumulator.update(self.coverage_tiles.get(self.accumulator.zoom, []))
+        except Exception as e:
+            logger.error(f"Error updating radar accumulation: {e}")
+    
     def _collect_frame_tiles(self, frame, host: str, data_type: str):
         """Collect tiles for a specific radar frame"""
         try:
-            tiles_collected = 0
-            tiles_total = 0
-            
-            for zoom in self.zoom_levels:
-                # Get tile coordinates for coverage area
-                coverage_tiles = self.radar_client.get_coverage_tiles(
-                    self.center_lat, 
-                    self.center_lon, 
-                    zoom, 
-                    self.tile_radius
+            expected_tiles = self._get_expected_tiles()
+            tiles_total = len(expected_tiles)
+            
+            # Skip frames that were fully collected in a previous cycle
+            state = self.db_manager.get_radar_frame_state(frame.path, data_type)
+            stored_tiles = set(state['stored_tiles']) if state else set()
+            missing_tiles = [tile for tile in expected_tiles if tile not in stored_tiles]
+            
+            if not missing_tiles:
+                logger.debug(f"Frame {frame.path} ({data_type}) already complete, skipping")
+                return
+            
+            # One bulk existence check instead of a query per tile
+            uncached_tiles = self.db_manager.get_missing_radar_tiles(
+                frame.path, missing_tiles, max_age_hours=1
+            )
+            
+            # Measurements read dBZ-encoded copies of the radar tiles at the analysis zoom level
+            uncached_dbz_tiles = []
+            if data_type == 'radar':
+                uncached_dbz_tiles = self.db_manager.get_missing_radar_tiles(
+                    frame.path, [tile for tile in missing_tiles if tile[0] == self.analysis_zoom],
+                    max_age_hours=1, color_scheme=DBZ_COLOR_SCHEME
                 )
-                
-                tiles_total += len(coverage_tiles)
-                
-                for x, y in coverage_tiles:
-                    tile_info = RadarTileInfo(
-                        timestamp=frame.timestamp,
-                        zoom=zoom,
-                        x=x,
-                        y=y,
-                        color_scheme=1,
-                        snow=False,
-                        smooth=True
-                    )
-                    
-                    # Check if we already have this tile cached
-                    cached_tile = self.db_manager.get_radar_tile(
-                        frame.path, zoom, x, y, max_age_hours=1
-                    )
-                    
-                    if cached_tile:
-                        logger.debug(f"Tile {zoom}/{x}/{y} already cached, skipping")
-                        tiles_collected += 1
-                        continue
-                    
-                    # Fetch and store the tile
-                    tile_data = self.radar_client.get_radar_tile(host, frame.path, tile_info)
-                    
-                    if tile_data:
-                        success = self.db_manager.write_radar_tile(
-                            timestamp=frame.timestamp,
-                            data_type=data_type,
-                            tile_path=frame.path,
-                            zoom=zoom,
-                            x=x,
-                            y=y,
-                            tile_data=tile_data,
-                            color_scheme=1,
-                            snow=False,
-                            smooth=True
-                        )
-                        
-                        if success:
-                            tiles_collected += 1
-                            logger.debug(f"Collected {data_type} tile {zoom}/{x}/{y}")
-                        else:
-                            logger.warning(f"Failed to store {data_type} tile {zoom}/{x}/{y}")
-                    else:
-                        logger.warning(f"Failed to fetch {data_type} tile {zoom}/{x}/{y}")
-                    
-                    # Small delay to avoid overwhelming the API
-                    time.sleep(0.1)
             
+            if uncached_tiles is None or uncached_dbz_tiles is None:
+                logger.warning(f"Could not check cached tiles for frame {frame.path}, retrying next cycle")
+                return
+            
+            uncached = set(uncached_tiles)
+            uncached_dbz = set(uncached_dbz_tiles)
+            stored_tiles.update(tile for tile in missing_tiles if tile not in uncached and tile not in uncached_dbz)
+            
+            # Derived zoom levels are built locally after the fetch
+            derived_tiles = [tile for tile in missing_tiles if tile in uncached and tile[0] not in self.zoom_levels]
+            missing_tiles = [
+                tile for tile in missing_tiles
+                if (tile in uncached or tile in uncached_dbz) and tile[0] in self.zoom_levels
+            ]
+            
+            if state:
+                logger.info(f"Frame {frame.path} ({data_type}) partial, filling {len(missing_tiles)}/{tiles_total} missing tiles")
+            
+            for tile in missing_tiles:
+                # A tile only counts as stored once both of its copies are
+                success = True
+                if tile in uncached:
+                    success &= self._fetch_tile(frame, host, data_type, tile, color_scheme=1, smooth=True)
+                if tile in uncached_dbz:
+                    success &= self._fetch_tile(frame, host, data_type, tile, color_scheme=DBZ_COLOR_SCHEME, smooth=False)
+                if success:
+                    stored_tiles.add(tile)
+            
+            if derived_tiles:
+                stored_tiles.update(self.pyramid_builder.derive_tiles(
+                    frame.path, frame.timestamp, data_type, derived_tiles
+                ))
+            
+            self.db_manager.write_radar_frame_state(
+                tile_path=frame.path,
+                data_type=data_type,
+                timestamp=frame.timestamp,
+                expected_tiles=expected_tiles,
+                stored_tiles=list(stored_tiles)
+            )
+            
+            tiles_collected = len(stored_tiles.intersection(expected_tiles))
             logger.info(f"Collected {tiles_collected}/{tiles_total} {data_type} tiles for frame {frame.timestamp}")
             
+            # Frames only reach this point when new tiles arrived, so each is sampled once
+            if data_type == 'radar':
+                self.station_sampler.sample_frame(frame.path, frame.timestamp)
+        
         except Exception as e:
             logger.error(f"Error collecting frame tiles: {e}")
     
+    def _fetch_tile(self, frame, host: str, data_type: str, tile: Tuple[int, int, int],
+                    color_scheme: int, smooth: bool) -> bool:
+        """Fetch one tile of a frame in a color scheme and store it"""
+        zoom, x, y = tile
+        tile_info = RadarTileInfo(
+            timestamp=frame.timestamp,
+            zoom=zoom,
+            x=x,
+            y=y,
+            color_scheme=color_scheme,
+            snow=False,
+            smooth=smooth
+        )
+        
+        # Fetch and store the tile
+        tile_data = self.radar_client.get_radar_tile(host, frame.path, tile_info)
+        
+        # Small delay to avoid overwhelming the API
+        time.sleep(0.1)
+        
+        if not tile_data:
+            logger.warning(f"Failed to fetch {data_type} tile {zoom}/{x}/{y} (color scheme {color_scheme})")
+            return False
+        
+        success = self.db_manager.write_radar_tile(
+            timestamp=frame.timestamp,
+            data_type=data_type,
+            tile_path=frame.path,
+            zoom=zoom,
+            x=x,
+            y=y,
+            tile_data=tile_data,
+            color_scheme=color_scheme,
+            snow=False,
+            smooth=smooth
+        )
+        
+        if success:
+            logger.debug(f"Collected {data_type} tile {zoom}/{x}/{y} (color scheme {color_scheme})")
+        else:
+            logger.warning(f"Failed to store {data_type} tile {zoom}/{x}/{y} (color scheme {color_scheme})")
+        return success
+    
     def collect_historical_data(self, hours: int = 2):
         """One-time collection of historical radar data"""
         try:
@@ -181,7 +453,7 @@ class RadarDataCollector:
             
             logger.info("Historical radar data collection completed")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error in historical data collection: {e}")
             return False
@@ -189,38 +461,38 @@ class RadarDataCollector:
     def get_collection_status(self) -> dict:
         """Get status of radar data collection"""
         try:
-            # Get database stats
-            import sqlite3
-            conn = sqlite3.connect(self.db_manager.db_path)
+            # Tile counts and latest timestamps from table_stats, kept up to date by the write paths (count_inserted/count_deleted)
+            stats = self.db_manager.get_table_stats()
+            tiles = stats.get('radar_tiles', {})
+            radar_count = tiles.get('radar', {}).get('rows', 0)
+            satellite_count = tiles.get('satellite', {}).get('rows', 0)
+            latest_radar = tiles.get('radar', {}).get('max')
+            latest_animation = stats.get('radar_animations', {}).get('', {}).get('max')
             
-            # Count radar tiles
-            radar_count = conn.execute("SELECT COUNT(*) FROM radar_tiles WHERE data_type = 'radar'").fetchone()[0]
-            satellite_count = conn.execute("SELECT COUNT(*) FROM radar_tiles WHERE data_type = 'satellite'").fetchone()[0]
-            
-            # Get latest data timestamp
-            latest_radar = conn.execute("""
-                SELECT MAX(timestamp) FROM radar_tiles WHERE data_type = 'radar'
-            """).fetchone()[0]
-            
-            # Get data age
-            latest_animation = conn.execute("""
-                SELECT MAX(created_at) FROM radar_animations
-            """).fetchone()[0]
-            
-            conn.close()
+            # Per-frame completeness of observed frames; nowcast frames are tracked separately
+            frames = self.db_manager.get_radar_frame_states(data_type='radar', limit=20)
+            complete_frames = sum(1 for frame in frames if frame['complete'])
             
             return {
                 'running': self.running,
                 'center_coordinates': {'lat': self.center_lat, 'lon': self.center_lon},
+                'coverage_tiles': {zoom: len(tiles) for zoom, tiles in self.coverage_tiles.items()},
+                'regions': self._get_region_stats(),
                 'collection_interval_seconds': self.collection_interval,
+                'poll_interval_seconds': self.poll_interval,
                 'zoom_levels': self.zoom_levels,
+                'derived_zoom_levels': self.derived_zoom_levels,
                 'tile_radius': self.tile_radius,
                 'radar_tiles_stored': radar_count,
                 'satellite_tiles_stored': satellite_count,
                 'latest_radar_data': latest_radar,
-                'latest_collection': latest_animation
+                'latest_collection': latest_animation,
+                'frames_complete': complete_frames,
+                'frames_partial': len(frames) - complete_frames,
+                'accumulation_frames': self.accumulator.window_frames(),
+                'frames': frames
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting collection status: {e}")
             return {'error': str(e)}
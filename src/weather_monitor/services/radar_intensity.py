@@ -0,0 +1,40 @@
+"""
+Conversion of dBZ-encoded radar tiles to reflectivity and rain rate
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from .tile_image import decode_tile
+
+# Color scheme 0 ("Black and White: dBZ values") encodes reflectivity directly: the
+# gray level of a pixel is dBZ + 32. The display schemes are only colorings of the
+# same data, so all measurements are read from scheme 0 tiles.
+DBZ_COLOR_SCHEME = 0
+DBZ_OFFSET = 32
+MIN_ALPHA = 16  # Nearly transparent pixels are treated as no echo
+
+
+def rgba_to_dbz(rgba: np.ndarray) -> np.ndarray:
+    """Map a scheme 0 RGBA tile array to float32 dBZ (NaN where there is no echo)"""
+    dbz = rgba[..., 0].astype(np.float32) - DBZ_OFFSET
+    return np.where(rgba[..., 3] >= MIN_ALPHA, dbz, np.nan).astype(np.float32)
+
+
+def decode_dbz(tile_data: bytes) -> np.ndarray:
+    """Decode a stored scheme 0 tile straight into a dBZ array"""
+    return rgba_to_dbz(decode_tile(tile_data))
+
+
+def dbz_to_rain_rate(dbz: np.ndarray) -> np.ndarray:
+    """Convert dBZ to rain rate in mm/h with the Marshall-Palmer relation Z = 200 R^1.6"""
+    z = np.power(10.0, np.asarray(dbz, dtype=np.float32) / 10.0)
+    rate = np.power(z / 200.0, 1.0 / 1.6)
+    return np.where(np.isnan(rate), 0.0, rate).astype(np.float32)
+
+
+def nan_to_none(value) -> Optional[float]:
+    """Convert a NumPy scalar to a float for storage, NaN becoming None"""
+    value = float(value)
+    return None if np.isnan(value) else value
@@ -0,0 +1,245 @@
+"""
+Radar nowcasting: extrapolation of recent radar frames into the near future
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+from loguru import logger
+
+from .radar_intensity import DBZ_COLOR_SCHEME, rgba_to_dbz
+from .radar_render import MAX_RENDER_TILES, assemble_tiles, split_tiles
+from .tile_image import encode_tile, is_empty
+
+NOWCAST_PATH_PREFIX = '/nowcast'
+
+
+def nowcast_path(source_timestamp: datetime, lead_minutes: int) -> str:
+    """Tile path under which a nowcast frame is stored and served"""
+    return f"{NOWCAST_PATH_PREFIX}/{int(source_timestamp.timestamp())}/{lead_minutes}"
+
+
+def tile_rect(tiles: Sequence[Tuple[int, int]]) -> Tuple[int, int, int, int]:
+    """Get (x0, y0, columns, rows) of the rectangle enclosing a tile set"""
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    return min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1
+
+
+def _box_blur(field: np.ndarray, size: int) -> np.ndarray:
+    """Separable box filter implemented with cumulative sums"""
+    if size <= 1:
+        return field
+    
+    pad_before, pad_after = size // 2, size - size // 2 - 1
+    result = field
+    for axis in (0, 1):
+        pad_width = [(0, 0), (0, 0)]
+        pad_width[axis] = (pad_before + 1, pad_after)
+        padded = np.pad(result, pad_width, mode='edge')
+        cumulative = np.cumsum(padded, axis=axis)
+        upper = np.take(cumulative, np.arange(size, cumulative.shape[axis]), axis=axis)
+        lower = np.take(cumulative, np.arange(0, cumulative.shape[axis] - size), axis=axis)
+        result = (upper - lower) / size
+    return result
+
+
+def estimate_motion(previous: np.ndarray, current: np.ndarray, block: int = 16,
+                    search: int = 6, min_echo: float = 50.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Estimate per-block motion (pixels per frame interval) by block matching
+    
+    For every candidate shift the sum of squared differences of all blocks is
+    computed at once with a reshape; the loop only runs over the shifts. Blocks
+    without enough echo are returned as NaN.
+    """
+    block_rows, block_columns = current.shape[0] // block, current.shape[1] // block
+    height, width = block_rows * block, block_columns * block
+    target = current[:height, :width]
+    padded = np.pad(previous[:height, :width], search, mode='constant')
+    
+    best = np.full((block_rows, block_columns), np.inf, dtype=np.float64)
+    u = np.zeros((block_rows, block_columns), dtype=np.float32)
+    v = np.zeros((block_rows, block_columns), dtype=np.float32)
+    
+    # Smallest shifts first so ties resolve towards no motion
+    shifts = sorted(
+        ((dy, dx) for dy in range(-search, search + 1) for dx in range(-search, search + 1)),
+        key=lambda shift: shift[0] ** 2 + shift[1] ** 2
+    )
+    for dy, dx in shifts:
+        # Pixel (y, x) of the current frame compared with (y - dy, x - dx) of the previous one
+        source = padded[search - dy:search - dy + height, search - dx:search - dx + width]
+        ssd = ((target - source) ** 2).reshape(block_rows, block, block_columns, block).sum(axis=(1, 3))
+        better = ssd < best
+        best = np.where(better, ssd, best)
+        u = np.where(better, dx, u)
+        v = np.where(better, dy, v)
+    
+    echo = target.reshape(block_rows, block, block_columns, block).sum(axis=(1, 3))
+    u[echo < min_echo] = np.nan
+    v[echo < min_echo] = np.nan
+    return u, v
+
+
+def advect(rgba: np.ndarray, u: np.ndarray, v: np.ndarray, steps: float) -> np.ndarray:
+    """Move an RGBA frame along a per-pixel motion field (semi-Lagrangian, nearest neighbour)
+    
+    Nearest-neighbour sampling keeps every output pixel an existing palette
+    color instead of blending colors the display scheme doesn't contain.
+    """
+    height, width = rgba.shape[:2]
+    rows, columns = np.mgrid[0:height, 0:width]
+    source_rows = np.rint(rows - steps * v).astype(np.int64)
+    source_columns = np.rint(columns - steps * u).astype(np.int64)
+    
+    inside = (source_rows >= 0) & (source_rows < height) & (source_columns >= 0) & (source_columns < width)
+    result = np.zeros_like(rgba)
+    result[inside] = rgba[source_rows[inside], source_columns[inside]]
+    return result
+
+
+class RadarNowcaster:
+    """Extrapolates the latest stored radar frame along a motion field estimated from recent frames"""
+    
+    def __init__(self, db_manager, zoom: int = 7, history_frames: int = 3,
+                 lead_minutes: Sequence[int] = (10, 20, 30, 40, 50, 60),
+                 block_size: int = 16, search_radius: int = 6):
+        self.db_manager = db_manager
+        self.zoom = zoom
+        self.history_frames = history_frames
+        self.lead_minutes = list(lead_minutes)
+        self.block_size = block_size  # On the 2x downsampled grid
+        self.search_radius = search_radius  # On the 2x downsampled grid
+    
+    def update(self, tile_sets: List[List[Tuple[int, int]]]) -> bool:
+        """Produce nowcast frames for the latest complete radar frame if not done yet"""
+        frames = [
+            frame for frame in self.db_manager.get_radar_frame_states(data_type='radar', limit=self.history_frames * 2)
+            if frame['complete']
+        ][:self.history_frames]
+        
+        if len(frames) < 2:
+            logger.debug("Not enough complete radar frames for a nowcast")
+            return False
+        
+        # States come newest first
+        frames.reverse()
+        timestamps = [datetime.fromisoformat(str(frame['timestamp'])) for frame in frames]
+        source_time = timestamps[-1]
+        
+        # Cached per source frame: the last lead is written last, so its state marks completion
+        if self.db_manager.get_radar_frame_state(nowcast_path(source_time, self.lead_minutes[-1]), 'nowcast'):
+            return False
+        
+        interval = float(np.median([(b - a).total_seconds() for a, b in zip(timestamps, timestamps[1:])]))
+        if interval <= 0:
+            logger.warning("Radar frames have no time spacing, skipping nowcast")
+            return False
+        
+        expected: Dict[int, Set[Tuple[int, int, int]]] = defaultdict(set)
+        stored: Dict[int, Set[Tuple[int, int, int]]] = defaultdict(set)
+        
+        for tiles in tile_sets:
+            if not tiles:
+                continue
+            x0, y0, columns, rows = tile_rect(tiles)
+            if columns * rows > MAX_RENDER_TILES:
+                logger.warning(f"Nowcast area of {columns * rows} tiles exceeds {MAX_RENDER_TILES}, skipping")
+                continue
+            
+            rect_tiles = [(x, y) for y in range(y0, y0 + rows) for x in range(x0, x0 + columns)]
+            
+            # Motion comes from the dBZ-encoded tiles; the displayed tiles of the latest frame are moved
+            dbz_mosaics = [
+                rgba_to_dbz(assemble_tiles(
+                    self.db_manager.get_radar_tiles(
+                        frame['tile_path'], self.zoom, rect_tiles, color_scheme=DBZ_COLOR_SCHEME
+                    ) or {},
+                    x0, y0, columns, rows
+                ))
+                for frame in frames
+            ]
+            display = assemble_tiles(
+                self.db_manager.get_radar_tiles(frames[-1]['tile_path'], self.zoom, rect_tiles) or {},
+                x0, y0, columns, rows
+            )
+            u, v = self._motion_field(dbz_mosaics)
+            
+            for lead in self.lead_minutes:
+                advected = advect(display, u, v, lead * 60.0 / interval)
+                for (x, y), tile in split_tiles(advected, x0, y0).items():
+                    key = (self.zoom, x, y)
+                    if key in expected[lead]:
+                        continue  # Shared by an overlapping region
+                    expected[lead].add(key)
+                    
+                    # Empty tiles are not stored; the proxy serves them as transparent
+                    if is_empty(tile) or self.db_manager.write_radar_tile(
+                        timestamp=source_time + timedelta(minutes=lead),
+                        data_type='nowcast',
+                        tile_path=nowcast_path(source_time, lead),
+                        zoom=self.zoom,
+                        x=x,
+                        y=y,
+                        tile_data=encode_tile(np.ascontiguousarray(tile))
+                    ):
+                        stored[lead].add(key)
+        
+        if not expected:
+            return False
+        
+        for lead in self.lead_minutes:
+            self.db_manager.write_radar_frame_state(
+                tile_path=nowcast_path(source_time, lead),
+                data_type='nowcast',
+                timestamp=source_time + timedelta(minutes=lead),
+                expected_tiles=list(expected[lead]),
+                stored_tiles=list(stored[lead])
+            )
+        
+        logger.info(f"Nowcast from frame {frames[-1]['tile_path']}: {len(self.lead_minutes)} frames "
+                    f"up to +{self.lead_minutes[-1]} min")
+        return True
+    
+    def _motion_field(self, dbz_mosaics: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-pixel motion (pixels per frame interval) averaged over consecutive frame pairs"""
+        height, width = dbz_mosaics[-1].shape[:2]
+        
+        # Motion is estimated on a 2x downsampled reflectivity grid
+        intensity = []
+        for mosaic in dbz_mosaics:
+            dbz = np.nan_to_num(mosaic, nan=0.0)
+            intensity.append(dbz.reshape(height // 2, 2, width // 2, 2).mean(axis=(1, 3)))
+        
+        fields = [
+            estimate_motion(previous, current, self.block_size, self.search_radius)
+            for previous, current in zip(intensity, intensity[1:])
+        ]
+        u_stack = np.stack([field[0] for field in fields])
+        v_stack = np.stack([field[1] for field in fields])
+        counts = (~np.isnan(u_stack)).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            u = np.where(counts > 0, np.nansum(u_stack, axis=0) / counts, np.nan)
+            v = np.where(counts > 0, np.nansum(v_stack, axis=0) / counts, np.nan)
+        
+        # Blocks without echo take the median motion of the blocks that have it
+        valid = ~np.isnan(u)
+        if valid.any():
+            u = np.where(valid, u, np.median(u[valid]))
+            v = np.where(valid, v, np.median(v[valid]))
+        else:
+            u = np.zeros_like(u)
+            v = np.zeros_like(v)
+        
+        # Back to full resolution, smoothed so block edges don't tear the advected image
+        scale = self.block_size * 2
+        u = _box_blur(np.repeat(np.repeat(u, scale, axis=0), scale, axis=1) * 2, scale)
+        v = _box_blur(np.repeat(np.repeat(v, scale, axis=0), scale, axis=1) * 2, scale)
+        
+        full_u = np.zeros((height, width), dtype=np.float32)
+        full_v = np.zeros((height, width), dtype=np.float32)
+        full_u[:u.shape[0], :u.shape[1]] = u[:height, :width]
+        full_v[:v.shape[0], :v.shape[1]] = v[:height, :width]
+        return full_u, full_v
@@ -0,0 +1,206 @@
+"""
+Server-side rendering of stored radar tiles: bbox stitching, animations and render caching
+"""
+
+import io
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from PIL import Image, PngImagePlugin
+
+from ..api.radar_client import lonlat_to_world_pixels
+from .tile_image import TILE_SIZE, decode_tile, encode_png
+
+MAX_RENDER_TILES = 64  # Upper bound on tiles stitched for a single image
+MAX_LATITUDE = 85.0511  # Web Mercator latitude limit
+
+Bbox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def parse_bbox(value: str) -> Bbox:
+    """Parse a 'min_lon,min_lat,max_lon,max_lat' string (Leaflet toBBoxString order)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    
+    # Map viewports can extend past the Web Mercator range when zoomed out
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    min_lat, max_lat = max(min_lat, -MAX_LATITUDE), min(max_lat, MAX_LATITUDE)
+    
+    if min_lon >= max_lon or min_lat >= max_lat:
+        raise ValueError("bbox is empty")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+class BboxWindow:
+    """Tile range covering a bbox and the pixel crop of the bbox inside it"""
+    
+    def __init__(self, bbox: Bbox, zoom: int):
+        min_lon, min_lat, max_lon, max_lat = bbox
+        # North-west and south-east corners in one call
+        (left, right), (top, bottom) = lonlat_to_world_pixels([max_lat, min_lat], [min_lon, max_lon], zoom)
+        
+        max_tile = 2 ** zoom - 1
+        self.zoom = zoom
+        self.x0 = min(int(left // TILE_SIZE), max_tile)
+        self.y0 = min(int(top // TILE_SIZE), max_tile)
+        self.x1 = min(int(math.ceil(right / TILE_SIZE)) - 1, max_tile)
+        self.y1 = min(int(math.ceil(bottom / TILE_SIZE)) - 1, max_tile)
+        
+        # Crop box relative to the stitched canvas
+        self.crop_left = int(round(left)) - self.x0 * TILE_SIZE
+        self.crop_top = int(round(top)) - self.y0 * TILE_SIZE
+        self.width = max(int(round(right)) - int(round(left)), 1)
+        self.height = max(int(round(bottom)) - int(round(top)), 1)
+    
+    @property
+    def tiles(self) -> List[Tuple[int, int]]:
+        return [(x, y) for y in range(self.y0, self.y1 + 1) for x in range(self.x0, self.x1 + 1)]
+    
+    @property
+    def columns(self) -> int:
+        return self.x1 - self.x0 + 1
+    
+    @property
+    def rows(self) -> int:
+        return self.y1 - self.y0 + 1
+
+
+def assemble_tiles(tile_data: Dict[Tuple[int, int], bytes], x0: int, y0: int,
+                   columns: int, rows: int) -> np.ndarray:
+    """Decode a rectangle of tiles with top-left (x0, y0) into one RGBA canvas"""
+    # Decoded tiles are placed into a (rows, cols, 256, 256, 4) block array and
+    # laid out with a single transpose/reshape rather than per-pixel copies
+    blocks = np.zeros((rows, columns, TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    for (x, y), blob in tile_data.items():
+        try:
+            blocks[y - y0, x - x0] = decode_tile(blob)[:TILE_SIZE, :TILE_SIZE]
+        except Exception as e:
+            logger.warning(f"Could not decode tile {x}/{y}: {e}")
+    
+    return blocks.transpose(0, 2, 1, 3, 4).reshape(rows * TILE_SIZE, columns * TILE_SIZE, 4)
+
+
+def split_tiles(canvas: np.ndarray, x0: int, y0: int) -> Dict[Tuple[int, int], np.ndarray]:
+    """Cut a canvas assembled from tiles back into (x, y) -> 256x256 tile arrays"""
+    rows, columns = canvas.shape[0] // TILE_SIZE, canvas.shape[1] // TILE_SIZE
+    blocks = canvas.reshape(rows, TILE_SIZE, columns, TILE_SIZE, -1).transpose(0, 2, 1, 3, 4)
+    return {(x0 + column, y0 + row): blocks[row, column] for row in range(rows) for column in range(columns)}
+
+
+def stitch_tiles(tile_data: Dict[Tuple[int, int], bytes], window: BboxWindow) -> np.ndarray:
+    """Assemble the window's tiles into one RGBA canvas and crop it to the bbox"""
+    canvas = assemble_tiles(tile_data, window.x0, window.y0, window.columns, window.rows)
+    
+    cropped = canvas[window.crop_top:window.crop_top + window.height,
+                     window.crop_left:window.crop_left + window.width]
+    
+    # Bboxes clamped at the edge of the world may be shorter than requested
+    if cropped.shape[0] != window.height or cropped.shape[1] != window.width:
+        padded = np.zeros((window.height, window.width, 4), dtype=np.uint8)
+        padded[:cropped.shape[0], :cropped.shape[1]] = cropped
+        cropped = padded
+    return cropped
+
+
+def choose_zoom(bbox: Bbox, max_zoom: int, min_zoom: int = 0) -> int:
+    """Highest zoom up to max_zoom whose bbox window stays within MAX_RENDER_TILES"""
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        window = BboxWindow(bbox, zoom)
+        if window.rows * window.columns <= MAX_RENDER_TILES:
+            return zoom
+    return min_zoom
+
+
+def resize_image(rgba: np.ndarray, width: Optional[int] = None, height: Optional[int] = None) -> np.ndarray:
+    """Resize an RGBA array, keeping the aspect ratio when only one side is given"""
+    source_height, source_width = rgba.shape[:2]
+    if width is None and height is None:
+        return rgba
+    if width is None:
+        width = max(int(round(source_width * height / source_height)), 1)
+    if height is None:
+        height = max(int(round(source_height * width / source_width)), 1)
+    if (width, height) == (source_width, source_height):
+        return rgba
+    
+    # Pillow premultiplies alpha for RGBA resampling, so clear pixels don't bleed
+    image = Image.fromarray(rgba, 'RGBA').resize((width, height), Image.Resampling.BILINEAR)
+    return np.asarray(image, dtype=np.uint8)
+
+
+def render_bbox(db_manager, tile_path: str, bbox: Bbox, zoom: int) -> np.ndarray:
+    """Render one stored frame over a bbox as an RGBA array"""
+    window = BboxWindow(bbox, zoom)
+    if window.rows * window.columns > MAX_RENDER_TILES:
+        raise ValueError(f"bbox covers {window.rows * window.columns} tiles at zoom {zoom}, "
+                         f"limit is {MAX_RENDER_TILES}")
+    
+    tile_data = db_manager.get_radar_tiles(tile_path, zoom, window.tiles) or {}
+    return stitch_tiles(tile_data, window)
+
+
+def encode_animation(frames: List[np.ndarray], delay_ms: int = 500) -> bytes:
+    """Encode RGBA frames as a looping animated PNG"""
+    images = [Image.fromarray(frame, 'RGBA') for frame in frames]
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer,
+        format='PNG',
+        save_all=True,
+        append_images=images[1:],
+        duration=delay_ms,
+        loop=0,
+        # Replace rather than blend so transparent areas don't accumulate echoes
+        disposal=PngImagePlugin.Disposal.OP_BACKGROUND,
+        blend=PngImagePlugin.Blend.OP_SOURCE
+    )
+    return buffer.getvalue()
+
+
+def encode_sprite(frames: List[np.ndarray]) -> bytes:
+    """Encode RGBA frames stacked vertically into a single PNG sprite sheet"""
+    return encode_png(np.concatenate(frames, axis=0))
+
+
+class RenderCache:
+    """Bounded, thread-safe LRU cache of rendered images keyed by their inputs"""
+    
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: bytes):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': sum(len(value) for value in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses
+            }
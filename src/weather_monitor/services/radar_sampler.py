@@ -0,0 +1,132 @@
+"""
+Sampling of radar precipitation intensity at weather station locations
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ..api.radar_client import RainViewerClient
+from .radar_intensity import DBZ_COLOR_SCHEME, dbz_to_rain_rate, decode_dbz, nan_to_none
+from .tile_image import TILE_SIZE
+
+
+class FrameArrayCache:
+    """Bounded LRU cache of decoded dBZ tile arrays for whole frames"""
+    
+    def __init__(self, db_manager, max_frames: int = 16, max_age_hours: int = 1):
+        self.db_manager = db_manager
+        self.max_frames = max_frames
+        self.max_age_hours = max_age_hours
+        self._frames: "OrderedDict[Tuple[str, int], Dict[Tuple[int, int], np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_tiles(self, tile_path: str, zoom: int, tiles: List[Tuple[int, int]]) -> Dict[Tuple[int, int], np.ndarray]:
+        """Get decoded dBZ arrays for tiles of a frame, decoding each tile only once"""
+        key = (tile_path, zoom)
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+        
+        frame = dict(frame) if frame else {}
+        missing = [tile for tile in tiles if tile not in frame]
+        
+        if missing:
+            tile_data = self.db_manager.get_radar_tiles(
+                tile_path, zoom, missing, self.max_age_hours, color_scheme=DBZ_COLOR_SCHEME
+            ) or {}
+            for tile, blob in tile_data.items():
+                try:
+                    frame[tile] = decode_dbz(blob)
+                except Exception as e:
+                    logger.warning(f"Could not decode tile {zoom}/{tile[0]}/{tile[1]} of {tile_path}: {e}")
+            
+            with self._lock:
+                self._frames[key] = frame
+                self._frames.move_to_end(key)
+                while len(self._frames) > self.max_frames:
+                    self._frames.popitem(last=False)
+        
+        return {tile: frame[tile] for tile in tiles if tile in frame}
+
+
+class StationRadarSampler:
+    """Samples radar reflectivity under every active station for each new frame"""
+    
+    def __init__(self, db_manager, station_manager, zoom: int = 7,
+                 frame_cache: Optional[FrameArrayCache] = None):
+        self.db_manager = db_manager
+        self.station_manager = station_manager
+        self.zoom = zoom
+        self.frame_cache = frame_cache or FrameArrayCache(db_manager)
+        
+        self.station_ids: List[str] = []
+        self._tile_x = self._tile_y = self._pixel_x = self._pixel_y = np.empty(0, dtype=np.int64)
+        
+        self.station_manager.add_reload_listener(self.refresh_stations)
+        self.refresh_stations()
+    
+    def refresh_stations(self):
+        """Precompute tile and pixel positions of the active stations"""
+        stations = self.station_manager.get_active_stations()
+        self.station_ids = [station.station_id for station in stations]
+        
+        lats = np.array([station.latitude for station in stations], dtype=np.float64)
+        lons = np.array([station.longitude for station in stations], dtype=np.float64)
+        
+        self._tile_x, self._tile_y, self._pixel_x, self._pixel_y = \
+            RainViewerClient.calculate_tile_coordinates_batch(lats, lons, self.zoom)
+    
+    def gather(self, arrays: Dict[Tuple[int, int], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick the pixel under every station from per-tile arrays
+        
+        Returns the values (NaN where the tile is missing) and a mask of the
+        stations whose tile was available.
+        """
+        # Stations falling into the same tile share one array
+        station_tiles = list(zip(self._tile_x.tolist(), self._tile_y.tolist()))
+        unique_tiles = sorted(set(station_tiles))
+        
+        stack = np.full((len(unique_tiles), TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+        for index, tile in enumerate(unique_tiles):
+            if tile in arrays:
+                stack[index] = arrays[tile]
+        
+        # One gather for every station
+        tile_index = {tile: index for index, tile in enumerate(unique_tiles)}
+        indices = np.array([tile_index[tile] for tile in station_tiles], dtype=np.int64)
+        values = stack[indices, self._pixel_y, self._pixel_x]
+        has_tile = np.array([tile in arrays for tile in station_tiles], dtype=bool)
+        return values, has_tile
+    
+    def sample_frame(self, tile_path: str, timestamp: datetime) -> int:
+        """Sample one frame at all stations and store the results, returning the sample count"""
+        if not self.station_ids:
+            return 0
+        
+        unique_tiles = sorted(set(zip(self._tile_x.tolist(), self._tile_y.tolist())))
+        arrays = self.frame_cache.get_tiles(tile_path, self.zoom, unique_tiles)
+        dbz, has_tile = self.gather(arrays)
+        rain_rate = dbz_to_rain_rate(dbz)
+        
+        samples = [
+            {
+                'timestamp': timestamp,
+                'station_id': station_id,
+                'tile_path': tile_path,
+                'zoom': self.zoom,
+                'dbz': nan_to_none(dbz[i]),
+                'rain_rate': float(rain_rate[i])
+            }
+            for i, station_id in enumerate(self.station_ids)
+            if has_tile[i]
+        ]
+        
+        if samples and self.db_manager.write_radar_station_samples(samples):
+            logger.info(f"Sampled radar frame {tile_path} at {len(samples)} stations")
+        return len(samples)
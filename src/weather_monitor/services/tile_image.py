@@ -0,0 +1,60 @@
+"""
+Decoding, encoding and resampling helpers for stored radar tiles
+"""
+
+import gzip
+import io
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+TILE_SIZE = 256
+
+
+def decode_tile(tile_data: bytes) -> np.ndarray:
+    """Decode a stored (gzip-compressed PNG) tile into an RGBA uint8 array"""
+    with Image.open(io.BytesIO(gzip.decompress(tile_data))) as image:
+        return np.asarray(image.convert('RGBA'), dtype=np.uint8)
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encode an RGBA uint8 array as PNG bytes"""
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def encode_tile(rgba: np.ndarray) -> bytes:
+    """Encode an RGBA uint8 array into the stored (gzip-compressed PNG) tile format"""
+    return gzip.compress(encode_png(rgba))
+
+
+def empty_tile(size: int = TILE_SIZE) -> np.ndarray:
+    """Fully transparent RGBA tile"""
+    return np.zeros((size, size, 4), dtype=np.uint8)
+
+
+def downsample_2x2(rgba: np.ndarray) -> np.ndarray:
+    """Halve an RGBA image by averaging 2x2 pixel blocks with premultiplied alpha
+    
+    Premultiplying keeps transparent (no echo) pixels from darkening the
+    colors of neighbouring radar returns.
+    """
+    height, width = rgba.shape[0] // 2, rgba.shape[1] // 2
+    pixels = rgba[:height * 2, :width * 2].astype(np.float32)
+    
+    alpha = pixels[..., 3:4]
+    premultiplied = pixels[..., :3] * alpha
+    
+    color_sum = premultiplied.reshape(height, 2, width, 2, 3).sum(axis=(1, 3))
+    alpha_sum = alpha.reshape(height, 2, width, 2, 1).sum(axis=(1, 3))
+    
+    color = np.divide(color_sum, alpha_sum, out=np.zeros_like(color_sum), where=alpha_sum > 0)
+    result = np.concatenate([color, alpha_sum / 4.0], axis=-1)
+    return np.clip(np.rint(result), 0, 255).astype(np.uint8)
+
+
+def is_empty(rgba: Optional[np.ndarray]) -> bool:
+    """Check whether a tile array has no visible pixels"""
+    return rgba is None or not rgba[..., 3].any()
@@ -0,0 +1,100 @@
+"""
+Local tile pyramid derivation: build lower zoom radar tiles from stored higher zoom tiles
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Set, Tuple
+from loguru import logger
+
+from .tile_image import TILE_SIZE, decode_tile, downsample_2x2, empty_tile, encode_tile
+
+
+def child_tiles(x: int, y: int) -> List[Tuple[int, int]]:
+    """Get the four tiles one zoom level deeper that make up tile (x, y)"""
+    return [(2 * x + dx, 2 * y + dy) for dy in (0, 1) for dx in (0, 1)]
+
+
+def parent_tiles(tiles: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Get the distinct tiles one zoom level up that contain the given tiles"""
+    return sorted({(x // 2, y // 2) for x, y in tiles})
+
+
+class TilePyramidBuilder:
+    """Derives lower zoom tiles by 2x2 downsampling of stored higher zoom tiles"""
+    
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+    
+    def derive_tiles(self, tile_path: str, timestamp: datetime, data_type: str,
+                     tiles: Iterable[Tuple[int, int, int]]) -> Set[Tuple[int, int, int]]:
+        """Derive and store the requested (zoom, x, y) tiles, returning those stored
+        
+        Zoom levels are processed deepest first so a derived level can feed the
+        next one up. A tile is only derived once all four of its children are
+        stored; otherwise it is skipped so the proxy falls through to upstream
+        instead of serving an edge tile as "no echo".
+        """
+        by_zoom: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        for zoom, x, y in tiles:
+            by_zoom[zoom].append((x, y))
+        
+        stored = set()
+        for zoom in sorted(by_zoom, reverse=True):
+            targets = by_zoom[zoom]
+            children = [child for x, y in targets for child in child_tiles(x, y)]
+            
+            # One query for every child tile of this zoom level
+            child_data = self.db_manager.get_radar_tiles(tile_path, zoom + 1, children)
+            if child_data is None:
+                logger.warning(f"Could not load zoom {zoom + 1} tiles for frame {tile_path}")
+                continue
+            
+            for x, y in targets:
+                tile = self._build_parent(child_data, x, y)
+                if tile is None:
+                    logger.debug(f"Zoom {zoom + 1} source tiles incomplete for {zoom}/{x}/{y}, skipping")
+                    continue
+                
+                success = self.db_manager.write_radar_tile(
+                    timestamp=timestamp,
+                    data_type=data_type,
+                    tile_path=tile_path,
+                    zoom=zoom,
+                    x=x,
+                    y=y,
+                    tile_data=encode_tile(tile),
+                    color_scheme=1,
+                    snow=False,
+                    smooth=True
+                )
+                if success:
+                    stored.add((zoom, x, y))
+        
+        if stored:
+            logger.info(f"Derived {len(stored)} lower zoom {data_type} tiles for frame {tile_path}")
+        return stored
+    
+    def _build_parent(self, child_data: Dict[Tuple[int, int], bytes], x: int, y: int):
+        """Stitch the four children of (x, y) and downsample them into one tile
+        
+        Returns None unless every child is stored and decodes.
+        """
+        canvas = empty_tile(TILE_SIZE * 2)
+        
+        for (child_x, child_y) in child_tiles(x, y):
+            blob = child_data.get((child_x, child_y))
+            if blob is None:
+                return None
+            
+            try:
+                rgba = decode_tile(blob)
+            except Exception as e:
+                logger.warning(f"Could not decode source tile {child_x}/{child_y}: {e}")
+                return None
+            
+            offset_x = (child_x - 2 * x) * TILE_SIZE
+            offset_y = (child_y - 2 * y) * TILE_SIZE
+            canvas[offset_y:offset_y + TILE_SIZE, offset_x:offset_x + TILE_SIZE] = rgba[:TILE_SIZE, :TILE_SIZE]
+        
+        return downsample_2x2(canvas)
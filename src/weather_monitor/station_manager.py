@@ -4,7 +4,7 @@ Weather Station Manager for handling multiple weather stations
 
 import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from loguru import logger
 
 from .models.weather import WeatherStation
@@ -21,9 +21,31 @@ class StationManager:
         self.config_path = config_path
         self.stations: Dict[str, WeatherStation] = {}
         self.cities: Dict[str, List[str]] = {}  # city -> list of station_ids
+        self._reload_listeners: List[Callable[[], None]] = []
+        self._config_mtime = 0.0
         
         self.load_stations()
     
+    def add_reload_listener(self, callback: Callable[[], None]):
+        """Register a callback invoked after stations are (re)loaded"""
+        self._reload_listeners.append(callback)
+    
+    def _get_config_mtime(self) -> float:
+        """Get config file modification time"""
+        try:
+            if self.config_path.exists():
+                return self.config_path.stat().st_mtime
+        except Exception as e:
+            logger.warning(f"Could not get config file mtime: {e}")
+        return 0.0
+    
+    def reload_if_changed(self) -> bool:
+        """Reload stations if the configuration file changed since the last load"""
+        if self._get_config_mtime() > self._config_mtime:
+            logger.info("Station configuration change detected, reloading")
+            return self.load_stations()
+        return False
+    
     def load_stations(self) -> bool:
         """Load weather stations from configuration file"""
         try:
@@ -31,6 +53,7 @@ class StationManager:
                 logger.warning(f"Station configuration file not found: {self.config_path}")
                 return False
             
+            self._config_mtime = self._get_config_mtime()
             with open(self.config_path, 'r') as f:
                 config = json.load(f)
             
@@ -47,6 +70,12 @@ class StationManager:
                 self.cities[station.city].append(station.station_id)
             
             logger.info(f"Loaded {len(self.stations)} weather stations from {len(self.cities)} cities")
+            
+            for callback in self._reload_listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Error in station reload listener: {e}")
             return True
             
         except Exception as e:
@@ -66,6 +95,16 @@ class StationManager:
         """Get all active stations"""
         return [station for station in self.stations.values() if station.active]
     
+    def get_bounding_box(self, active_only: bool = True) -> Optional[Tuple[float, float, float, float]]:
+        """Get (min_lat, min_lon, max_lat, max_lon) of the station network"""
+        stations = self.get_active_stations() if active_only else list(self.stations.values())
+        if not stations:
+            return None
+        
+        lats = [station.latitude for station in stations]
+        lons = [station.longitude for station in stations]
+        return min(lats), min(lons), max(lats), max(lons)
+    
     def get_cities(self) -> List[str]:
         """Get list of all cities"""
         return list(self.cities.keys())